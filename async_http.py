@@ -0,0 +1,248 @@
+import json
+import time
+import asyncio
+import weakref
+import functools
+from http import HTTPStatus
+
+from metrics import get_metrics, request_model, outcome_of
+from http_session import DEFAULT_MAX_ERROR_BYTES
+
+# Connection pool sizing for the shared session. Validations to one provider
+# all hit the same host, so the per-host limit is what bounds concurrency.
+DEFAULT_CONNECTION_LIMIT = 200
+DEFAULT_LIMIT_PER_HOST = 100
+DEFAULT_KEEPALIVE_TIMEOUT = 30
+DEFAULT_DNS_CACHE_TTL = 300
+
+# One session per event loop; aiohttp sessions cannot be shared across loops
+_sessions = weakref.WeakKeyDictionary()
+
+
+class AsyncHTTPError(Exception):
+    """
+    Raised for 4XX/5XX responses, mirroring requests' HTTPError message format.
+    The raw response body is kept in .body, the decoded JSON (if any) in .data and
+    the response headers (if known) in .headers.
+    """
+
+    def __init__(self, status, reason, url, body, headers=None):
+        if not reason:
+            try:
+                reason = HTTPStatus(status).phrase
+            except ValueError:
+                reason = ""
+        self.status = status
+        self.reason = reason
+        self.url = url
+        self.body = body
+        self.headers = headers
+        try:
+            self.data = json.loads(body) if body else None
+        except ValueError:
+            self.data = None
+        kind = "Client" if status < 500 else "Server"
+        super().__init__(f"{status} {kind} Error: {reason} for url: {url}")
+
+    def error_message(self):
+        """
+        Returns the provider's error message from the response body, or ''.
+        """
+        if isinstance(self.data, dict):
+            error = self.data.get("error", {})
+            if isinstance(error, dict):
+                return error.get("message", "") or ""
+            return str(error)
+        return ""
+
+
+def create_async_session(limit=DEFAULT_CONNECTION_LIMIT, limit_per_host=DEFAULT_LIMIT_PER_HOST,
+                         keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT):
+    """
+    Creates a new aiohttp session with a pooled, keep-alive connector.
+    Must be called from inside a running event loop.
+    """
+    # aiohttp is imported on first use so sync-only callers never load it
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        keepalive_timeout=keepalive_timeout,
+        ttl_dns_cache=DEFAULT_DNS_CACHE_TTL,
+    )
+    return aiohttp.ClientSession(connector=connector, trace_configs=[_trace_config()])
+
+
+def _trace_config():
+    # Fills the phases dict passed to each request as trace_request_ctx with DNS and connect times
+    import aiohttp
+
+    trace = aiohttp.TraceConfig()
+    trace.on_dns_resolvehost_start.append(functools.partial(_phase_start, "dns"))
+    trace.on_dns_resolvehost_end.append(functools.partial(_phase_end, "dns"))
+    trace.on_connection_create_start.append(functools.partial(_phase_start, "connect"))
+    trace.on_connection_create_end.append(functools.partial(_phase_end, "connect"))
+    return trace
+
+
+async def _phase_start(phase, session, context, params):
+    if isinstance(context.trace_request_ctx, dict):
+        context.trace_request_ctx["_" + phase] = time.perf_counter()
+
+
+async def _phase_end(phase, session, context, params):
+    phases = context.trace_request_ctx
+    if isinstance(phases, dict) and "_" + phase in phases:
+        phases[phase] = time.perf_counter() - phases.pop("_" + phase)
+
+
+def _record(url, payload, start, headers_at, status=None, error=None, text="", phases=None):
+    # Reports one request to the metrics registry; connect is 0 when a pooled connection was reused
+    end = time.perf_counter()
+    phases = {k: v for k, v in (phases or {}).items() if not k.startswith("_")}
+    phases.setdefault("connect", 0.0)
+    if headers_at is not None:
+        phases["ttfb"] = headers_at - start
+        phases["body"] = end - headers_at
+    get_metrics().record_attempt(url, request_model(url, payload), end - start,
+                                 outcome_of(status, error, text if status and status >= 400 else ""), phases)
+
+
+def get_async_session():
+    """
+    Returns the shared aiohttp session for the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = create_async_session()
+        _sessions[loop] = session
+    return session
+
+
+async def close_async_session():
+    """
+    Closes the shared session for the running event loop, if one was created.
+    """
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def client_timeout(deadline):
+    """
+    Returns an aiohttp ClientTimeout bounded by the deadline's remaining budget,
+    with its connect and read limits. Raises DeadlineExceeded if none is left.
+    """
+    import aiohttp
+
+    deadline.check()
+    remaining = deadline.remaining()
+    return aiohttp.ClientTimeout(total=remaining, connect=min(deadline.connect_timeout, remaining),
+                                 sock_read=min(deadline.read_timeout, remaining))
+
+
+def _timeout_kwargs(deadline):
+    return {} if deadline is None else {"timeout": client_timeout(deadline)}
+
+
+async def request_json(session, url, headers, payload=None, method="POST", params=None, deadline=None,
+                       max_bytes=None):
+    """
+    Sends a JSON request and returns (status, decoded_body, raw_text) without
+    raising for HTTP errors. decoded_body is None when the body is not JSON.
+    With a Deadline the request, body included, is timed out when its budget runs
+    out. With max_bytes, at most that much of the body is read; a longer one is
+    dropped and decodes to None with an empty raw_text. Error bodies are cut to
+    DEFAULT_MAX_ERROR_BYTES.
+    """
+    phases, start, headers_at = {}, time.perf_counter(), None
+    try:
+        async with session.request(method, url, headers=headers, json=payload, params=params,
+                                   trace_request_ctx=phases, **_timeout_kwargs(deadline)) as response:
+            headers_at = time.perf_counter()
+            if response.status >= 400:
+                text = await _read_prefix(response, DEFAULT_MAX_ERROR_BYTES)
+            elif max_bytes is None:
+                text = await response.text()
+            else:
+                body = await _read_capped(response, max_bytes)
+                text = None if body is None else body.decode("utf-8", errors="replace")
+    except Exception as e:
+        _record(url, payload, start, headers_at, error=e, phases=phases)
+        raise
+    _record(url, payload, start, headers_at, response.status, text=text or "", phases=phases)
+    if text is None:
+        return response.status, None, ""
+    try:
+        data = json.loads(text) if text else {}
+    except ValueError:
+        data = None
+    return response.status, data, text
+
+
+async def _read_prefix(response, max_bytes):
+    # Returns at most the first max_bytes of the body as text; the rest is left unread
+    try:
+        body = await response.content.readexactly(max_bytes)
+    except asyncio.IncompleteReadError as e:
+        body = e.partial
+    return body.decode("utf-8", errors="replace")
+
+
+async def _read_capped(response, max_bytes):
+    # Returns the body, or None if it is longer than max_bytes
+    try:
+        await response.content.readexactly(max_bytes + 1)
+    except asyncio.IncompleteReadError as e:
+        return e.partial
+    return None
+
+
+async def post_json(session, url, headers, payload, deadline=None, max_bytes=None):
+    """
+    POSTs payload as JSON and returns the decoded response body.
+    Raises AsyncHTTPError for 4XX/5XX responses, with at most
+    DEFAULT_MAX_ERROR_BYTES of the error body.
+    With max_bytes, at most that much of a successful response is read; a longer,
+    empty or non-JSON body decodes to {} (see http_session.read_json).
+    """
+    phases, start, headers_at = {}, time.perf_counter(), None
+    body = None
+    try:
+        async with session.post(url, headers=headers, json=payload, trace_request_ctx=phases,
+                                **_timeout_kwargs(deadline)) as response:
+            headers_at = time.perf_counter()
+            if response.status >= 400:
+                text = await _read_prefix(response, DEFAULT_MAX_ERROR_BYTES)
+            elif max_bytes is None:
+                text = await response.text()
+            else:
+                text, body = "", await _read_capped(response, max_bytes)
+    except Exception as e:
+        _record(url, payload, start, headers_at, error=e, phases=phases)
+        raise
+    _record(url, payload, start, headers_at, response.status, text=text, phases=phases)
+    if response.status >= 400:
+        raise AsyncHTTPError(response.status, response.reason, url, text, response.headers)
+    if max_bytes is None:
+        return json.loads(text) if text else {}
+    try:
+        return json.loads(body) if body else {}
+    except ValueError:
+        return {}
+
+
+def describe_error(e):
+    """
+    Formats an exception the same way the sync validators do: the exception
+    text followed by the provider's error message when one is available.
+    """
+    error_detail = ""
+    if isinstance(e, AsyncHTTPError) and e.error_message():
+        error_detail = f" - {e.error_message()}"
+    if isinstance(e, asyncio.TimeoutError):
+        # aiohttp's timeouts have no message; a DeadlineExceeded does
+        return str(e) or "Request timed out"
+    return f"{str(e)}{error_detail}"
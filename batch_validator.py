@@ -0,0 +1,586 @@
+import sys
+import json
+import time
+import hashlib
+import argparse
+import functools
+import threading
+import importlib
+import contextlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from http_session import create_session, set_session, DEFAULT_POOL_MAXSIZE
+from probe_runner import (TIERS, TIER_AUTH, PROFILES, PROFILE_LEAN, check_tier, check_profile,
+                          malformed_result)
+from validation_cache import (ValidationCache, SQLiteCacheBackend, DEFAULT_SUCCESS_TTL, DEFAULT_FAILURE_TTL,
+                              cache_variant)
+from rate_limiter import RateLimiter, DEFAULT_RATE, DEFAULT_RATE_LIMIT_RETRIES
+from deadline import DEFAULT_DEADLINE
+from checkpoint import open_checkpoint
+from metrics import write_metrics
+from retry_policy import RetryPolicy, RetryBudget, DEFAULT_MAX_RETRIES, DEFAULT_BUDGET_RATIO
+from provider_registry import get_provider, registered_providers
+from key_format import get_key_formats, set_key_formats
+
+# Provider name -> (module, function) of its single-key validator. Modules are
+# imported on first use, so a run that only checks Mistral keys never imports
+# openai_validator or gemini_validator. Providers only registered in
+# provider_registry are validated by provider_engine from their spec.
+VALIDATORS = {
+    "openai": ("openai_validator", "validate_openai_api_key"),
+    "claude": ("claude_validator", "validate_claude_api_key"),
+    "gemini": ("gemini_validator", "validate_gemini_api_key"),
+    "mistral": ("mistral_validator", "validate_mistral_api_key"),
+    "xai": ("xai_validator", "validate_xai_api_key"),
+    "together": ("together_validator", "validate_together_api_key"),
+}
+
+# Alternative spellings accepted in key files
+PROVIDER_ALIASES = {
+    "anthropic": "claude",
+    "google": "gemini",
+    "grok": "xai",
+    "mistralai": "mistral",
+    "togetherai": "together",
+}
+
+# Key prefix -> provider, checked in order so longer prefixes win over "sk-".
+# Only used when key format detection is disabled or does not recognise the key.
+KEY_PREFIXES = (
+    ("sk-ant-", "claude"),
+    ("sk-proj-", "openai"),
+    ("sk-svcacct-", "openai"),
+    ("sk-admin-", "openai"),
+    ("AIza", "gemini"),
+    ("xai-", "xai"),
+    ("tgp_", "together"),
+    ("sk-", "openai"),
+)
+
+DEFAULT_MAX_WORKERS = 32
+DEFAULT_PROVIDER_LIMIT = 8
+
+# Per-provider overrides of DEFAULT_PROVIDER_LIMIT, for providers that need a lower cap
+DEFAULT_PROVIDER_LIMITS = {}
+
+
+class ProviderSlots:
+    """
+    Caps the validations in flight per provider across every batch sharing it,
+    e.g. all the requests of a validation_server, where each batch's own
+    provider_limits only bound that batch. limits maps provider -> slots;
+    providers not listed use DEFAULT_PROVIDER_LIMITS or DEFAULT_PROVIDER_LIMIT.
+    Cache hits and malformed keys take no slot.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = dict(DEFAULT_PROVIDER_LIMITS)
+        for provider, limit in (limits or {}).items():
+            self.limits[normalize_provider(provider)] = max(1, int(limit))
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, provider):
+        with self._lock:
+            semaphore = self._semaphores.get(provider)
+            if semaphore is None:
+                semaphore = self._semaphores[provider] = threading.BoundedSemaphore(
+                    self.limits.get(provider, DEFAULT_PROVIDER_LIMIT))
+            return semaphore
+
+    def call(self, provider, validate_fn, api_key, **kwargs):
+        """
+        Calls validate_fn(api_key, **kwargs) once one of the provider's slots is free.
+        """
+        with self._semaphore(provider):
+            return validate_fn(api_key, **kwargs)
+
+
+def normalize_provider(provider):
+    """
+    Maps a provider name or alias to the key used in VALIDATORS or provider_registry.
+    Raises ValueError for unknown providers.
+    """
+    name = provider.strip().lower().replace("-", "").replace("_", "").replace(" ", "")
+    name = PROVIDER_ALIASES.get(name, name)
+    if name not in VALIDATORS and name not in registered_providers():
+        raise ValueError(f"Unknown provider: {provider!r}")
+    return name
+
+
+def get_validator(provider):
+    """
+    Returns the single-key validator for a provider in VALIDATORS, importing its module on first use,
+    or the spec-driven provider_engine validator for one only in provider_registry.
+    """
+    if provider not in VALIDATORS:
+        engine = importlib.import_module("provider_engine")
+        return functools.partial(engine.validate_provider_key, get_provider(provider))
+    module_name, function_name = VALIDATORS[provider]
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def set_base_urls(base_urls):
+    """
+    Points providers at other API base URLs, e.g. {"claude": "http://127.0.0.1:8080/claude/v1"}
+    for a mock_provider_server. Only the listed providers' modules are imported.
+    """
+    for provider, base_url in base_urls.items():
+        provider = normalize_provider(provider)
+        if provider not in VALIDATORS:
+            get_provider(provider).set_base_url(base_url)
+            continue
+        module_name, _ = VALIDATORS[provider]
+        importlib.import_module(module_name).set_base_url(base_url)
+
+
+def detect_provider(api_key):
+    """
+    Guesses the provider from the key: the key_prefixes of providers only in
+    provider_registry first, then the key formats of key_format (which also
+    recognise unprefixed Mistral and Together keys), then KEY_PREFIXES.
+    Returns the provider name, or None if the key is not recognised.
+    """
+    for name, spec in registered_providers().items():
+        if name not in VALIDATORS and api_key.startswith(spec.key_prefixes):
+            return name
+    key_formats = get_key_formats()
+    detected = key_formats.detect(api_key) if key_formats is not None else None
+    if detected is not None:
+        return detected
+    for prefix, provider in KEY_PREFIXES:
+        if api_key.startswith(prefix):
+            return provider
+    return None
+
+
+def key_fingerprint(api_key):
+    """
+    Returns a short, non-reversible identifier for an API key so results can be
+    logged and compared without exposing the key itself.
+    """
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def load_key_pairs(path):
+    """
+    Reads (provider, key) pairs from a file, one pair per line.
+    Lines may be separated by a comma, tab or whitespace; blank lines and lines
+    starting with '#' are ignored. A line holding only a key gets its provider
+    from detect_provider(). Use '-' to read from stdin.
+    """
+    if path == "-":
+        return parse_key_pairs(sys.stdin)
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_key_pairs(f)
+
+
+def parse_key_pairs(lines):
+    """
+    Parses an iterable of "provider,key" (or bare key) lines into a list of
+    (provider, key) tuples. Raises ValueError for a bare key of unknown format.
+    """
+    pairs = []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if "," in line:
+            provider, _, api_key = line.partition(",")
+        else:
+            parts = line.split(None, 1)
+            if len(parts) == 1:
+                provider, api_key = detect_provider(line), line
+                if provider is None:
+                    raise ValueError(f"Line {line_number}: cannot detect the provider; expected 'provider,key'")
+            else:
+                provider, api_key = parts
+        pairs.append((provider.strip(), api_key.strip()))
+    return pairs
+
+
+def _new_result(index, provider, api_key, tier):
+    return {
+        "index": index,
+        "provider": provider,
+        "key_fingerprint": key_fingerprint(api_key),
+        "tier": tier,
+        "valid": False,
+        "text_valid": False,
+        "text_response": None,
+        "image_valid": False,
+        "image_response": None,
+        "text_prompt": None,
+        "image_prompt": None,
+        "elapsed": None,
+        "cached": False,
+        "rate_limited": False,
+        "transient": False,
+        "format_error": None,
+        "routed_from": None,
+        "error": None,
+    }
+
+
+def _malformed_one(index, provider, api_key, tier, problem):
+    """
+    The result dict of a key the pre-check ruled out, with its KeyProblem code in format_error.
+    """
+    result = _new_result(index, provider, api_key, tier)
+    result.update(malformed_result(provider, tier, problem).to_dict())
+    result["format_error"] = problem.code
+    result["elapsed"] = 0.0
+    return result
+
+
+def _validate_one(index, provider, api_key, validator_kwargs, cache, rate_limiter=None, routed_from=None,
+                  provider_slots=None):
+    """
+    Runs the provider's validator for one key and packs the outcome into a dict:
+    the flat ValidationResult fields (text_*/image_* with error class, HTTP status
+    and latency) plus index, key_fingerprint, elapsed, cached, rate_limited,
+    transient, format_error, routed_from and error.
+    """
+    result = _new_result(index, provider, api_key, validator_kwargs["tier"])
+    result["routed_from"] = routed_from
+    validate_fn = get_validator(provider)
+    if rate_limiter is not None:
+        # The auth tier sends one request per key, the full tier at least two
+        cost = 1 if validator_kwargs["tier"] == TIER_AUTH else 2
+        validate_fn = functools.partial(rate_limiter.call, provider, validate_fn=validate_fn, cost=cost)
+    if provider_slots is not None:
+        validate_fn = functools.partial(provider_slots.call, provider, validate_fn)
+    start = time.perf_counter()
+    try:
+        if cache is not None:
+            variant = cache_variant(validator_kwargs["tier"], validator_kwargs["profile"])
+            outcome, result["cached"] = cache.validate(provider, api_key, validate_fn, variant=variant,
+                                                       **validator_kwargs)
+        else:
+            outcome = validate_fn(api_key, **validator_kwargs)
+        result.update(outcome.to_dict())
+        result["rate_limited"] = outcome.rate_limited
+        result["transient"] = outcome.transient
+    except Exception as e:
+        # Validators turn every HTTP failure into a probe result, so anything reaching
+        # here came from outside the probes (cache, limiter or a validator bug).
+        result["error"] = f"{e.__class__.__name__}: {str(e)}"
+    result["elapsed"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def batch_retry_policy(max_retries=DEFAULT_MAX_RETRIES, budget_ratio=DEFAULT_BUDGET_RATIO):
+    """
+    Returns the RetryPolicy for one batch: transient failures are retried from a
+    RetryBudget shared by all its keys, so a provider outage costs at most
+    budget_ratio extra requests. 429s are left to the batch's RateLimiter, which
+    pauses the whole provider instead of retrying one probe.
+    """
+    return RetryPolicy(max_retries=max_retries, retry_rate_limits=False, budget=RetryBudget(budget_ratio))
+
+
+def _next_pending(pending, provider, checkpoint):
+    # Takes the provider's next key, skipping keys the checkpoint already holds. Checking
+    # here rather than up front lets a resumed run start sending requests right away.
+    queue = pending[provider]
+    item = None
+    while queue and item is None:
+        item = queue.popleft()
+        if checkpoint is not None and checkpoint.is_done(provider, key_fingerprint(item[1])):
+            item = None
+    if not queue:
+        del pending[provider]
+    return item
+
+
+def iter_validate_keys(pairs, max_workers=DEFAULT_MAX_WORKERS, provider_limits=None, parallel_probes=False,
+                       cache=None, tier=TIER_AUTH, rate_limiter=None, deadline=DEFAULT_DEADLINE, checkpoint=None,
+                       retry_policy=None, profile=PROFILE_LEAN, provider_slots=None, executor=None):
+    """
+    Validates many (provider, key) pairs concurrently and yields one result dict
+    per key as soon as it finishes (not in input order; use the "index" field).
+
+    max_workers caps the total number of validations in flight.
+    provider_limits maps provider -> max in-flight validations for that provider;
+    providers not listed use DEFAULT_PROVIDER_LIMITS or DEFAULT_PROVIDER_LIMIT.
+    parallel_probes runs each key's text and image probes at the same time.
+    cache is an optional ValidationCache; keys it holds are answered without a request.
+    tier defaults to "auth" (one cheap request per key); pass "full" to also run
+    the text and image generation probes.
+    profile is the probe profile of the full tier; the default "lean" sends the
+    smallest probes, "standard" the descriptive prompts of the single-key CLIs.
+    rate_limiter is the RateLimiter pacing requests per provider; by default a new
+    one with DEFAULT_RATE is used. On a 429 the provider is paused for its
+    Retry-After, its concurrency is lowered below the provider limit (and raised
+    again as requests succeed) and the key is retried instead of reported invalid.
+    deadline is the most seconds one validation may take, fallback models
+    included; time spent waiting on the rate limiter does not count.
+    checkpoint is an optional journal from checkpoint.open_checkpoint(): pairs it
+    already holds are skipped without a result, and every finished result is
+    recorded in it so an interrupted run can be started again where it stopped.
+    retry_policy retries probes that fail transiently (connection errors, 5XX);
+    by default batch_retry_policy(), whose budget is shared by the whole batch.
+    Keys are pre-checked against key_format first: a key that fits only another
+    provider's prefixed format is validated as that provider's (with routed_from
+    set), and a key that cannot be valid is reported malformed at once, with its
+    KeyProblem code in format_error, without taking a worker or a request.
+    provider_slots is an optional ProviderSlots shared with other batches running
+    at the same time, capping their validations in flight per provider together.
+    executor is an optional ThreadPoolExecutor to run the validations on instead
+    of one started and stopped for this batch; max_workers still caps the batch.
+    """
+    if retry_policy is None:
+        retry_policy = batch_retry_policy()
+    validator_kwargs = {"parallel": parallel_probes, "tier": check_tier(tier), "structured": True,
+                        "deadline": deadline, "retry": retry_policy, "profile": check_profile(profile)}
+    limits = dict(DEFAULT_PROVIDER_LIMITS)
+    for provider, limit in (provider_limits or {}).items():
+        limits[normalize_provider(provider)] = max(1, int(limit))
+
+    # Queue keys per provider so a slow provider at its limit never blocks the others
+    pending = {}
+    malformed = []
+    key_formats = get_key_formats()
+    for index, (provider, api_key) in enumerate(pairs):
+        provider = normalize_provider(provider)
+        routed_from, problem = None, None
+        if key_formats is not None:
+            routed, problem = key_formats.route(provider, api_key)
+            if routed != provider:
+                routed_from, provider = provider, routed
+        if problem is not None:
+            malformed.append(_malformed_one(index, provider, api_key, validator_kwargs["tier"], problem))
+        else:
+            pending.setdefault(provider, deque()).append((index, api_key, routed_from))
+
+    if rate_limiter is None:
+        rate_limiter = RateLimiter()
+    # Adaptive concurrency per provider, capped by the configured limit
+    concurrency = {provider: rate_limiter.for_provider(provider, limits.get(provider, DEFAULT_PROVIDER_LIMIT)).concurrency
+                   for provider in pending}
+
+    in_flight = {provider: 0 for provider in pending}
+    futures = {}
+
+    if executor is None:
+        executor_context = ThreadPoolExecutor(max_workers=max_workers)
+    else:
+        # A caller's executor outlives the batch and is left running
+        executor_context = contextlib.nullcontext(executor)
+
+    with executor_context as executor:
+        try:
+            for result in malformed:
+                if checkpoint is not None:
+                    if checkpoint.is_done(result["provider"], result["key_fingerprint"]):
+                        continue
+                    checkpoint.record(result)
+                yield result
+            while pending or futures:
+                # Fill free slots round-robin across providers that are under their limit
+                submitted = True
+                while submitted and len(futures) < max_workers:
+                    submitted = False
+                    for provider in list(pending):
+                        if len(futures) >= max_workers:
+                            break
+                        if in_flight[provider] >= min(limits.get(provider, DEFAULT_PROVIDER_LIMIT),
+                                                      concurrency[provider].limit):
+                            continue
+                        item = _next_pending(pending, provider, checkpoint)
+                        if item is None:
+                            continue
+                        index, api_key, routed_from = item
+                        future = executor.submit(_validate_one, index, provider, api_key, validator_kwargs, cache,
+                                                 rate_limiter, routed_from, provider_slots)
+                        futures[future] = provider
+                        in_flight[provider] += 1
+                        submitted = True
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight[futures.pop(future)] -= 1
+                    result = future.result()
+                    if checkpoint is not None:
+                        checkpoint.record(result)
+                    yield result
+        finally:
+            # Write out buffered records even when the caller stops early or the run is interrupted
+            if checkpoint is not None:
+                checkpoint.flush()
+
+
+def validate_keys(pairs, max_workers=DEFAULT_MAX_WORKERS, provider_limits=None, parallel_probes=False, cache=None,
+                  tier=TIER_AUTH, rate_limiter=None, deadline=DEFAULT_DEADLINE, checkpoint=None, retry_policy=None,
+                  profile=PROFILE_LEAN, provider_slots=None, executor=None):
+    """
+    Validates many (provider, key) pairs concurrently.
+    Returns a list of result dicts in the same order as the input pairs; with a
+    checkpoint, pairs it already held are left out.
+    """
+    results = list(iter_validate_keys(pairs, max_workers=max_workers, provider_limits=provider_limits,
+                                      parallel_probes=parallel_probes, cache=cache, tier=tier,
+                                      rate_limiter=rate_limiter, deadline=deadline, checkpoint=checkpoint,
+                                      retry_policy=retry_policy, profile=profile, provider_slots=provider_slots,
+                                      executor=executor))
+    results.sort(key=lambda r: r["index"])
+    return results
+
+
+def summarize(results):
+    """
+    Returns per-provider counts of total, text-valid, image-valid, errored, still
+    rate-limited and still transiently failing keys, plus "failures": failed text
+    probes per error class.
+    """
+    summary = {}
+    for result in results:
+        counts = summary.setdefault(result["provider"], {"total": 0, "text_valid": 0, "image_valid": 0, "errors": 0,
+                                                         "rate_limited": 0, "transient": 0, "failures": {}})
+        counts["total"] += 1
+        counts["text_valid"] += int(bool(result["text_valid"]))
+        counts["image_valid"] += int(bool(result["image_valid"]))
+        counts["errors"] += int(result["error"] is not None)
+        counts["rate_limited"] += int(bool(result.get("rate_limited")))
+        counts["transient"] += int(bool(result.get("transient")))
+        error_class = result.get("text_error")
+        if error_class:
+            counts["failures"][error_class] = counts["failures"].get(error_class, 0) + 1
+    return summary
+
+
+def _parse_provider_limits(values, convert=int):
+    limits = {}
+    for value in values or []:
+        provider, _, limit = value.partition("=")
+        if not limit:
+            raise argparse.ArgumentTypeError(f"Expected provider=N, got {value!r}")
+        limits[normalize_provider(provider)] = convert(limit)
+    return limits
+
+
+def _rate(value):
+    # 0 means no rate limit
+    return float(value) or None
+
+
+def add_batch_arguments(parser):
+    """
+    Adds the concurrency, tier and cache options shared by the batch command lines.
+    """
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="Maximum validations in flight overall")
+    parser.add_argument("--provider-limit", action="append", metavar="PROVIDER=N",
+                        help="Maximum validations in flight for one provider (repeatable)")
+    parser.add_argument("--tier", choices=TIERS, default=TIER_AUTH,
+                        help="'auth' checks only that each key authenticates; 'full' also probes generation")
+    parser.add_argument("--probe-profile", choices=PROFILES, default=PROFILE_LEAN,
+                        help="Generation probes of the full tier: 'lean' sends one-token requests, "
+                             "'standard' the descriptive prompts")
+    parser.add_argument("--rate", action="append", metavar="PROVIDER=R",
+                        help="Requests per second for one provider, 0 for unlimited (repeatable)")
+    parser.add_argument("--default-rate", type=_rate, default=DEFAULT_RATE,
+                        help="Requests per second for providers without --rate, 0 for unlimited")
+    parser.add_argument("--key-rate", type=_rate, help="Requests per second allowed for any single key")
+    parser.add_argument("--rate-limit-retries", type=int, default=DEFAULT_RATE_LIMIT_RETRIES,
+                        help="Times a rate-limited (429) validation is retried before it is reported")
+    parser.add_argument("--retries", type=int, default=DEFAULT_MAX_RETRIES,
+                        help="Times a probe failing with a connection error or 5XX is retried, 0 to disable")
+    parser.add_argument("--retry-budget", type=float, default=DEFAULT_BUDGET_RATIO,
+                        help="Most retries per validated key across the batch, e.g. 0.1 for one in ten")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE,
+                        help="Most seconds one key's validation may take, fallback models included")
+    parser.add_argument("--parallel-probes", action="store_true",
+                        help="Run each key's text and image probes at the same time")
+    parser.add_argument("--cache-db", help="Cache results in this SQLite file and reuse them across runs")
+    parser.add_argument("--success-ttl", type=float, default=DEFAULT_SUCCESS_TTL,
+                        help="Seconds a cached valid result is reused")
+    parser.add_argument("--failure-ttl", type=float, default=DEFAULT_FAILURE_TTL,
+                        help="Seconds a cached invalid result is reused")
+    parser.add_argument("--checkpoint", metavar="PATH",
+                        help="Journal finished results here (JSON lines, or SQLite for .db/.sqlite) and skip "
+                             "keys it already holds, so an interrupted run can be restarted")
+    parser.add_argument("--metrics-file", metavar="PATH",
+                        help="Write latency histograms by provider, probe, model and outcome here in the "
+                             "Prometheus text format when the run ends")
+    parser.add_argument("--no-format-check", action="store_true",
+                        help="Send every key to its provider, even keys whose format rules them out")
+    parser.add_argument("--base-url", action="append", metavar="PROVIDER=URL",
+                        help="Send one provider's requests to another API base URL, such as a "
+                             "mock_provider_server (repeatable)")
+
+
+def setup_from_args(args):
+    """
+    Sizes the shared HTTP session for the requested workers, applies --base-url
+    and --no-format-check and opens the cache, if any. Returns the ValidationCache or None.
+    """
+    set_base_urls(_parse_provider_limits(args.base_url, str))
+    if args.no_format_check:
+        set_key_formats(None)
+    # Size the shared keep-alive pool so every worker (and its parallel probe) can hold a connection
+    set_session(create_session(pool_maxsize=max(DEFAULT_POOL_MAXSIZE, args.workers * 2)))
+    if not args.cache_db:
+        return None
+    return ValidationCache(success_ttl=args.success_ttl, failure_ttl=args.failure_ttl,
+                           disk_backend=SQLiteCacheBackend(args.cache_db))
+
+
+def batch_options_from_args(args):
+    """
+    Returns the iter_validate_keys/validate_keys keyword arguments for parsed options.
+    """
+    return {
+        "max_workers": args.workers,
+        "provider_limits": _parse_provider_limits(args.provider_limit),
+        "parallel_probes": args.parallel_probes,
+        "tier": args.tier,
+        "profile": args.probe_profile,
+        "deadline": args.deadline,
+        "rate_limiter": RateLimiter(_parse_provider_limits(args.rate, _rate), default_rate=args.default_rate,
+                                    key_rate=args.key_rate, max_retries=args.rate_limit_retries),
+        "checkpoint": open_checkpoint(args.checkpoint) if args.checkpoint else None,
+        "retry_policy": batch_retry_policy(args.retries, args.retry_budget),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate many API keys across providers concurrently.")
+    parser.add_argument("keys_file", help="File with one 'provider,key' pair per line ('-' for stdin)")
+    add_batch_arguments(parser)
+    parser.add_argument("--output", help="Write the full results as JSON to this file")
+    args = parser.parse_args()
+
+    print("Batch API Key Validator")
+    print("-----------------------")
+
+    cache = setup_from_args(args)
+
+    pairs = load_key_pairs(args.keys_file)
+    print(f"\nValidating {len(pairs)} keys with up to {args.workers} workers...")
+
+    start = time.perf_counter()
+    options = batch_options_from_args(args)
+    results = validate_keys(pairs, cache=cache, **options)
+    elapsed = time.perf_counter() - start
+    if options["checkpoint"] is not None:
+        options["checkpoint"].close()
+        if len(results) < len(pairs):
+            print(f"Skipped {len(pairs) - len(results)} keys already in {args.checkpoint}")
+    if args.metrics_file:
+        write_metrics(args.metrics_file)
+
+    print("\nResults:")
+    for provider, counts in sorted(summarize(results).items()):
+        print(f"{provider}: {counts['text_valid']}/{counts['total']} text valid, "
+              f"{counts['image_valid']}/{counts['total']} image valid, {counts['errors']} errors"
+              + (f", {counts['rate_limited']} still rate limited" if counts["rate_limited"] else "")
+              + (f", {counts['transient']} still failing transiently" if counts["transient"] else ""))
+        if counts["failures"]:
+            print("  failures: " + ", ".join(f"{name}={n}" for name, n in sorted(counts["failures"].items())))
+    print(f"\nValidated {len(results)} keys in {elapsed:.1f}s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Full results written to {args.output}")
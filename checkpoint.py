@@ -0,0 +1,241 @@
+import os
+import re
+import json
+import mmap
+import time
+import array
+import hashlib
+import sqlite3
+import threading
+
+# Records buffered before they are written out, and the longest a record waits in
+# the buffer. A crash loses at most this much work, which is simply validated again.
+DEFAULT_FLUSH_EVERY = 256
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# Journal files with these extensions are SQLite databases; anything else is JSON lines
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+# Suffix of the index file kept next to a JSON lines journal
+INDEX_SUFFIX = ".idx"
+
+# Every journal line starts with the provider and key fingerprint, so a lost index
+# can be rebuilt without parsing each line as JSON.
+_LINE_HEAD = re.compile(rb'^\{"provider":"([^"\\]+)","key_fingerprint":"([0-9a-f]+)"', re.MULTILINE)
+
+
+def pair_digest(provider, fingerprint):
+    """
+    Returns the signed 64-bit digest a (provider, key fingerprint) pair is indexed by.
+    """
+    digest = hashlib.blake2b(f"{provider}\0{fingerprint}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def should_checkpoint(result):
+    """
+    Returns True if a batch result is final. Results still rate limited or failing
+    transiently when retries ran out say nothing about the key and are validated
+    again on restart.
+    """
+    return not (result.get("rate_limited") or result.get("transient"))
+
+
+def _truncate_to(f, size, unit):
+    # Drops the tail of a write cut short by a crash
+    end = size - size % unit
+    if end < size:
+        f.truncate(end)
+    return end
+
+
+class CheckpointJournal:
+    """
+    Append-only JSON lines file of finished batch results, used to resume a run
+    that stopped halfway without validating the same keys again.
+
+    Next to the journal, <path>.idx holds one 8-byte pair_digest() per record, so
+    reopening a journal of millions of results reads one small binary file instead
+    of parsing the results. Records are buffered and written with one append to
+    each file per flush, journal first: a crash can leave a result without an
+    index entry (it is validated again), never an index entry without its result.
+    """
+
+    def __init__(self, path, flush_every=DEFAULT_FLUSH_EVERY, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._lines = []
+        self._digests = array.array("q")
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._completed = self._load()
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._index_fd = os.open(self.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def _load(self):
+        # Drop a last line cut short by a crash, then read the index (rebuilding it if it is missing)
+        try:
+            with open(self.path, "r+b") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        end = data.rfind(b"\n") + 1
+                    if end < size:
+                        f.truncate(end)
+        except FileNotFoundError:
+            size = 0
+        digests = array.array("q")
+        try:
+            with open(self.index_path, "r+b") as f:
+                end = _truncate_to(f, os.fstat(f.fileno()).st_size, digests.itemsize)
+                digests.frombytes(f.read(end))
+        except FileNotFoundError:
+            if size:
+                digests = self._rebuild_index()
+        return set(digests)
+
+    def _rebuild_index(self):
+        digests = array.array("q")
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for provider, fingerprint in _LINE_HEAD.findall(data):
+                digests.append(pair_digest(provider.decode("utf-8"), fingerprint.decode("ascii")))
+        with open(self.index_path + ".tmp", "wb") as f:
+            f.write(digests.tobytes())
+        os.replace(self.index_path + ".tmp", self.index_path)
+        return digests
+
+    def is_done(self, provider, fingerprint):
+        return pair_digest(provider, fingerprint) in self._completed
+
+    def record(self, result):
+        """
+        Adds a finished result (a batch result dict with provider and key_fingerprint).
+        Results that should_checkpoint() rejects are ignored.
+        """
+        if not should_checkpoint(result):
+            return
+        digest = pair_digest(result["provider"], result["key_fingerprint"])
+        line = json.dumps({"provider": result["provider"], "key_fingerprint": result["key_fingerprint"],
+                           **result}, separators=(",", ":"))
+        with self._lock:
+            self._completed.add(digest)
+            self._lines.append(line)
+            self._digests.append(digest)
+            if (len(self._lines) >= self.flush_every
+                    or time.monotonic() - self._flushed_at >= self.flush_interval):
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._lines:
+            os.write(self._fd, ("\n".join(self._lines) + "\n").encode("utf-8"))
+            os.write(self._index_fd, self._digests.tobytes())
+            self._lines = []
+            self._digests = array.array("q")
+        self._flushed_at = time.monotonic()
+
+    def records(self):
+        """
+        Yields every journaled result, oldest first.
+        """
+        self.flush()
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.endswith("\n"):
+                    yield json.loads(line)
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            os.close(self._fd)
+            os.close(self._index_fd)
+
+    def __len__(self):
+        return len(self._completed)
+
+
+class SQLiteCheckpoint:
+    """
+    Checkpoint journal kept in SQLite, for runs whose results should be queried
+    afterwards. Same interface as CheckpointJournal. Nothing is loaded up front:
+    is_done() is a primary key lookup, and buffered records are inserted in one
+    transaction per flush.
+    """
+
+    def __init__(self, path, flush_every=DEFAULT_FLUSH_EVERY, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._buffer = {}
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "digest INTEGER PRIMARY KEY, provider TEXT NOT NULL, key_fingerprint TEXT NOT NULL, record TEXT NOT NULL)"
+        )
+
+    def is_done(self, provider, fingerprint):
+        digest = pair_digest(provider, fingerprint)
+        with self._lock:
+            if digest in self._buffer:
+                return True
+            return self._conn.execute("SELECT 1 FROM results WHERE digest = ?", (digest,)).fetchone() is not None
+
+    def record(self, result):
+        if not should_checkpoint(result):
+            return
+        digest = pair_digest(result["provider"], result["key_fingerprint"])
+        with self._lock:
+            self._buffer[digest] = (digest, result["provider"], result["key_fingerprint"],
+                                    json.dumps(result, separators=(",", ":")))
+            if (len(self._buffer) >= self.flush_every
+                    or time.monotonic() - self._flushed_at >= self.flush_interval):
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (digest, provider, key_fingerprint, record) VALUES (?, ?, ?, ?)",
+                self._buffer.values())
+            self._conn.execute("COMMIT")
+            self._buffer = {}
+        self._flushed_at = time.monotonic()
+
+    def records(self):
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute("SELECT record FROM results").fetchall()
+        for (record,) in rows:
+            yield json.loads(record)
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] + len(self._buffer)
+
+
+def open_checkpoint(path, **kwargs):
+    """
+    Opens the checkpoint journal at path, creating it if needed: SQLite for
+    .db/.sqlite/.sqlite3 files, append-only JSON lines otherwise.
+    """
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        return SQLiteCheckpoint(path, **kwargs)
+    return CheckpointJournal(path, **kwargs)
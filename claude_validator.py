@@ -1,92 +1,45 @@
-import os
 import sys
-import requests
-import json
 
-def validate_claude_api_key(api_key):
+from probe_runner import TIER_FULL, PROFILE_STANDARD
+from provider_registry import get_provider
+from provider_engine import validate_provider_key, validate_provider_key_async
+
+PROVIDER = "claude"
+
+# Endpoints, models and probes live in the provider's spec in provider_registry
+SPEC = get_provider(PROVIDER)
+MODEL = SPEC.text.models[0]
+TEST_PROMPT = SPEC.text.prompt
+VISION_TEST_PROMPT = SPEC.image.prompt
+
+
+def set_base_url(base_url=None):
+    """
+    Points the validator at another API base URL, such as a mock_provider_server,
+    or back at CLAUDE_BASE_URL / the spec's default when base_url is None.
+    """
+    SPEC.set_base_url(base_url)
+
+
+def validate_claude_api_key(api_key, *, parallel=False, session=None, tier=TIER_FULL, structured=False,
+                            deadline=None, retry=None, profile=PROFILE_STANDARD):
     """
     Validates a Claude API key by testing both text and image generation/understanding capabilities.
-    Returns a tuple (is_valid_text, text_response, is_valid_image, image_response)
+    Keyword options are those of provider_engine.validate_provider_key.
+    Returns a tuple (is_valid_text, text_response, is_valid_image, image_response, test_prompt, vision_test_prompt)
     """
-    text_valid = False
-    image_valid = False
-    text_response = None
-    image_response = None
-    test_prompt = "Say 'Claude API key is working correctly!' in one short sentence."
-    vision_test_prompt = "This is a test for vision capability. Please respond with 'Claude vision capability is working correctly!'"
-    
-    # API endpoint for Claude
-    api_url = "https://api.anthropic.com/v1/messages"
-    
-    # Headers for the request
-    headers = {
-        "anthropic-version": "2023-06-01",
-        "content-type": "application/json",
-        "x-api-key": api_key
-    }
-    
-    # Test text generation
-    try:
-        payload = {
-            "model": "claude-3-haiku-20240307",
-            "max_tokens": 100,
-            "messages": [
-                {"role": "user", "content": test_prompt}
-            ]
-        }
-        
-        response = requests.post(api_url, headers=headers, json=payload)
-        response.raise_for_status()  # Raise exception for 4XX/5XX errors
-        
-        response_data = response.json()
-        text_response = response_data.get("content", [{}])[0].get("text", "").strip()
-        text_valid = True
-    except Exception as e:
-        error_detail = ""
-        if hasattr(e, 'response') and e.response:
-            try:
-                error_detail = f" - {e.response.json().get('error', {}).get('message', '')}"
-            except:
-                pass
-        text_response = f"Text generation failed: {str(e)}{error_detail}"
-    
-    # Test image understanding capabilities (Claude 3 can understand images)
-    # Note: This tests image understanding rather than generation
-    try:
-        # Using Claude's vision capabilities to validate the API key for multimodal use
-        # Since Claude doesn't generate images, we'll check if it can process an image-related request
-        payload = {
-            "model": "claude-3-haiku-20240307",
-            "max_tokens": 100,
-            "messages": [
-                {
-                    "role": "user", 
-                    "content": [
-                        {
-                            "type": "text", 
-                            "text": vision_test_prompt
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        response = requests.post(api_url, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        response_data = response.json()
-        image_response = response_data.get("content", [{}])[0].get("text", "").strip()
-        image_valid = True
-    except Exception as e:
-        error_detail = ""
-        if hasattr(e, 'response') and e.response:
-            try:
-                error_detail = f" - {e.response.json().get('error', {}).get('message', '')}"
-            except:
-                pass
-        image_response = f"Vision capability check failed: {str(e)}{error_detail}"
-    
-    return (text_valid, text_response, image_valid, image_response, test_prompt, vision_test_prompt)
+    return validate_provider_key(SPEC, api_key, parallel=parallel, session=session, tier=tier,
+                                 structured=structured, deadline=deadline, retry=retry, profile=profile)
+
+
+async def validate_claude_api_key_async(api_key, *, parallel=False, session=None, tier=TIER_FULL, structured=False,
+                                        deadline=None, retry=None, profile=PROFILE_STANDARD):
+    """
+    Async version of validate_claude_api_key that runs on a shared aiohttp session.
+    Returns the same tuple as validate_claude_api_key.
+    """
+    return await validate_provider_key_async(SPEC, api_key, parallel=parallel, session=session, tier=tier,
+                                             structured=structured, deadline=deadline, retry=retry, profile=profile)
 
 
 if __name__ == "__main__":
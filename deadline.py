@@ -0,0 +1,64 @@
+import time
+
+# Per-request limits: how long to wait for a connection, and for each read once connected
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+
+# Overall budget for validating one key, shared by all its probes and fallback models
+DEFAULT_DEADLINE = 60.0
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a validation has used up its overall time budget.
+    """
+
+
+class Deadline:
+    """
+    Time budget for one validation. Every request made for the key takes its
+    timeouts from here, clipped to what is left, so fallback chains and the
+    second probe only get the remaining budget.
+    """
+    __slots__ = ("seconds", "expires_at", "connect_timeout", "read_timeout")
+
+    def __init__(self, seconds=DEFAULT_DEADLINE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    @classmethod
+    def of(cls, value):
+        """
+        Returns value if it is already a Deadline, a new Deadline of value seconds,
+        or one with DEFAULT_DEADLINE when value is None.
+        """
+        if isinstance(value, Deadline):
+            return value
+        return cls() if value is None else cls(float(value))
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def check(self):
+        """
+        Raises DeadlineExceeded once the budget is used up.
+        """
+        if self.expired():
+            raise DeadlineExceeded(f"Validation deadline of {self.seconds:g}s exceeded")
+
+    def timeout(self):
+        """
+        Returns a requests-style (connect, read) timeout clipped to the remaining budget.
+        Each bounds a single connect or socket read, not the whole request, so bodies
+        are read with http_session.read_json, which checks the deadline as it goes.
+        Raises DeadlineExceeded if there is none left.
+        """
+        self.check()
+        remaining = self.remaining()
+        return (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
@@ -1,68 +1,256 @@
 import os
 import sys
-import google.generativeai as genai
-from google.api_core.exceptions import InvalidArgument
 
-def validate_gemini_api_key(api_key):
+from async_http import get_async_session, post_json, describe_error
+from http_session import get_session, describe_http_error, read_json, DEFAULT_MAX_RESPONSE_BYTES
+from validation_errors import KeyRejected, is_auth_failure, status_of
+from deadline import Deadline
+from probe_runner import (run_probes, run_probes_async, probe_auth, probe_auth_async, check_tier, check_profile,
+                          finish, validate_once, validate_once_async, TIER_AUTH, TIER_FULL, PROFILE_STANDARD,
+                          PROFILE_LEAN, LEAN_PROMPT)
+from validation_result import ProbeResult, ValidationResult
+from model_catalog import get_catalog, list_models
+from provider_registry import compile_path, extract_path
+
+PROVIDER = "gemini"
+
+# REST endpoints; GEMINI_BASE_URL or set_base_url() point them elsewhere, e.g. at mock_provider_server
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+API_BASE_URL = (os.environ.get("GEMINI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+MODELS_URL = f"{API_BASE_URL}/models"
+# Gemini pages its model listing; one large page covers every model
+MODEL_LIST_PARAMS = {"pageSize": 1000}
+
+# Models in the order they are tried
+TEXT_MODELS = ("gemini-1.5-flash", "gemini-pro")
+IMAGE_MODELS = ("gemini-2.0-flash-exp-image-generation", "gemini-pro-vision")
+
+TEST_PROMPT = "Say 'Gemini API key is working correctly!' in one short sentence."
+IMAGE_TEST_PROMPT = "Describe this test prompt without any image. Reply only with: 'Gemini image processing is working correctly!'"
+
+
+def set_base_url(base_url=None):
     """
-    Validates a Gemini API key by testing both text and image processing capabilities.
-    Returns a tuple with validation results and test prompts.
+    Points the validator at another API base URL, such as a mock_provider_server,
+    or back at GEMINI_BASE_URL / DEFAULT_BASE_URL when base_url is None.
     """
-    text_valid = False
-    image_valid = False
+    global API_BASE_URL, MODELS_URL
+    API_BASE_URL = (base_url or os.environ.get("GEMINI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+    MODELS_URL = f"{API_BASE_URL}/models"
+
+
+def _build_headers(api_key):
+    return {
+        "x-goog-api-key": api_key,
+        "Content-Type": "application/json"
+    }
+
+
+def _generate_content_url(model):
+    return f"{API_BASE_URL}/models/{model}:generateContent"
+
+
+def _generate_content_payload(prompt, lean=False):
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    if lean:
+        payload["generationConfig"] = {"maxOutputTokens": 1}
+    return payload
+
+
+# All text parts of the first candidate
+_CANDIDATE_TEXT = compile_path("candidates[0].content.parts[*].text")
+
+
+def _extract_text(response_data):
+    return extract_path(response_data, _CANDIDATE_TEXT)
+
+
+def _post_generate_content(session, headers, model, prompt, deadline, lean):
+    response = session.post(_generate_content_url(model), headers=headers, json=_generate_content_payload(prompt, lean),
+                            timeout=deadline.timeout(), stream=True)
+    response.raise_for_status()
+    return read_json(response, deadline=deadline)
+
+
+def _test_text_generation(session, headers, api_key, deadline, lean):
+    """
+    Sends the text generation probe, falling back through TEXT_MODELS.
+    Returns a ProbeResult. Raises KeyRejected, without trying the
+    remaining models, if the provider rejects the key outright.
+    """
+    # Test text generation with Gemini - latest model first, then the legacy model
     text_response = None
+    last_error = None
+    catalog = get_catalog()
+    for model_name in catalog.order(PROVIDER, api_key, TEXT_MODELS):
+        try:
+            response_data = _post_generate_content(session, headers, model_name, _prompts(lean)[0], deadline, lean)
+            catalog.record(PROVIDER, api_key, model_name)
+            return ProbeResult(True, _extract_text(response_data))
+        except Exception as e:
+            catalog.record(PROVIDER, api_key, model_name, e)
+            text_response = f"Text generation failed: {describe_http_error(e)}"
+            last_error = e
+            if is_auth_failure(e):
+                raise KeyRejected(text_response, status_of(e))
+    return ProbeResult.from_error(text_response, last_error)
+
+
+def _test_image_processing(session, headers, api_key, deadline, lean):
+    """
+    Sends the multimodal probe, falling back through IMAGE_MODELS.
+    Returns a ProbeResult.
+    """
     image_response = None
-    test_prompt = "Say 'Gemini API key is working correctly!' in one short sentence."
-    image_test_prompt = "Describe this test prompt without any image. Reply only with: 'Gemini image processing is working correctly!'"
+    last_error = None
+    catalog = get_catalog()
+    for model_name in catalog.order(PROVIDER, api_key, IMAGE_MODELS):
+        try:
+            response_data = _post_generate_content(session, headers, model_name, _prompts(lean)[1], deadline, lean)
+            catalog.record(PROVIDER, api_key, model_name)
+            return ProbeResult(True, _extract_text(response_data))
+        except Exception as e:
+            catalog.record(PROVIDER, api_key, model_name, e)
+            last_error = e
+            if "deprecated" in describe_http_error(e).lower():
+                image_response = f"Image capability testing failed: The model is deprecated. Consider using 'gemini-1.5-pro-vision' instead."
+            else:
+                image_response = f"Image capability testing failed: {describe_http_error(e)}"
+    return ProbeResult.from_error(image_response, last_error)
+
+
+def _refresh_catalog(session, headers, api_key):
+    """
+    Refreshes the model catalog in the background with a key that just worked,
+    if its listing has expired.
+    """
+    get_catalog().refresh_in_background(PROVIDER, api_key, lambda: list_models(session, MODELS_URL, headers, MODEL_LIST_PARAMS))
+
+
+def validate_gemini_api_key(api_key, *, parallel=False, session=None, tier=TIER_FULL, structured=False,
+                            deadline=None, retry=None, profile=PROFILE_STANDARD):
+    """
+    Validates a Gemini API key by testing both text and image processing capabilities.
+    Requests go straight to the REST API on the shared keep-alive session from
+    http_session unless one is passed in; the key is sent per request, so
+    concurrent validations of different keys are safe.
+    Keyword options are those of provider_engine.validate_provider_key.
+    Returns a tuple with validation results and test prompts.
+    """
+    check_tier(tier)
+    check_profile(profile)
+    deadline = Deadline.of(deadline)
+    result = validate_once(PROVIDER, api_key, tier, deadline,
+                           lambda: _validate_gemini_api_key(api_key, parallel, session, tier, deadline, retry, profile),
+                           profile)
+    return finish(result, structured)
+
+
+def _prompts(lean):
+    return (LEAN_PROMPT, LEAN_PROMPT) if lean else (TEST_PROMPT, IMAGE_TEST_PROMPT)
+
+
+def _validate_gemini_api_key(api_key, parallel, session, tier, deadline, retry, profile):
+    session = session or get_session()
     
-    # Configure the API key
-    genai.configure(api_key=api_key)
+    # The key travels in each request's headers, so concurrent validations share no state
+    headers = _build_headers(api_key)
     
-    # Test text generation with Gemini - use latest model
-    try:
-        # Updated to use gemini-1.5-flash (most recent model as of 2025)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(test_prompt)
-        text_response = response.text.strip()
-        text_valid = True
-    except Exception as e:
-        # If the flash model fails, try with the Pro model
-        try:
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            response = model.generate_content(test_prompt)
-            text_response = response.text.strip()
-            text_valid = True
-        except Exception as e2:
-            # If both fail, try the legacy model
-            try:
-                model = genai.GenerativeModel('gemini-pro')
-                response = model.generate_content(test_prompt)
-                text_response = response.text.strip()
-                text_valid = True
-            except Exception as e3:
-                text_response = f"Text generation failed: {str(e3)}"
+    if tier == TIER_AUTH:
+        return ValidationResult(PROVIDER, TIER_AUTH, probe_auth(session, MODELS_URL, headers, deadline=deadline, provider=PROVIDER, retry=retry))
+    
+    lean = profile == PROFILE_LEAN
+    text_result, image_result = run_probes(
+        lambda: _test_text_generation(session, headers, api_key, deadline, lean),
+        lambda: _test_image_processing(session, headers, api_key, deadline, lean),
+        parallel=parallel,
+        deadline=deadline,
+        provider=PROVIDER,
+        retry=retry,
+    )
+    
+    if text_result.valid:
+        _refresh_catalog(session, headers, api_key)
     
-    # Test image processing capabilities 
-    try:
-        # Using Gemini's multimodal capabilities - updated model name
-        model = genai.GenerativeModel('gemini-2.0-flash-exp-image-generation')
-        response = model.generate_content([image_test_prompt])
-        image_response = response.text.strip()
-        image_valid = True
-    except Exception as e:
-        # Try with legacy model if the new one fails
+    return ValidationResult(PROVIDER, TIER_FULL, text_result, image_result, *_prompts(lean))
+
+
+async def _test_text_generation_async(session, headers, api_key, deadline, lean):
+    text_response = None
+    last_error = None
+    catalog = get_catalog()
+    for model in catalog.order(PROVIDER, api_key, TEXT_MODELS):
+        try:
+            response_data = await post_json(session, _generate_content_url(model), headers, _generate_content_payload(_prompts(lean)[0], lean),
+                                            deadline=deadline, max_bytes=DEFAULT_MAX_RESPONSE_BYTES)
+            catalog.record(PROVIDER, api_key, model)
+            return ProbeResult(True, _extract_text(response_data))
+        except Exception as e:
+            catalog.record(PROVIDER, api_key, model, e)
+            text_response = f"Text generation failed: {describe_error(e)}"
+            last_error = e
+            if is_auth_failure(e):
+                raise KeyRejected(text_response, status_of(e))
+    return ProbeResult.from_error(text_response, last_error)
+
+
+async def _test_image_processing_async(session, headers, api_key, deadline, lean):
+    image_response = None
+    last_error = None
+    catalog = get_catalog()
+    for model in catalog.order(PROVIDER, api_key, IMAGE_MODELS):
         try:
-            model = genai.GenerativeModel('gemini-pro-vision')
-            response = model.generate_content([image_test_prompt])
-            image_response = response.text.strip()
-            image_valid = True
-        except Exception as e2:
-            if "deprecated" in str(e2).lower():
+            response_data = await post_json(session, _generate_content_url(model), headers, _generate_content_payload(_prompts(lean)[1], lean),
+                                            deadline=deadline, max_bytes=DEFAULT_MAX_RESPONSE_BYTES)
+            catalog.record(PROVIDER, api_key, model)
+            return ProbeResult(True, _extract_text(response_data))
+        except Exception as e:
+            catalog.record(PROVIDER, api_key, model, e)
+            last_error = e
+            if "deprecated" in describe_error(e).lower():
                 image_response = f"Image capability testing failed: The model is deprecated. Consider using 'gemini-1.5-pro-vision' instead."
             else:
-                image_response = f"Image capability testing failed: {str(e2)}"
+                image_response = f"Image capability testing failed: {describe_error(e)}"
+    return ProbeResult.from_error(image_response, last_error)
+
+
+async def validate_gemini_api_key_async(api_key, *, parallel=False, session=None, tier=TIER_FULL, structured=False,
+                                        deadline=None, retry=None, profile=PROFILE_STANDARD):
+    """
+    Async version of validate_gemini_api_key that calls the REST API directly on a
+    shared aiohttp session.
+    Returns the same tuple as validate_gemini_api_key.
+    """
+    check_tier(tier)
+    check_profile(profile)
+    deadline = Deadline.of(deadline)
+    result = await validate_once_async(PROVIDER, api_key, tier, deadline,
+                                       lambda: _validate_gemini_api_key_async(api_key, parallel, session, tier, deadline, retry, profile),
+                                       profile)
+    return finish(result, structured)
+
+
+async def _validate_gemini_api_key_async(api_key, parallel, session, tier, deadline, retry, profile):
+    session = session or get_async_session()
+    headers = _build_headers(api_key)
+    
+    if tier == TIER_AUTH:
+        return ValidationResult(PROVIDER, TIER_AUTH, await probe_auth_async(session, MODELS_URL, headers, deadline=deadline, provider=PROVIDER, retry=retry))
+    
+    lean = profile == PROFILE_LEAN
+    text_result, image_result = await run_probes_async(
+        lambda: _test_text_generation_async(session, headers, api_key, deadline, lean),
+        lambda: _test_image_processing_async(session, headers, api_key, deadline, lean),
+        parallel=parallel,
+        deadline=deadline,
+        provider=PROVIDER,
+        retry=retry,
+    )
+    
+    if text_result.valid:
+        _refresh_catalog(get_session(), headers, api_key)
     
-    return (text_valid, text_response, image_valid, image_response, test_prompt, image_test_prompt)
+    return ValidationResult(PROVIDER, TIER_FULL, text_result, image_result, *_prompts(lean))
 
 
 if __name__ == "__main__":
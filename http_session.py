@@ -0,0 +1,256 @@
+import json
+import time
+import threading
+
+from metrics import get_metrics, request_model, outcome_of
+from deadline import DeadlineExceeded
+
+# urllib3 keeps one connection pool per host; pool_connections is how many host
+# pools are cached and pool_maxsize how many keep-alive connections each keeps.
+DEFAULT_POOL_CONNECTIONS = 16
+DEFAULT_POOL_MAXSIZE = 64
+
+# Most bytes of a probe's response body that are read. Probe answers are well under
+# a kilobyte, so this only cuts off runaway bodies (error pages, verbose models).
+DEFAULT_MAX_RESPONSE_BYTES = 64 * 1024
+
+# Most bytes of a model listing that are read. Listings with model descriptions
+# run to tens of kilobytes; anything past this only counts as no models listed.
+DEFAULT_MAX_LISTING_BYTES = 1024 * 1024
+
+# Most bytes of an error response's body that are read; the provider's message is near the start
+DEFAULT_MAX_ERROR_BYTES = 8 * 1024
+
+# Chunk size used when reading a capped body
+_READ_CHUNK = 16 * 1024
+
+_session = None
+_lock = threading.Lock()
+
+# Connection setup timings of the request being sent on this thread
+_phases = threading.local()
+
+# Session, adapter and connection classes, built on first use so requests is only
+# imported by callers that actually send requests
+_classes = None
+
+
+def _timed_connection(base, tls):
+    class TimedConnection(base):
+        # Times DNS plus TCP in _new_conn and, for HTTPS, the TLS handshake as the rest of connect
+        def _new_conn(self):
+            start = time.perf_counter()
+            sock = super()._new_conn()
+            phases = getattr(_phases, "current", None)
+            if phases is not None:
+                phases["connect"] = time.perf_counter() - start
+            return sock
+
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            phases = getattr(_phases, "current", None)
+            if phases is not None:
+                total = time.perf_counter() - start
+                if tls:
+                    phases["tls"] = max(0.0, total - phases.get("connect", 0.0))
+                phases["connect"] = total
+
+    return TimedConnection
+
+
+def _build_classes():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = _timed_connection(HTTPConnection, tls=False)
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = _timed_connection(HTTPSConnection, tls=True)
+
+    class TimedAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool,
+                                                       "https": TimedHTTPSConnectionPool}
+
+    class TimedSession(requests.Session):
+        """
+        Session that reports every request to the metrics registry: total time,
+        connection setup (0 when a keep-alive connection was reused), time to the
+        response headers and time reading the body. Error bodies of streamed
+        responses are cut to DEFAULT_MAX_ERROR_BYTES (see cap_error_body).
+        """
+
+        def send(self, request, **kwargs):
+            metrics = get_metrics()
+            if not metrics.enabled:
+                response = super().send(request, **kwargs)
+                cap_error_body(response)
+                return response
+            phases = _phases.current = {}
+            start = time.perf_counter()
+            try:
+                response = super().send(request, **kwargs)
+                cap_error_body(response)
+            except Exception as e:
+                metrics.record_attempt(request.url, request_model(request.url, request.body),
+                                       time.perf_counter() - start, outcome_of(error=e), phases)
+                raise
+            finally:
+                _phases.current = None
+            total = time.perf_counter() - start
+            ttfb = min(total, response.elapsed.total_seconds())
+            phases.setdefault("connect", 0.0)
+            phases["ttfb"] = ttfb
+            phases["body"] = total - ttfb
+            metrics.record_attempt(request.url, request_model(request.url, request.body), total,
+                                   outcome_of(response.status_code, text=response.text
+                                              if response.status_code >= 400 else ""), phases)
+            return response
+
+    return TimedSession, TimedAdapter
+
+
+def create_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """
+    Creates a requests session whose connections are kept alive and reused per host.
+    Every request it sends is timed into metrics.get_metrics().
+    """
+    global _classes
+    if _classes is None:
+        _classes = _build_classes()
+    session_class, adapter_class = _classes
+
+    session = session_class()
+    adapter = adapter_class(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    """
+    Returns the process-wide shared session, creating it on first use.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def set_session(session):
+    """
+    Replaces the shared session used by validators that are not given one explicitly,
+    e.g. to inject a session with custom pool sizes, proxies or retries.
+    Returns the previous session (not closed).
+    """
+    global _session
+    with _lock:
+        previous, _session = _session, session
+    return previous
+
+
+def close_session():
+    """
+    Closes the shared session, if it was created.
+    """
+    global _session
+    with _lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+
+def _expire(response, deadline, cause=None):
+    # Abandons the body once the deadline has passed
+    response.close()
+    raise DeadlineExceeded(f"Validation deadline of {deadline.seconds:g}s exceeded reading the response") from cause
+
+
+def _clip_read_timeout(response, deadline):
+    # Each socket read may only wait for what is left of the deadline, so a body
+    # trickling in cannot outlast it one read timeout at a time
+    if deadline.expired():
+        _expire(response, deadline)
+    sock = getattr(getattr(response.raw, "connection", None), "sock", None)
+    if sock is not None:
+        sock.settimeout(min(deadline.read_timeout, deadline.remaining()))
+
+
+def read_json(response, max_bytes=DEFAULT_MAX_RESPONSE_BYTES, deadline=None):
+    """
+    Decodes the JSON body of a response requested with stream=True, reading at
+    most max_bytes of it. A longer body is abandoned (its connection is closed
+    rather than reused) and, like an empty or non-JSON body, decodes to {}: the
+    status already showed the probe worked, the body only carries its answer.
+    With a Deadline, the body is read as it arrives and DeadlineExceeded is
+    raised once the deadline passes, however slowly the bytes keep coming.
+    """
+    chunks, size = [], 0
+    while True:
+        if deadline is not None:
+            _clip_read_timeout(response, deadline)
+        try:
+            chunk = response.raw.read1(_READ_CHUNK, decode_content=True)
+        except Exception as e:
+            if deadline is None or not deadline.expired():
+                raise
+            _expire(response, deadline, e)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            response.close()
+            return {}
+        chunks.append(chunk)
+    try:
+        return json.loads(b"".join(chunks)) if chunks else {}
+    except ValueError:
+        return {}
+
+
+def cap_error_body(response, max_bytes=DEFAULT_MAX_ERROR_BYTES):
+    """
+    Reads at most max_bytes of a 4XX/5XX response requested with stream=True and
+    keeps them as its content, so response.text and response.json() never pull
+    in a whole runaway error page. Longer bodies are abandoned with their
+    connection. Responses that succeeded or were already read are left alone.
+    """
+    if response.status_code < 400 or response._content is not False:
+        return
+    try:
+        body = response.raw.read(max_bytes + 1, decode_content=True) or b""
+    except Exception:
+        body = b""
+    if len(body) > max_bytes:
+        body = body[:max_bytes]
+        response.close()
+    else:
+        response.raw.release_conn()
+    response._content = body
+    response._content_consumed = True
+
+
+def describe_http_error(e):
+    """
+    Formats a requests exception as its text followed by the provider's error
+    message from the response body, when there is one.
+    """
+    error_detail = ""
+    response = getattr(e, "response", None)
+    if response is not None:
+        try:
+            cap_error_body(response)
+            error = response.json().get("error", {})
+            message = error.get("message", "") if isinstance(error, dict) else str(error)
+            if message:
+                error_detail = f" - {message}"
+        except Exception:
+            pass
+    return f"{str(e)}{error_detail}"
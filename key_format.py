@@ -0,0 +1,173 @@
+import re
+
+from provider_registry import registered_providers
+
+
+class KeyProblem:
+    """
+    Why a key cannot be valid, found without a request: .code is one of "empty",
+    "whitespace", "prefix", "length" or "charset" and .message says what is wrong.
+    """
+    __slots__ = ("code", "message")
+
+    def __init__(self, code, message):
+        self.code = code
+        self.message = message
+
+    def __repr__(self):
+        return f"KeyProblem({self.code!r}, {self.message!r})"
+
+
+class KeyFormat:
+    """
+    One shape a provider's keys come in: a literal prefix ("" for none), then
+    min_length to max_length characters (prefix included) from charset, a regex
+    character class body such as "A-Za-z0-9_-". exclude lists prefixes that
+    belong to another provider (OpenAI's "sk-" is not Claude's "sk-ant-").
+    Patterns are kept lenient: a real key wrongly rejected is worse than a
+    malformed one sent to the provider.
+    """
+
+    def __init__(self, prefix, charset, min_length, max_length=None, exclude=()):
+        self.prefix = prefix
+        self.charset = charset
+        self.min_length = min_length
+        self.max_length = max_length or min_length
+        self.exclude = tuple(exclude)
+        self._body = re.compile(f"[{charset}]*")
+
+    @property
+    def pattern(self):
+        """
+        The regex matching a whole key of this format.
+        """
+        exclude = "".join(f"(?!{re.escape(prefix)})" for prefix in self.exclude)
+        low, high = self.min_length - len(self.prefix), self.max_length - len(self.prefix)
+        return f"{exclude}{re.escape(self.prefix)}[{self.charset}]{{{low},{high}}}"
+
+    @property
+    def distinctive(self):
+        # Only a key with a prefix of its own says which provider it is for
+        return bool(self.prefix)
+
+    def problem(self, api_key):
+        """
+        Returns the KeyProblem of a key that does not fit this format, or None.
+        """
+        if not api_key.startswith(self.prefix):
+            return KeyProblem("prefix", f"expected a key starting with {self.prefix!r}")
+        excluded = next((prefix for prefix in self.exclude if api_key.startswith(prefix)), None)
+        if excluded is not None:
+            return KeyProblem("prefix", f"keys starting with {excluded!r} belong to another provider")
+        if not self.min_length <= len(api_key) <= self.max_length:
+            expected = (f"{self.min_length}" if self.min_length == self.max_length
+                        else f"{self.min_length}-{self.max_length}")
+            return KeyProblem("length", f"{len(api_key)} characters; expected {expected}")
+        if not self._body.fullmatch(api_key, len(self.prefix)):
+            return KeyProblem("charset", f"characters outside [{self.charset}] after {self.prefix!r}"
+                              if self.prefix else f"characters outside [{self.charset}]")
+        return None
+
+
+# Key formats per provider, in the order keys are matched against them when
+# detecting the provider: prefixed formats first, and longer prefixes before shorter.
+DEFAULT_KEY_FORMATS = {
+    "claude": (KeyFormat("sk-ant-", "A-Za-z0-9_-", 40, 256),),
+    "openai": (KeyFormat("sk-", "A-Za-z0-9_-", 20, 256, exclude=("sk-ant-",)),),
+    "gemini": (KeyFormat("AIza", "A-Za-z0-9_-", 39),),
+    "xai": (KeyFormat("xai-", "A-Za-z0-9", 36, 256),),
+    "together": (KeyFormat("tgp_", "A-Za-z0-9_-", 24, 256), KeyFormat("", "0-9a-f", 64)),
+    "mistral": (KeyFormat("", "A-Za-z0-9", 32),),
+}
+
+_WHITESPACE = re.compile(r"\s")
+
+
+class KeyFormats:
+    """
+    Checks keys against their provider's formats before any request is sent, and
+    recognises a key's provider from its format. Matching a key is one compiled
+    regex (per provider, or over all providers for detection); the reason is
+    only worked out for keys that fail. Providers with no format here use the
+    key_format of their provider_registry spec, if any, and otherwise pass.
+    """
+
+    def __init__(self, formats=None):
+        self.formats = dict(DEFAULT_KEY_FORMATS if formats is None else formats)
+        self._matchers = {provider: re.compile("|".join(f"(?:{f.pattern})" for f in provider_formats))
+                          for provider, provider_formats in self.formats.items()}
+        # One alternative per provider; the name of the group that matched is the provider
+        self._detector = re.compile("|".join(f"(?P<{provider}>{matcher.pattern})"
+                                             for provider, matcher in self._matchers.items()))
+
+    def _formats_for(self, provider):
+        formats = self.formats.get(provider)
+        if formats is None:
+            spec = registered_providers().get(provider)
+            if spec is not None and spec.key_format is not None:
+                formats = (spec.key_format,)
+        return formats
+
+    def problem(self, provider, api_key):
+        """
+        Returns the KeyProblem that rules the key out for provider, or None if it may be valid.
+        """
+        if not api_key:
+            return KeyProblem("empty", "the key is empty")
+        if _WHITESPACE.search(api_key):
+            return KeyProblem("whitespace", "the key contains whitespace")
+        matcher = self._matchers.get(provider)
+        if matcher is not None:
+            if matcher.fullmatch(api_key):
+                return None
+            formats = self.formats[provider]
+        else:
+            formats = self._formats_for(provider)
+            if formats is None:
+                return None
+        problems = [key_format.problem(api_key) for key_format in formats]
+        if None in problems:
+            return None
+        # Report against the format whose prefix the key has, if any
+        return next((p for p in problems if p.code != "prefix"), problems[0])
+
+    def detect(self, api_key):
+        """
+        Returns the provider whose key format the key matches, or None.
+        """
+        match = self._detector.fullmatch(api_key)
+        return match.lastgroup if match else None
+
+    def route(self, provider, api_key):
+        """
+        Returns (provider, problem) for a key given as provider's: the provider
+        unchanged and None when the key fits it; another provider and None when
+        the key fits only that provider's distinctive (prefixed) format; else the
+        provider and the KeyProblem.
+        """
+        problem = self.problem(provider, api_key)
+        if problem is None or problem.code in ("empty", "whitespace"):
+            return provider, problem
+        detected = self.detect(api_key)
+        if detected is not None and any(f.distinctive and f.problem(api_key) is None
+                                        for f in self.formats[detected]):
+            return detected, None
+        return provider, problem
+
+
+_default_key_formats = KeyFormats()
+
+
+def get_key_formats():
+    """
+    Returns the process-wide KeyFormats used by the validators, or None if pre-checks are off.
+    """
+    return _default_key_formats
+
+
+def set_key_formats(key_formats):
+    """
+    Replaces the process-wide KeyFormats; None turns the pre-checks off.
+    """
+    global _default_key_formats
+    _default_key_formats = key_formats
@@ -0,0 +1,310 @@
+import os
+import re
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from validation_errors import classify_error, classify_status
+
+# Histogram buckets in seconds, from a fast keep-alive request up to the longest deadline
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Buckets for the number of HTTP attempts one probe made (fallback models, retried requests)
+ATTEMPT_BUCKETS = (1, 2, 3, 5, 10)
+
+METRIC_PREFIX = "key_validator"
+
+# Outcome label for requests and probes that succeeded; failures use ErrorClass values
+OUTCOME_OK = "ok"
+
+# Gemini puts the model in the URL rather than the payload
+_URL_MODEL = re.compile(r"/models/([^/:?]+):")
+
+# The probe running in this thread or task, so HTTP attempts are attributed to it
+_current_probe = contextvars.ContextVar("current_probe", default=None)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus sense: counts per upper bound, plus sum and count.
+    """
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        Returns [(upper_bound, count of observations <= bound)], ending with ("+Inf", count).
+        """
+        total = 0
+        buckets = []
+        for bound, count in zip(self.bounds + ("+Inf",), self.counts):
+            total += count
+            buckets.append((bound, total))
+        return buckets
+
+
+class _ProbeScope:
+    __slots__ = ("provider", "probe", "attempts")
+
+    def __init__(self, provider, probe):
+        self.provider = provider
+        self.probe = probe
+        self.attempts = 0
+
+
+def request_model(url, payload=None):
+    """
+    Returns the model a provider request targets, from the JSON payload's "model"
+    or a Gemini-style URL, or "" for requests without one (model listings).
+    """
+    if isinstance(payload, (bytes, str)) and payload:
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            payload = None
+    if isinstance(payload, dict) and isinstance(payload.get("model"), str):
+        return payload["model"]
+    match = _URL_MODEL.search(url or "")
+    return match.group(1) if match else ""
+
+
+def outcome_of(status=None, error=None, text=""):
+    """
+    Returns the outcome label for a finished HTTP attempt: "ok" below 400, else the ErrorClass value.
+    """
+    if error is not None:
+        return classify_error(error).value
+    if status is not None and status >= 400:
+        return classify_status(status, text).value
+    return OUTCOME_OK
+
+
+class ValidationMetrics:
+    """
+    Latency histograms for validations, by provider, probe, model and outcome:
+
+        <prefix>_attempt_seconds        every HTTP request a probe sends
+        <prefix>_attempt_phase_seconds  connect (DNS, TCP and TLS of a new connection),
+                                        dns / tls where the HTTP stack reports them,
+                                        ttfb (until response headers) and body
+        <prefix>_probe_seconds          each auth/text/image probe, fallbacks included
+        <prefix>_probe_attempts         HTTP attempts per probe
+
+    Hooks added with add_hook() are called with each event as a dict, for callers
+    that ship timings elsewhere. render_prometheus() returns the Prometheus text format.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, enabled=True):
+        self.buckets = tuple(buckets)
+        self.enabled = enabled
+        self._histograms = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """
+        Registers hook(event) to be called for every attempt and probe event.
+        Events are dicts with "event" ("attempt" or "probe"), "provider", "probe",
+        "outcome", "seconds", and "model"/"phases" for attempts or "attempts" for probes.
+        Exceptions raised by hooks are ignored.
+        """
+        with self._lock:
+            self._hooks = self._hooks + [hook]
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self._hooks = [h for h in self._hooks if h is not hook]
+
+    def _observe(self, name, value, labels, buckets=None):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets or self.buckets)
+            histogram.observe(value)
+
+    def _emit(self, event):
+        for hook in self._hooks:
+            try:
+                hook(event)
+            except Exception:
+                # Instrumentation must never fail a validation
+                pass
+
+    def record_attempt(self, url, model, seconds, outcome, phases=None):
+        """
+        Records one HTTP request, attributed to the probe running in this thread or task.
+        """
+        if not self.enabled:
+            return
+        scope = _current_probe.get()
+        if scope is not None:
+            scope.attempts += 1
+        provider = scope.provider if scope is not None else "unknown"
+        probe = scope.probe if scope is not None else "other"
+        phases = phases or {}
+        self._observe("attempt_seconds", seconds,
+                      (("provider", provider), ("probe", probe), ("model", model), ("outcome", outcome)))
+        for phase, value in phases.items():
+            self._observe("attempt_phase_seconds", value, (("provider", provider), ("phase", phase)))
+        if self._hooks:
+            self._emit({"event": "attempt", "provider": provider, "probe": probe, "model": model, "url": url,
+                        "outcome": outcome, "seconds": seconds, "phases": dict(phases)})
+
+    def record_probe(self, provider, probe, seconds, outcome, attempts):
+        if not self.enabled:
+            return
+        self._observe("probe_seconds", seconds, (("provider", provider), ("probe", probe), ("outcome", outcome)))
+        self._observe("probe_attempts", attempts, (("provider", provider), ("probe", probe)), ATTEMPT_BUCKETS)
+        if self._hooks:
+            self._emit({"event": "probe", "provider": provider, "probe": probe, "outcome": outcome,
+                        "seconds": seconds, "attempts": attempts})
+
+    @contextmanager
+    def probe(self, provider, probe):
+        """
+        Attributes HTTP attempts made inside the block to (provider, probe).
+        Yields the scope; its .attempts counts the attempts made so far.
+        """
+        scope = _ProbeScope(provider or "unknown", probe)
+        token = _current_probe.set(scope)
+        try:
+            yield scope
+        finally:
+            _current_probe.reset(token)
+
+    def snapshot(self):
+        """
+        Returns {(name, labels): Histogram copy} for every series recorded so far.
+        """
+        with self._lock:
+            items = list(self._histograms.items())
+        copies = {}
+        for key, histogram in items:
+            copy = Histogram(histogram.bounds)
+            copy.counts, copy.sum, copy.count = list(histogram.counts), histogram.sum, histogram.count
+            copies[key] = copy
+        return copies
+
+    def render_prometheus(self, openmetrics=False):
+        """
+        Returns every histogram in the Prometheus text exposition format, or in
+        OpenMetrics (the same series plus the closing "# EOF") when openmetrics is True.
+        """
+        lines = []
+        series = sorted(self.snapshot().items(), key=lambda item: item[0])
+        current = None
+        for (name, labels), histogram in series:
+            metric = f"{METRIC_PREFIX}_{name}"
+            if name != current:
+                unit = "attempts" if name == "probe_attempts" else "seconds"
+                lines.append(f"# HELP {metric} Validation {name.replace('_', ' ')} ({unit})")
+                lines.append(f"# TYPE {metric} histogram")
+                current = name
+            label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+            for bound, count in histogram.cumulative():
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                lines.append(f'{metric}_bucket{{{label_text},le="{le}"}} {count}')
+            lines.append(f"{metric}_sum{{{label_text}}} {histogram.sum:.6f}")
+            lines.append(f"{metric}_count{{{label_text}}} {histogram.count}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def timed_probe(provider, probe, fn):
+    """
+    Runs fn() (returning a ProbeResult) inside a probe scope and records the probe's
+    latency, outcome and attempt count. Exceptions propagate; they are recorded
+    with their ErrorClass first.
+    """
+    metrics = get_metrics()
+    start = time.perf_counter()
+    with metrics.probe(provider, probe) as scope:
+        try:
+            result = fn()
+        except Exception as e:
+            metrics.record_probe(scope.provider, probe, time.perf_counter() - start, classify_error(e).value,
+                                 scope.attempts)
+            raise
+    metrics.record_probe(scope.provider, probe, time.perf_counter() - start, _result_outcome(result), scope.attempts)
+    return result
+
+
+async def timed_probe_async(provider, probe, fn):
+    """
+    Async version of timed_probe for a zero-argument coroutine function.
+    """
+    metrics = get_metrics()
+    start = time.perf_counter()
+    with metrics.probe(provider, probe) as scope:
+        try:
+            result = await fn()
+        except Exception as e:
+            metrics.record_probe(scope.provider, probe, time.perf_counter() - start, classify_error(e).value,
+                                 scope.attempts)
+            raise
+    metrics.record_probe(scope.provider, probe, time.perf_counter() - start, _result_outcome(result), scope.attempts)
+    return result
+
+
+def _result_outcome(result):
+    if result.valid or result.error_class is None:
+        return OUTCOME_OK
+    return result.error_class.value
+
+
+_default_metrics = None
+_default_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """
+    Returns the process-wide metrics registry, creating it on first use.
+    """
+    global _default_metrics
+    if _default_metrics is None:
+        with _default_metrics_lock:
+            if _default_metrics is None:
+                _default_metrics = ValidationMetrics()
+    return _default_metrics
+
+
+def set_metrics(metrics):
+    """
+    Replaces the process-wide metrics registry, e.g. with ValidationMetrics(enabled=False).
+    """
+    global _default_metrics
+    with _default_metrics_lock:
+        _default_metrics = metrics
+
+
+def write_metrics(path, metrics=None):
+    """
+    Writes the registry's Prometheus text to path atomically, for node_exporter's textfile collector.
+    """
+    text = (metrics or get_metrics()).render_prometheus()
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
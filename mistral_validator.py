@@ -1,83 +1,46 @@
-import os
 import sys
-import requests
-import json
 
-def validate_mistral_api_key(api_key):
+from probe_runner import TIER_FULL, PROFILE_STANDARD
+from provider_registry import get_provider
+from provider_engine import validate_provider_key, validate_provider_key_async
+
+PROVIDER = "mistral"
+
+# Endpoints, models and probes live in the provider's spec in provider_registry
+SPEC = get_provider(PROVIDER)
+TEXT_MODEL = SPEC.text.models[0]
+ADVANCED_MODEL = SPEC.image.models[0]
+TEST_PROMPT = SPEC.text.prompt
+ADVANCED_TEST_PROMPT = SPEC.image.prompt
+
+
+def set_base_url(base_url=None):
+    """
+    Points the validator at another API base URL, such as a mock_provider_server,
+    or back at MISTRAL_BASE_URL / the spec's default when base_url is None.
+    """
+    SPEC.set_base_url(base_url)
+
+
+def validate_mistral_api_key(api_key, *, parallel=False, session=None, tier=TIER_FULL, structured=False,
+                             deadline=None, retry=None, profile=PROFILE_STANDARD):
     """
     Validates a Mistral AI API key by testing text generation capabilities.
+    Keyword options are those of provider_engine.validate_provider_key.
     Returns a tuple with validation results and test prompts.
     """
-    text_valid = False
-    image_valid = False
-    text_response = None
-    image_response = None
-    test_prompt = "Say 'Mistral AI API key is working correctly!' in one short sentence."
-    advanced_test_prompt = "This is a multimodal capability test. Please respond with 'Mistral AI multimodal test'."
-    
-    # API endpoint for Mistral AI
-    api_url = "https://api.mistral.ai/v1/chat/completions"
-    
-    # Headers for the request
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    # Test text generation with one of Mistral's models
-    try:
-        payload = {
-            "model": "mistral-small-latest",  # Using one of Mistral's standard models
-            "messages": [
-                {"role": "user", "content": test_prompt}
-            ],
-            "max_tokens": 20
-        }
-        
-        response = requests.post(api_url, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        response_data = response.json()
-        text_response = response_data.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-        text_valid = True
-    except Exception as e:
-        error_detail = ""
-        if hasattr(e, 'response') and e.response:
-            try:
-                error_detail = f" - {e.response.json().get('error', {}).get('message', '')}"
-            except:
-                pass
-        text_response = f"Text generation failed: {str(e)}{error_detail}"
-    
-    # Test multimodal capabilities (if available)
-    # As of April 2025, Mistral has some experimental multimodal capabilities
-    try:
-        # Using Mistral's multimodal capability if available
-        payload = {
-            "model": "mistral-large-latest",  # Using Mistral's most capable model for multimodal
-            "messages": [
-                {"role": "user", "content": advanced_test_prompt}
-            ],
-            "max_tokens": 20
-        }
-        
-        response = requests.post(api_url, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        response_data = response.json()
-        advanced_response = response_data.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-        image_response = f"Response: {advanced_response}\nMistral AI doesn't currently offer native image generation, but the API key is valid for their most advanced models."
-        image_valid = True
-    except Exception as e:
-        error_detail = ""
-        if hasattr(e, 'response') and e.response:
-            try:
-                error_detail = f" - {e.response.json().get('error', {}).get('message', '')}"
-            except:
-                pass
-        image_response = f"Multimodal capability check failed: {str(e)}{error_detail}"
-    
-    return (text_valid, text_response, image_valid, image_response, test_prompt, advanced_test_prompt)
+    return validate_provider_key(SPEC, api_key, parallel=parallel, session=session, tier=tier,
+                                 structured=structured, deadline=deadline, retry=retry, profile=profile)
+
+
+async def validate_mistral_api_key_async(api_key, *, parallel=False, session=None, tier=TIER_FULL, structured=False,
+                                         deadline=None, retry=None, profile=PROFILE_STANDARD):
+    """
+    Async version of validate_mistral_api_key that runs on a shared aiohttp session.
+    Returns the same tuple as validate_mistral_api_key.
+    """
+    return await validate_provider_key_async(SPEC, api_key, parallel=parallel, session=session, tier=tier,
+                                             structured=structured, deadline=deadline, retry=retry, profile=profile)
 
 
 if __name__ == "__main__":
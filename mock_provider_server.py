@@ -0,0 +1,341 @@
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# API version segment of each provider's base URL: <root>/<provider>/<version>
+API_VERSIONS = {
+    "openai": "v1",
+    "claude": "v1",
+    "gemini": "v1beta",
+    "mistral": "v1",
+    "xai": "v1",
+    "together": "v1",
+}
+
+# Models each mock provider lists and serves
+MODELS = {
+    "openai": ("gpt-4.1", "gpt-4o", "dall-e-3", "dall-e-2"),
+    "claude": ("claude-3-haiku-20240307",),
+    "gemini": ("gemini-1.5-flash", "gemini-pro", "gemini-2.0-flash-exp-image-generation", "gemini-pro-vision"),
+    "mistral": ("mistral-small-latest", "mistral-large-latest"),
+    "xai": ("grok-latest", "grok-vision-latest"),
+    "together": ("meta-llama/Llama-3-8b-chat", "togethercomputer/llama-2-7b-chat",
+                 "mistralai/mixtral-8x7b-instruct-v0.1"),
+}
+
+# Prefix and length of the keys mock_key() makes for each provider, so they pass
+# key_format's checks and batch_validator.detect_provider recognises them
+KEY_PREFIXES = {
+    "openai": "sk-proj-",
+    "claude": "sk-ant-api03-",
+    "gemini": "AIza",
+    "mistral": "",
+    "xai": "xai-",
+    "together": "tgp_v1_",
+}
+KEY_LENGTHS = {
+    "openai": 164,
+    "claude": 108,
+    "gemini": 39,
+    "mistral": 32,
+    "xai": 84,
+    "together": 50,
+}
+
+# How the mock answers a key, chosen by a word in the key (see mock_key):
+#   ok          every request succeeds
+#   invalid     the key is rejected the way the provider rejects it (401, Gemini 400)
+#   ratelimited 429 with a Retry-After header
+#   quota       429 insufficient_quota
+#   error       500
+#   overloaded  503 (Claude 529)
+#   flaky       alternates between overloaded and ok
+#   slow        succeeds after --slow-latency more seconds
+BEHAVIORS = ("ok", "invalid", "ratelimited", "quota", "error", "overloaded", "flaky", "slow")
+
+DEFAULT_PORT = 8787
+DEFAULT_LATENCY = 0.0
+DEFAULT_JITTER = 0.0
+DEFAULT_SLOW_LATENCY = 2.0
+DEFAULT_RETRY_AFTER = 1.0
+
+# mock_key() spells the behavior after "mock", as letters only so every provider's charset allows it
+_KEY_BEHAVIOR = re.compile(r"mock([a-z]+?)\d")
+_KEY_WORD = re.compile(r"[-_]")
+_GENERATE_CONTENT = re.compile(r"^models/([^/:]+):generateContent$")
+
+# (status, message, error code) each provider answers an invalid key with
+_INVALID_KEY_ERRORS = {
+    "openai": (401, "Incorrect API key provided.", "invalid_api_key"),
+    "claude": (401, "invalid x-api-key", "authentication_error"),
+    "gemini": (400, "API key not valid. Please pass a valid API key.", "API_KEY_INVALID"),
+    "mistral": (401, "Unauthorized", "invalid_api_key"),
+    "xai": (401, "Incorrect API key provided.", "invalid_api_key"),
+    "together": (401, "Invalid API key provided.", "invalid_api_key"),
+}
+
+
+def mock_key(provider, behavior="ok", number=0):
+    """
+    Returns a key the mock server answers with the given behavior, e.g. mock_key("claude", "invalid", 7).
+    """
+    if behavior not in BEHAVIORS:
+        raise ValueError(f"Unknown behavior: {behavior!r}")
+    key = f"{KEY_PREFIXES[provider]}mock{behavior}{number:06d}"
+    return key.ljust(KEY_LENGTHS[provider], "0")
+
+
+def key_behavior(api_key):
+    """
+    Returns the behavior a key asks for: the one after "mock" in a mock_key(), else
+    the first BEHAVIORS word in it, "ok" if none, and "invalid" for a missing key.
+    """
+    if not api_key:
+        return "invalid"
+    match = _KEY_BEHAVIOR.search(api_key)
+    if match and match.group(1) in BEHAVIORS:
+        return match.group(1)
+    for word in _KEY_WORD.split(api_key):
+        if word in BEHAVIORS:
+            return word
+    return "ok"
+
+
+def base_urls(root_url):
+    """
+    Returns {provider: base URL} for a mock server at root_url, suitable for
+    batch_validator.set_base_urls() or --base-url.
+    """
+    root_url = root_url.rstrip("/")
+    return {provider: f"{root_url}/{provider}/{version}" for provider, version in API_VERSIONS.items()}
+
+
+def _error(provider, status, message, code):
+    if provider == "claude":
+        return {"type": "error", "error": {"type": code, "message": message}}
+    if provider == "gemini":
+        return {"error": {"code": status, "message": message, "status": code}}
+    return {"error": {"message": message, "type": code, "code": code}}
+
+
+def _listing(provider):
+    if provider == "gemini":
+        return {"models": [{"name": f"models/{model}"} for model in MODELS[provider]]}
+    return {"object": "list", "data": [{"id": model, "object": "model"} for model in MODELS[provider]]}
+
+
+def _reply(provider, route, model):
+    # Success body for a generation request, shaped like the provider's own
+    text = f"Mock {provider} response from {model}."
+    if provider == "gemini":
+        return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}]}
+    if provider == "claude":
+        return {"type": "message", "role": "assistant", "model": model, "content": [{"type": "text", "text": text}]}
+    if route == "images/generations":
+        return {"created": int(time.time()), "data": [{"url": "https://mock.invalid/image.png"}]}
+    if route == "completions":
+        return {"object": "text_completion", "model": model, "choices": [{"index": 0, "text": text}]}
+    return {"object": "chat.completion", "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}]}
+
+
+# Generation routes each provider serves, relative to its base URL (Gemini's are matched by pattern)
+_ROUTES = {
+    "openai": ("chat/completions", "images/generations"),
+    "claude": ("messages",),
+    "mistral": ("chat/completions",),
+    "xai": ("chat/completions",),
+    "together": ("completions", "chat/completions"),
+}
+
+
+class MockProviderServer(ThreadingHTTPServer):
+    """
+    Local HTTP server imitating the six providers' model listing and generation
+    endpoints, for exercising the validators and benchmarks without network access.
+    Each request waits latency seconds plus up to jitter more before answering.
+    """
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, latency=DEFAULT_LATENCY, jitter=DEFAULT_JITTER, slow_latency=DEFAULT_SLOW_LATENCY,
+                 retry_after=DEFAULT_RETRY_AFTER, missing_models=(), verbose=False):
+        super().__init__(address, MockProviderHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_latency = slow_latency
+        self.retry_after = retry_after
+        self.missing_models = set(missing_models)
+        self.verbose = verbose
+        self._counts = Counter()
+        self._flaky = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def root_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def base_urls(self):
+        return base_urls(self.root_url)
+
+    def stats(self):
+        """
+        Returns {"requests": total, "by_status": {"<provider> <status>": count}}.
+        """
+        with self._lock:
+            counts = dict(self._counts)
+        return {"requests": sum(counts.values()),
+                "by_status": {f"{provider} {status}": count for (provider, status), count in sorted(counts.items())}}
+
+    def respond(self, provider, method, route, api_key, body):
+        """
+        Returns (status, JSON payload, extra headers) for one request, after the configured latency.
+        """
+        behavior = key_behavior(api_key)
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if behavior == "slow":
+            delay += self.slow_latency
+        if delay:
+            time.sleep(delay)
+        status, payload, headers = self._answer(provider, method, route, api_key, behavior, body)
+        with self._lock:
+            self._counts[(provider, status)] += 1
+        return status, payload, headers
+
+    def _answer(self, provider, method, route, api_key, behavior, body):
+        if behavior == "flaky":
+            with self._lock:
+                self._flaky[api_key] += 1
+                behavior = "overloaded" if self._flaky[api_key] % 2 else "ok"
+        if behavior == "invalid":
+            status, message, code = _INVALID_KEY_ERRORS[provider]
+            return status, _error(provider, status, message, code), {}
+        if behavior == "ratelimited":
+            return (429, _error(provider, 429, "Rate limit reached for requests.", "rate_limit_exceeded"),
+                    {"Retry-After": f"{self.retry_after:g}"})
+        if behavior == "quota":
+            return 429, _error(provider, 429, "You exceeded your current quota.", "insufficient_quota"), {}
+        if behavior == "error":
+            return 500, _error(provider, 500, "The server had an error processing your request.", "server_error"), {}
+        if behavior == "overloaded":
+            status = 529 if provider == "claude" else 503
+            return status, _error(provider, status, "The service is overloaded.", "overloaded_error"), {}
+
+        if method == "GET" and route == "models":
+            return 200, _listing(provider), {}
+        if method != "POST":
+            return 404, _error(provider, 404, f"No route for {method} {route}.", "not_found"), {}
+        match = _GENERATE_CONTENT.match(route) if provider == "gemini" else None
+        if match is None and route not in _ROUTES.get(provider, ()):
+            return 404, _error(provider, 404, f"No route for {method} {route}.", "not_found"), {}
+        try:
+            model = match.group(1) if match else json.loads(body or b"{}").get("model", "")
+        except ValueError:
+            return 400, _error(provider, 400, "Request body is not valid JSON.", "invalid_request_error"), {}
+        if model in self.missing_models or model not in MODELS[provider]:
+            return 404, _error(provider, 404, f"The model {model} does not exist.", "model_not_found"), {}
+        return 200, _reply(provider, route, model), {}
+
+
+class MockProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockProvider/1.0"
+    # Headers and body go out in separate writes; without TCP_NODELAY the body
+    # waits for a delayed ACK and every request gains ~40 ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        url = urlsplit(self.path)
+        if url.path == "/_stats":
+            return self._send(200, self.server.stats())
+        provider, _, rest = url.path.lstrip("/").partition("/")
+        if provider not in API_VERSIONS:
+            return self._send(404, {"error": {"message": f"Unknown provider {provider!r}"}})
+        # Drop the version segment: "v1/chat/completions" -> "chat/completions"
+        route = rest.partition("/")[2]
+        status, payload, headers = self.server.respond(provider, method, route, self._api_key(provider, url.query),
+                                                       body)
+        self._send(status, payload, headers)
+
+    def _api_key(self, provider, query):
+        if provider == "claude":
+            return self.headers.get("x-api-key")
+        if provider == "gemini":
+            return self.headers.get("x-goog-api-key") or parse_qs(query).get("key", [None])[0]
+        authorization = self.headers.get("Authorization") or ""
+        return authorization[len("Bearer "):] if authorization.startswith("Bearer ") else None
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_mock_server(host="127.0.0.1", port=0, **options):
+    """
+    Starts a MockProviderServer on a background thread (port 0 picks a free port).
+    Options are MockProviderServer's. Returns the server; call shutdown() to stop it.
+    """
+    server = MockProviderServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="mock-provider-server", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve imitations of the provider APIs for offline testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on, 0 for any free port")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="Seconds every request waits")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER,
+                        help="Up to this many random seconds added to each request's latency")
+    parser.add_argument("--slow-latency", type=float, default=DEFAULT_SLOW_LATENCY,
+                        help="Extra seconds for keys with the 'slow' behavior")
+    parser.add_argument("--retry-after", type=float, default=DEFAULT_RETRY_AFTER,
+                        help="Retry-After seconds sent with 429s for 'ratelimited' keys")
+    parser.add_argument("--missing-model", action="append", default=[], metavar="MODEL",
+                        help="Answer requests for this model with 404 model not found (repeatable)")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    server = MockProviderServer((args.host, args.port), latency=args.latency, jitter=args.jitter,
+                                slow_latency=args.slow_latency, retry_after=args.retry_after,
+                                missing_models=args.missing_model, verbose=args.verbose)
+    # The first line is read by validation_benchmark to find the port
+    print(f"Mock providers listening on {server.root_url}", flush=True)
+    print("Point the validators at it with:")
+    for provider, url in server.base_urls().items():
+        print(f"  --base-url {provider}={url}    or    {provider.upper()}_BASE_URL={url}")
+    print(f"Keys choose a behavior ({', '.join(BEHAVIORS)}) by containing it as a word, "
+          f"e.g. {mock_key('claude', 'invalid', 1)}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    sys.exit(0)
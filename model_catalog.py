@@ -0,0 +1,195 @@
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from deadline import Deadline
+from http_session import read_json, DEFAULT_MAX_LISTING_BYTES
+from validation_errors import ErrorClass, classify_error
+
+# Seconds a model listing, or a model seen missing/deprecated, is trusted before it is re-checked
+DEFAULT_CATALOG_TTL = 3600
+
+# Background threads used to refresh provider model listings
+REFRESH_WORKERS = 2
+
+# Catalog writes between sweeps that drop expired entries
+PRUNE_INTERVAL = 1024
+
+
+def model_ids(data):
+    """
+    Returns the model ids in a provider's model listing ({"data": [{"id"}]},
+    {"models": [{"name": "models/..."}]} or a bare list), lower-cased.
+    """
+    if isinstance(data, dict):
+        items = data.get("data", data.get("models", []))
+    else:
+        items = data if isinstance(data, list) else []
+    ids = set()
+    for item in items:
+        name = item
+        if isinstance(item, dict):
+            name = item.get("id") or item.get("name")
+        if isinstance(name, str) and name:
+            # Gemini names models "models/<id>"
+            ids.add(name[len("models/"):].lower() if name.startswith("models/") else name.lower())
+    return ids
+
+
+def list_models(session, url, headers, params=None):
+    """
+    Fetches a provider's model listing over a requests session, reading at most
+    DEFAULT_MAX_LISTING_BYTES within the default deadline. Returns the set of model ids.
+    """
+    deadline = Deadline()
+    response = session.get(url, headers=headers, params=params, timeout=deadline.timeout(), stream=True)
+    response.raise_for_status()
+    return model_ids(read_json(response, max_bytes=DEFAULT_MAX_LISTING_BYTES, deadline=deadline))
+
+
+def _scope(provider, api_key):
+    # Keys of one provider can see different models, so everything is remembered per key
+    return provider, hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class ModelCatalog:
+    """
+    Remembers, per provider and key, which models exist (from the listing the key
+    gets and from its successful probes) and which turned out to be missing or
+    deprecated, so the key's fallback chains skip models that cannot work.
+    Entries expire after ttl seconds.
+    """
+
+    def __init__(self, ttl=DEFAULT_CATALOG_TTL):
+        self.ttl = ttl
+        self._listings = {}
+        self._available = {}
+        self._unavailable = {}
+        self._refreshing = set()
+        self._writes = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _fresh(self, stamp, now):
+        return stamp is not None and now - stamp < self.ttl
+
+    def order(self, provider, api_key, models):
+        """
+        Returns the models worth trying with api_key, in the given fallback order with
+        duplicates removed: models known to be missing or deprecated for the key are
+        dropped, as are models absent from the key's fresh listing unless a probe
+        recently succeeded with them.
+        If every model is ruled out, only the last one is returned so the probe
+        still reports the provider's actual error.
+        """
+        now = time.time()
+        scope = _scope(provider, api_key)
+        models = list(dict.fromkeys(models))
+        with self._lock:
+            listing = self._listings.get(scope)
+            listed = listing[0] if listing and self._fresh(listing[1], now) and listing[0] else None
+            usable = []
+            for model in models:
+                key = (scope, model.lower())
+                if self._fresh(self._unavailable.get(key), now):
+                    continue
+                if listed is not None and key[1] not in listed and not self._fresh(self._available.get(key), now):
+                    continue
+                usable.append(model)
+        return usable or models[-1:]
+
+    def record(self, provider, api_key, model, error=None):
+        """
+        Records the outcome of a probe with api_key for a model: success marks it
+        available to the key, an error classified as MODEL_NOT_FOUND marks it
+        unavailable, anything else is ignored.
+        """
+        key = (_scope(provider, api_key), model.lower())
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            if error is None:
+                self._available[key] = now
+                self._unavailable.pop(key, None)
+            elif classify_error(error) is ErrorClass.MODEL_NOT_FOUND:
+                self._unavailable[key] = now
+                self._available.pop(key, None)
+
+    def set_listing(self, provider, api_key, ids):
+        """
+        Stores the model ids the provider currently lists for api_key.
+        """
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            self._listings[_scope(provider, api_key)] = ({model.lower() for model in ids}, now)
+
+    def refresh_in_background(self, provider, api_key, fetch):
+        """
+        Calls fetch() on a background thread to refresh the listing of api_key,
+        unless the listing is still fresh or a refresh is already running.
+        fetch returns an iterable of model ids; if it raises, the old listing is kept.
+        """
+        scope = _scope(provider, api_key)
+        with self._lock:
+            listing = self._listings.get(scope)
+            if (listing and self._fresh(listing[1], time.time())) or scope in self._refreshing:
+                return False
+            self._refreshing.add(scope)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="catalog")
+        self._executor.submit(self._refresh, provider, api_key, scope, fetch)
+        return True
+
+    def _refresh(self, provider, api_key, scope, fetch):
+        try:
+            self.set_listing(provider, api_key, fetch())
+        except Exception:
+            # A failed refresh keeps whatever is known; the next validation tries again
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(scope)
+
+    def _prune(self, now):
+        # Entries are kept per key, so expired ones are dropped every PRUNE_INTERVAL writes
+        self._writes += 1
+        if self._writes % PRUNE_INTERVAL:
+            return
+        for entries in (self._available, self._unavailable):
+            for key in [key for key, stamp in entries.items() if not self._fresh(stamp, now)]:
+                del entries[key]
+        for scope in [scope for scope, listing in self._listings.items() if not self._fresh(listing[1], now)]:
+            del self._listings[scope]
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
+            self._available.clear()
+            self._unavailable.clear()
+
+
+_default_catalog = None
+_default_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """
+    Returns the process-wide model catalog, creating it on first use.
+    """
+    global _default_catalog
+    if _default_catalog is None:
+        with _default_catalog_lock:
+            if _default_catalog is None:
+                _default_catalog = ModelCatalog()
+    return _default_catalog
+
+
+def set_catalog(catalog):
+    """
+    Replaces the process-wide model catalog.
+    """
+    global _default_catalog
+    with _default_catalog_lock:
+        _default_catalog = catalog
@@ -1,103 +1,286 @@
 import os
 import sys
-import requests
-from openai import OpenAI
 
-def validate_openai_api_key(api_key):
+from http_session import get_session, describe_http_error, read_json, cap_error_body, DEFAULT_MAX_RESPONSE_BYTES
+from async_http import get_async_session, post_json, describe_error, AsyncHTTPError
+from validation_errors import KeyRejected, ErrorClass, is_auth_failure, status_of, classify_error
+from deadline import Deadline
+from probe_runner import (run_probes, run_probes_async, probe_auth, probe_auth_async, check_tier, check_profile,
+                          finish, validate_once, validate_once_async, TIER_AUTH, TIER_FULL, PROFILE_STANDARD,
+                          PROFILE_LEAN, LEAN_PROMPT)
+from validation_result import ProbeResult, ValidationResult
+from provider_registry import compile_path, extract_path
+
+PROVIDER = "openai"
+
+# REST endpoints; OPENAI_BASE_URL or set_base_url() point them elsewhere, e.g. at mock_provider_server
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+API_BASE_URL = (os.environ.get("OPENAI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+CHAT_COMPLETIONS_URL = f"{API_BASE_URL}/chat/completions"
+IMAGE_GENERATIONS_URL = f"{API_BASE_URL}/images/generations"
+MODELS_URL = f"{API_BASE_URL}/models"
+
+TEXT_MODEL = "gpt-4.1"
+PROJECT_KEY_FALLBACK_MODEL = "gpt-4o"
+IMAGE_MODEL = "dall-e-3"
+# The lean profile asks for the cheapest image there is: DALL-E 2 at its smallest size
+LEAN_IMAGE_MODEL = "dall-e-2"
+# Tried once when the first image model is out of quota or not available to the key
+IMAGE_FALLBACK_MODELS = {IMAGE_MODEL: LEAN_IMAGE_MODEL, LEAN_IMAGE_MODEL: IMAGE_MODEL}
+
+TEXT_PROMPT = "Say 'OpenAI API key is working correctly!' in one short sentence."
+IMAGE_PROMPT = "A simple blue circle on a white background"
+
+
+def set_base_url(base_url=None):
     """
-    Validates an OpenAI API key by testing both text and image generation capabilities.
-    Returns a tuple containing validation results and test prompts.
+    Points the validator at another API base URL, such as a mock_provider_server,
+    or back at OPENAI_BASE_URL / DEFAULT_BASE_URL when base_url is None.
+    """
+    global API_BASE_URL, CHAT_COMPLETIONS_URL, IMAGE_GENERATIONS_URL, MODELS_URL
+    API_BASE_URL = (base_url or os.environ.get("OPENAI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+    CHAT_COMPLETIONS_URL = f"{API_BASE_URL}/chat/completions"
+    IMAGE_GENERATIONS_URL = f"{API_BASE_URL}/images/generations"
+    MODELS_URL = f"{API_BASE_URL}/models"
+
+
+def _build_headers(api_key):
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+
+def _chat_payload(model, lean):
+    if lean:
+        return {"model": model, "messages": [{"role": "user", "content": LEAN_PROMPT}], "max_tokens": 1}
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": TEXT_PROMPT}
+        ],
+        "max_tokens": 20
+    }
+
+
+def _image_model(lean):
+    return LEAN_IMAGE_MODEL if lean else IMAGE_MODEL
+
+
+def _image_payload(lean, model=None):
+    return {
+        "model": model or _image_model(lean),
+        "prompt": LEAN_PROMPT if lean else IMAGE_PROMPT,
+        "n": 1,
+        "size": "256x256"
+    }
+
+
+def _error_text(e):
+    # Include the response body so error codes like "invalid_api_key" can be matched
+    if isinstance(e, AsyncHTTPError):
+        return f"{str(e)} {e.body}"
+    response = getattr(e, "response", None)
+    if response is not None:
+        cap_error_body(response)
+        return f"{str(e)} {response.text}"
+    return str(e)
+
+
+def _needs_fallback_model(e, api_key):
+    # Project API keys (sk-proj-...) may be barred from TEXT_MODEL yet allowed others.
+    # That shows up as a 403 or a missing model; a 401 or invalid_api_key rejects the key itself.
+    if not api_key.startswith("sk-proj-") or status_of(e) == 401 or "invalid_api_key" in _error_text(e):
+        return False
+    return status_of(e) == 403 or classify_error(e) is ErrorClass.MODEL_NOT_FOUND
+
+
+def _text_failure(e, detail):
+    text_response = f"Text generation failed: Error code: {e.__class__.__name__} - {detail}"
+    if is_auth_failure(e):
+        raise KeyRejected(text_response, status_of(e))
+    return ProbeResult.from_error(text_response, e)
+
+
+# Where the answer is in a chat completion and in an image generation response
+_CHAT_TEXT = compile_path("choices[0].message.content")
+_IMAGE_URL = compile_path("data[0].url")
+
+
+def _post(session, url, headers, payload, deadline):
+    response = session.post(url, headers=headers, json=payload, timeout=deadline.timeout(), stream=True)
+    response.raise_for_status()
+    return read_json(response, deadline=deadline)
+
+
+def _test_text_generation(session, headers, api_key, deadline, lean):
+    """
+    Sends the chat completion probe. Returns a ProbeResult.
+    Raises KeyRejected if the provider rejects the key outright.
     """
-    text_valid = False
-    image_valid = False
-    text_response = None
-    image_url = None
-    text_prompt = "Say 'OpenAI API key is working correctly!' in one short sentence."
-    image_prompt = "A simple blue circle on a white background"
-    
-    # Create client with the provided API key
-    client = OpenAI(api_key=api_key)
-    
-    # Test text generation
     try:
-        # Try to handle project API keys (sk-proj-...) by using different models
         try:
-            completion = client.chat.completions.create(
-                model="gpt-4.1",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": text_prompt}
-                ],
-                max_tokens=20
-            )
-            text_response = completion.choices[0].message.content.strip()
-            text_valid = True
+            completion = _post(session, CHAT_COMPLETIONS_URL, headers, _chat_payload(TEXT_MODEL, lean), deadline)
         except Exception as e1:
-            # If standard model fails, try with GPT-4 which might be accessible
-            if "invalid_api_key" in str(e1) and api_key.startswith("sk-proj-"):
-            
+            if _needs_fallback_model(e1, api_key):
                 try:
-                    completion = client.chat.completions.create(
-                        model="gpt-4o",
-                        messages=[
-                            {"role": "system", "content": "You are a helpful assistant."},
-                            {"role": "user", "content": text_prompt}
-                        ],
-                        max_tokens=20
-                    )
-                    text_response = completion.choices[0].message.content.strip()
-                    text_valid = True
+                    completion = _post(session, CHAT_COMPLETIONS_URL, headers, _chat_payload(PROJECT_KEY_FALLBACK_MODEL, lean), deadline)
                 except Exception as e2:
-                    raise Exception(f"Project API key not working with standard models: {str(e2)}")
+                    return _text_failure(e2, f"Project API key not working with standard models: {describe_http_error(e2)}")
             else:
                 raise e1
+        return ProbeResult(True, extract_path(completion, _CHAT_TEXT))
     except Exception as e:
-        error_detail = ""
-        if hasattr(e, 'response') and e.response:
+        return _text_failure(e, describe_http_error(e))
+
+
+def _needs_fallback_image_model(e):
+    text = _error_text(e).lower()
+    return "insufficient_quota" in text or "not_available" in text or classify_error(e) is ErrorClass.MODEL_NOT_FOUND
+
+
+def _image_failure(e, detail):
+    return ProbeResult.from_error(f"Image generation failed: Error code: {e.__class__.__name__} - {detail}", e)
+
+
+def _test_image_generation(session, headers, deadline, lean):
+    """
+    Sends the image generation probe, retrying once with the other DALL-E model
+    (IMAGE_FALLBACK_MODELS) on quota or availability errors. Returns a ProbeResult.
+    """
+    model = _image_model(lean)
+    try:
+        try:
+            response = _post(session, IMAGE_GENERATIONS_URL, headers, _image_payload(lean), deadline)
+        except Exception as e1:
+            if not _needs_fallback_image_model(e1):
+                raise
+            fallback = IMAGE_FALLBACK_MODELS[model]
             try:
-                error_detail = f" - {e.response.json().get('error', {}).get('message', '')}"
-            except:
-                pass
-        text_response = f"Text generation failed: Error code: {e.__class__.__name__} - {str(e)}{error_detail}"
+                response = _post(session, IMAGE_GENERATIONS_URL, headers, _image_payload(lean, fallback), deadline)
+            except Exception as e2:
+                return _image_failure(e2, f"Failed with both {model} and {fallback}: {describe_http_error(e2)}")
+        return ProbeResult(True, extract_path(response, _IMAGE_URL))
+    except Exception as e:
+        return _image_failure(e, describe_http_error(e))
+
+
+def validate_openai_api_key(api_key, *, parallel=False, session=None, tier=TIER_FULL, structured=False,
+                            deadline=None, retry=None, profile=PROFILE_STANDARD):
+    """
+    Validates an OpenAI API key by testing both text and image generation capabilities.
+    Requests go straight to the REST API on the shared keep-alive session from
+    http_session unless one is passed in, so no SDK client is built per key.
+    Keyword options are those of provider_engine.validate_provider_key.
+    Returns a tuple containing validation results and test prompts.
+    """
+    check_tier(tier)
+    check_profile(profile)
+    deadline = Deadline.of(deadline)
+    result = validate_once(PROVIDER, api_key, tier, deadline,
+                           lambda: _validate_openai_api_key(api_key, parallel, session, tier, deadline, retry, profile),
+                           profile)
+    return finish(result, structured)
+
+
+def _prompts(lean):
+    return (LEAN_PROMPT, LEAN_PROMPT) if lean else (TEXT_PROMPT, IMAGE_PROMPT)
+
+
+def _validate_openai_api_key(api_key, parallel, session, tier, deadline, retry, profile):
+    session = session or get_session()
+    headers = _build_headers(api_key)
     
-    # Test image generation
+    if tier == TIER_AUTH:
+        return ValidationResult(PROVIDER, TIER_AUTH, probe_auth(session, MODELS_URL, headers, deadline=deadline, provider=PROVIDER, retry=retry))
+    
+    lean = profile == PROFILE_LEAN
+    text_result, image_result = run_probes(
+        lambda: _test_text_generation(session, headers, api_key, deadline, lean),
+        lambda: _test_image_generation(session, headers, deadline, lean),
+        parallel=parallel,
+        deadline=deadline,
+        provider=PROVIDER,
+        retry=retry,
+    )
+    
+    return ValidationResult(PROVIDER, TIER_FULL, text_result, image_result, *_prompts(lean))
+
+
+async def _test_text_generation_async(session, headers, api_key, deadline, lean):
     try:
-        # Try with DALL-E 2 first
         try:
-            response = client.images.generate(
-                model="dall-e-3",
-                prompt=image_prompt,
-                n=1,
-                size="256x256"
-            )
-            image_url = response.data[0].url
-            image_valid = True
+            completion = await post_json(session, CHAT_COMPLETIONS_URL, headers, _chat_payload(TEXT_MODEL, lean), deadline=deadline,
+                                         max_bytes=DEFAULT_MAX_RESPONSE_BYTES)
         except Exception as e1:
-            # If DALL-E 2 fails, try with DALL-E 3
-            if "insufficient_quota" in str(e1).lower() or "not_available" in str(e1).lower():
+            if _needs_fallback_model(e1, api_key):
                 try:
-                    response = client.images.generate(
-                        model="dall-e-3",
-                        prompt=image_prompt,
-                        n=1,
-                        size="256x256"
-                    )
-                    image_url = response.data[0].url
-                    image_valid = True
+                    completion = await post_json(session, CHAT_COMPLETIONS_URL, headers, _chat_payload(PROJECT_KEY_FALLBACK_MODEL, lean),
+                                                 deadline=deadline, max_bytes=DEFAULT_MAX_RESPONSE_BYTES)
                 except Exception as e2:
-                    raise Exception(f"Image generation failed with both DALL-E 2 and 3: {str(e2)}")
+                    return _text_failure(e2, f"Project API key not working with standard models: {describe_error(e2)}")
             else:
                 raise e1
+        return ProbeResult(True, extract_path(completion, _CHAT_TEXT))
     except Exception as e:
-        error_detail = ""
-        if hasattr(e, 'response') and e.response:
+        return _text_failure(e, describe_error(e))
+
+
+async def _test_image_generation_async(session, headers, deadline, lean):
+    # Falls back to the other DALL-E model like the sync version
+    model = _image_model(lean)
+    try:
+        try:
+            response = await post_json(session, IMAGE_GENERATIONS_URL, headers, _image_payload(lean), deadline=deadline,
+                                       max_bytes=DEFAULT_MAX_RESPONSE_BYTES)
+        except Exception as e1:
+            if not _needs_fallback_image_model(e1):
+                raise
+            fallback = IMAGE_FALLBACK_MODELS[model]
             try:
-                error_detail = f" - {e.response.json().get('error', {}).get('message', '')}"
-            except:
-                pass
-        image_url = f"Image generation failed: Error code: {e.__class__.__name__} - {str(e)}{error_detail}"
+                response = await post_json(session, IMAGE_GENERATIONS_URL, headers, _image_payload(lean, fallback),
+                                           deadline=deadline, max_bytes=DEFAULT_MAX_RESPONSE_BYTES)
+            except Exception as e2:
+                return _image_failure(e2, f"Failed with both {model} and {fallback}: {describe_error(e2)}")
+        return ProbeResult(True, extract_path(response, _IMAGE_URL))
+    except Exception as e:
+        return _image_failure(e, describe_error(e))
+
+
+async def validate_openai_api_key_async(api_key, *, parallel=False, session=None, tier=TIER_FULL, structured=False,
+                                        deadline=None, retry=None, profile=PROFILE_STANDARD):
+    """
+    Async version of validate_openai_api_key that runs on a shared aiohttp session.
+    Returns the same tuple as validate_openai_api_key.
+    """
+    check_tier(tier)
+    check_profile(profile)
+    deadline = Deadline.of(deadline)
+    result = await validate_once_async(PROVIDER, api_key, tier, deadline,
+                                       lambda: _validate_openai_api_key_async(api_key, parallel, session, tier, deadline, retry, profile),
+                                       profile)
+    return finish(result, structured)
+
+
+async def _validate_openai_api_key_async(api_key, parallel, session, tier, deadline, retry, profile):
+    session = session or get_async_session()
+    headers = _build_headers(api_key)
+    
+    if tier == TIER_AUTH:
+        return ValidationResult(PROVIDER, TIER_AUTH, await probe_auth_async(session, MODELS_URL, headers, deadline=deadline, provider=PROVIDER, retry=retry))
+    
+    lean = profile == PROFILE_LEAN
+    text_result, image_result = await run_probes_async(
+        lambda: _test_text_generation_async(session, headers, api_key, deadline, lean),
+        lambda: _test_image_generation_async(session, headers, deadline, lean),
+        parallel=parallel,
+        deadline=deadline,
+        provider=PROVIDER,
+        retry=retry,
+    )
     
-    return (text_valid, text_response, image_valid, image_url, text_prompt, image_prompt)
+    return ValidationResult(PROVIDER, TIER_FULL, text_result, image_result, *_prompts(lean))
 
 
 if __name__ == "__main__":
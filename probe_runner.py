@@ -0,0 +1,300 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from http_session import describe_http_error, read_json, DEFAULT_MAX_LISTING_BYTES
+from async_http import request_json, describe_error, AsyncHTTPError
+from validation_errors import ErrorClass, KeyRejected
+from validation_result import ProbeResult, ValidationResult
+from deadline import Deadline, DeadlineExceeded
+from metrics import timed_probe, timed_probe_async
+from retry_policy import get_retry_policy
+from single_flight import get_single_flight
+from key_format import get_key_formats
+
+# Validation tiers: "auth" only proves the key authenticates with one cheap
+# model-listing request; "full" runs the text and image generation probes.
+TIER_AUTH = "auth"
+TIER_FULL = "full"
+TIERS = (TIER_AUTH, TIER_FULL)
+
+# Probe profiles for the full tier: "standard" sends the descriptive prompts and
+# prints a readable answer; "lean" sends the smallest request that still proves
+# generation works (LEAN_PROMPT, max_tokens=1 where allowed, no system message).
+PROFILE_STANDARD = "standard"
+PROFILE_LEAN = "lean"
+PROFILES = (PROFILE_STANDARD, PROFILE_LEAN)
+
+# Prompt of every lean probe: one token in, and nothing to think about
+LEAN_PROMPT = "Hi"
+
+# Probe names used to label timings
+PROBE_AUTH = "auth"
+PROBE_TEXT = "text"
+PROBE_IMAGE = "image"
+
+# Threads used to run the image/multimodal probe alongside the text probe.
+# The text probe always runs on the caller's thread, so one key needs one extra thread.
+DEFAULT_PROBE_WORKERS = 64
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DEFAULT_PROBE_WORKERS, thread_name_prefix="probe")
+    return _executor
+
+
+def _timed(probe, provider=None, name=None, retry=None, deadline=None):
+    """
+    Runs a probe under the retry policy and stamps its ProbeResult with the wall-clock
+    latency, retries included; the probe's timing and HTTP attempts are recorded in
+    the metrics as (provider, name).
+    Returns (result, rejection) where rejection is the KeyRejected raised, if any.
+    """
+    start = time.perf_counter()
+    rejection = None
+    try:
+        result = timed_probe(provider, name, lambda: retry.run(probe, deadline))
+    except KeyRejected as e:
+        rejection = e
+        result = ProbeResult.from_error(e.response, e)
+    result.latency = round(time.perf_counter() - start, 4)
+    return result, rejection
+
+
+async def _timed_async(probe, provider=None, name=None, retry=None, deadline=None):
+    start = time.perf_counter()
+    rejection = None
+    try:
+        result = await timed_probe_async(provider, name, lambda: retry.run_async(probe, deadline))
+    except KeyRejected as e:
+        rejection = e
+        result = ProbeResult.from_error(e.response, e)
+    result.latency = round(time.perf_counter() - start, 4)
+    return result, rejection
+
+
+def _deadline_result(deadline):
+    e = DeadlineExceeded(f"Validation deadline of {deadline.seconds:g}s exceeded before the probe finished")
+    return ProbeResult.from_error(f"Image capability check failed: {e}", e)
+
+
+def run_probes(text_probe, image_probe, parallel=False, deadline=None, provider=None, retry=None):
+    """
+    Runs the text and image capability probes of one key, one after the other or
+    at the same time when parallel is True. Each probe is a callable returning a
+    ProbeResult. If the text probe raises KeyRejected the image probe is skipped
+    (or, when parallel, abandoned) and reported as such. With a Deadline, an
+    image probe that would start after it expired is skipped, and a parallel one
+    still running when it expires is abandoned, both reported as timed out.
+    provider labels the probes' timings in the metrics. Probes that fail transiently
+    are retried by retry, a retry_policy.RetryPolicy (default get_retry_policy()).
+    Returns a tuple (text_result, image_result) with latencies filled in.
+    """
+    retry = retry or get_retry_policy()
+    if not parallel:
+        text_result, rejection = _timed(text_probe, provider, PROBE_TEXT, retry, deadline)
+        if rejection is not None:
+            return text_result, ProbeResult.from_error(rejection.skip_reason(), rejection)
+        if deadline is not None and deadline.expired():
+            # The text probe used up the budget; don't start a probe that cannot finish in time
+            return text_result, _deadline_result(deadline)
+        image_result, _ = _timed(image_probe, provider, PROBE_IMAGE, retry, deadline)
+        return text_result, image_result
+
+    image_future = _get_executor().submit(_timed, image_probe, provider, PROBE_IMAGE, retry, deadline)
+    text_result, rejection = _timed(text_probe, provider, PROBE_TEXT, retry, deadline)
+    if rejection is not None:
+        # Don't wait for a probe that can only fail the same way
+        image_future.cancel()
+        return text_result, ProbeResult.from_error(rejection.skip_reason(), rejection)
+    try:
+        image_result, _ = image_future.result(timeout=deadline.remaining() if deadline is not None else None)
+    except FutureTimeout:
+        image_result = _deadline_result(deadline)
+    return text_result, image_result
+
+
+async def run_probes_async(text_probe, image_probe, parallel=False, deadline=None, provider=None, retry=None):
+    """
+    Async version of run_probes. Each probe is a zero-argument coroutine function
+    returning a ProbeResult.
+    """
+    retry = retry or get_retry_policy()
+    if not parallel:
+        text_result, rejection = await _timed_async(text_probe, provider, PROBE_TEXT, retry, deadline)
+        if rejection is not None:
+            return text_result, ProbeResult.from_error(rejection.skip_reason(), rejection)
+        if deadline is not None and deadline.expired():
+            return text_result, _deadline_result(deadline)
+        image_result, _ = await _timed_async(image_probe, provider, PROBE_IMAGE, retry, deadline)
+        return text_result, image_result
+
+    image_task = asyncio.ensure_future(_timed_async(image_probe, provider, PROBE_IMAGE, retry, deadline))
+    text_result, rejection = await _timed_async(text_probe, provider, PROBE_TEXT, retry, deadline)
+    if rejection is not None:
+        image_task.cancel()
+        return text_result, ProbeResult.from_error(rejection.skip_reason(), rejection)
+    try:
+        image_result, _ = await asyncio.wait_for(image_task, deadline.remaining() if deadline is not None else None)
+    except asyncio.TimeoutError:
+        image_result = _deadline_result(deadline)
+    return text_result, image_result
+
+
+def check_tier(tier):
+    """
+    Raises ValueError for an unknown validation tier.
+    """
+    if tier not in TIERS:
+        raise ValueError(f"Unknown validation tier {tier!r}; expected one of {', '.join(TIERS)}")
+    return tier
+
+
+def check_profile(profile):
+    """
+    Raises ValueError for an unknown probe profile.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown probe profile {profile!r}; expected one of {', '.join(PROFILES)}")
+    return profile
+
+
+def malformed_result(provider, tier, problem):
+    """
+    Builds the ValidationResult of a key ruled out by a key_format.KeyProblem.
+    """
+    text = ProbeResult(False, f"Malformed key: {problem.message}", error_class=ErrorClass.MALFORMED)
+    image = None
+    if tier == TIER_FULL:
+        image = ProbeResult(False, "Skipped: the key is malformed.", error_class=ErrorClass.MALFORMED)
+    return ValidationResult(provider, tier, text, image)
+
+
+def _precheck(provider, api_key, tier):
+    # The malformed result for a key that cannot be valid, or None to go ahead and send requests
+    key_formats = get_key_formats()
+    problem = key_formats.problem(provider, api_key) if key_formats is not None else None
+    return None if problem is None else malformed_result(provider, tier, problem)
+
+
+def validate_once(provider, api_key, tier, deadline, validate, profile=PROFILE_STANDARD):
+    """
+    Runs validate() (returning a ValidationResult) unless a validation of the same
+    (provider, key, tier, profile) is already in flight, in which case every caller
+    gets that one's result instead of making the same paid requests again. A caller
+    whose deadline runs out while it waits gets a timed-out result.
+    A key that cannot fit the provider's key format (see key_format) gets a
+    malformed result at once, without any request.
+    """
+    malformed = _precheck(provider, api_key, tier)
+    if malformed is not None:
+        return malformed
+    single_flight = get_single_flight()
+    if single_flight is None:
+        return validate()
+    try:
+        return single_flight.do((provider, api_key, tier, profile), validate, deadline.remaining())
+    except TimeoutError:
+        return _wait_timeout_result(provider, tier, deadline)
+
+
+async def validate_once_async(provider, api_key, tier, deadline, validate, profile=PROFILE_STANDARD):
+    """
+    Async version of validate_once for a zero-argument coroutine function.
+    """
+    malformed = _precheck(provider, api_key, tier)
+    if malformed is not None:
+        return malformed
+    single_flight = get_single_flight()
+    if single_flight is None:
+        return await validate()
+    try:
+        return await single_flight.do_async((provider, api_key, tier, profile), validate, deadline.remaining())
+    except asyncio.TimeoutError:
+        return _wait_timeout_result(provider, tier, deadline)
+
+
+def _wait_timeout_result(provider, tier, deadline):
+    e = DeadlineExceeded(f"Validation deadline of {deadline.seconds:g}s exceeded waiting for the same key's "
+                         f"validation already in flight")
+    image = ProbeResult.from_error(f"Image capability check failed: {e}", e) if tier == TIER_FULL else None
+    return ValidationResult(provider, tier, ProbeResult.from_error(f"Validation failed: {e}", e), image)
+
+
+def finish(result, structured):
+    """
+    Returns the ValidationResult itself when structured is True, else its 6-tuple.
+    """
+    return result if structured else result.as_tuple()
+
+
+def _count_models(data):
+    # Model listings are {"data": [...]}, {"models": [...]} or a bare list depending on provider
+    if isinstance(data, list):
+        return len(data)
+    if isinstance(data, dict):
+        models = data.get("data", data.get("models"))
+        if isinstance(models, list):
+            return len(models)
+    return 0
+
+
+def probe_auth(session, url, headers, params=None, deadline=None, provider=None, retry=None):
+    """
+    Proves a key authenticates with one GET to the provider's model listing, which
+    costs no tokens. The request, including reading the listing (at most
+    DEFAULT_MAX_LISTING_BYTES of it), is bounded by deadline (a Deadline, seconds
+    or None for the default). provider labels the probe's timings in the metrics.
+    Transient failures are retried by retry (default get_retry_policy()).
+    Returns a ProbeResult with latency set.
+    """
+    deadline = Deadline.of(deadline)
+    retry = retry or get_retry_policy()
+    start = time.perf_counter()
+    result = timed_probe(provider, PROBE_AUTH,
+                         lambda: retry.run(lambda: _probe_auth(session, url, headers, params, deadline), deadline))
+    result.latency = round(time.perf_counter() - start, 4)
+    return result
+
+
+def _probe_auth(session, url, headers, params, deadline):
+    try:
+        response = session.get(url, headers=headers, params=params, timeout=deadline.timeout(), stream=True)
+        response.raise_for_status()
+        data = read_json(response, max_bytes=DEFAULT_MAX_LISTING_BYTES, deadline=deadline)
+        return ProbeResult(True, f"Authentication succeeded ({_count_models(data)} models visible)")
+    except Exception as e:
+        return ProbeResult.from_error(f"Authentication failed: {describe_http_error(e)}", e)
+
+
+async def probe_auth_async(session, url, headers, params=None, deadline=None, provider=None, retry=None):
+    """
+    Async version of probe_auth on an aiohttp session.
+    """
+    deadline = Deadline.of(deadline)
+    retry = retry or get_retry_policy()
+    start = time.perf_counter()
+    result = await timed_probe_async(
+        provider, PROBE_AUTH,
+        lambda: retry.run_async(lambda: _probe_auth_async(session, url, headers, params, deadline), deadline))
+    result.latency = round(time.perf_counter() - start, 4)
+    return result
+
+
+async def _probe_auth_async(session, url, headers, params, deadline):
+    try:
+        status, data, body = await request_json(session, url, headers, method="GET", params=params, deadline=deadline,
+                                                max_bytes=DEFAULT_MAX_LISTING_BYTES)
+        if status >= 400:
+            raise AsyncHTTPError(status, "", url, body)
+        return ProbeResult(True, f"Authentication succeeded ({_count_models(data)} models visible)")
+    except Exception as e:
+        return ProbeResult.from_error(f"Authentication failed: {describe_error(e)}", e)
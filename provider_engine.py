@@ -0,0 +1,198 @@
+from http_session import get_session, describe_http_error, read_json, DEFAULT_MAX_RESPONSE_BYTES
+from validation_errors import ErrorClass, KeyRejected, is_auth_failure, status_of, classify_error
+from async_http import get_async_session, post_json, describe_error
+from deadline import Deadline
+from probe_runner import (run_probes, run_probes_async, probe_auth, probe_auth_async, check_tier, check_profile,
+                          finish, validate_once, validate_once_async, TIER_AUTH, TIER_FULL, PROFILE_STANDARD,
+                          PROFILE_LEAN, LEAN_PROMPT)
+from validation_result import ProbeResult, ValidationResult
+from model_catalog import get_catalog, list_models
+from provider_registry import get_provider
+
+
+def _spec(provider):
+    return get_provider(provider) if isinstance(provider, str) else provider
+
+
+def _failure(probe, e, models, describe):
+    """
+    Turns the last error of a probe into its failed ProbeResult.
+    """
+    detail = describe(e)
+    if len(models) > 1:
+        detail = f"Failed with all {len(models)} models: {detail}"
+    if probe.unavailable and classify_error(e) is ErrorClass.MODEL_NOT_FOUND:
+        return ProbeResult.from_error(f"{probe.unavailable} ({detail})", e)
+    return ProbeResult.from_error(f"{probe.failure}: {detail}", e)
+
+
+def _rejected(probe, e, reject, describe):
+    # A rejected key fails the same way on every model, so fallbacks are never tried for it
+    message = f"{probe.failure}: {describe(e)}"
+    if reject:
+        raise KeyRejected(message, status_of(e))
+    return ProbeResult.from_error(message, e)
+
+
+def _prompt(probe, lean):
+    return LEAN_PROMPT if lean else probe.prompt
+
+
+def _run_probe(spec, probe, session, headers, api_key, deadline, reject, lean):
+    """
+    Sends probe (its lean payload when lean is True), falling back through its
+    models, skipping those the catalog knows are gone for api_key. At most
+    DEFAULT_MAX_RESPONSE_BYTES of the answer are read. Returns a ProbeResult.
+    With reject=True (the text probe) raises KeyRejected if the provider rejects
+    the key outright.
+    """
+    catalog = get_catalog()
+    models = catalog.order(spec.name, api_key, probe.models)
+    last_error = None
+    for model in models:
+        try:
+            response = session.post(probe.url(spec.base_url, model), headers=headers,
+                                    json=probe.build_payload(model, _prompt(probe, lean), lean),
+                                    timeout=deadline.timeout(), stream=True)
+            response.raise_for_status()
+            response_data = read_json(response, deadline=deadline)
+        except Exception as e:
+            catalog.record(spec.name, api_key, model, e)
+            if is_auth_failure(e):
+                return _rejected(probe, e, reject, describe_http_error)
+            last_error = e
+            continue
+        catalog.record(spec.name, api_key, model)
+        return ProbeResult(True, probe.response_text(response_data))
+    return _failure(probe, last_error, models, describe_http_error)
+
+
+async def _run_probe_async(spec, probe, session, headers, api_key, deadline, reject, lean):
+    catalog = get_catalog()
+    models = catalog.order(spec.name, api_key, probe.models)
+    last_error = None
+    for model in models:
+        try:
+            response_data = await post_json(session, probe.url(spec.base_url, model), headers,
+                                            probe.build_payload(model, _prompt(probe, lean), lean),
+                                            deadline=deadline, max_bytes=DEFAULT_MAX_RESPONSE_BYTES)
+        except Exception as e:
+            catalog.record(spec.name, api_key, model, e)
+            if is_auth_failure(e):
+                return _rejected(probe, e, reject, describe_error)
+            last_error = e
+            continue
+        catalog.record(spec.name, api_key, model)
+        return ProbeResult(True, probe.response_text(response_data))
+    return _failure(probe, last_error, models, describe_error)
+
+
+def _refresh_catalog(spec, session, headers, api_key):
+    """
+    Refreshes the model catalog in the background with a key that just worked, if
+    the provider has fallback models to choose between and its listing has expired.
+    """
+    if spec.has_fallbacks:
+        get_catalog().refresh_in_background(
+            spec.name, api_key, lambda: list_models(session, spec.models_url, headers, spec.models_params))
+
+
+def validate_provider_key(provider, api_key, *, parallel=False, session=None, tier=TIER_FULL, structured=False,
+                          deadline=None, retry=None, profile=PROFILE_STANDARD):
+    """
+    Validates an API key for a registered provider (a name or a
+    provider_registry.ProviderSpec) by running its text and image probes.
+    The keyword options, shared by every validate_*_api_key function:
+    parallel=True runs the text and image probes at the same time.
+    session is the requests session to use; by default the shared keep-alive
+    session from http_session (the async versions take an aiohttp session).
+    tier="auth" only checks that the key authenticates, with one model-listing
+    request and no tokens spent; the default tier="full" runs the generation probes.
+    structured=True returns a ValidationResult (per-probe error class, HTTP status
+    and latency) instead of the tuple.
+    deadline caps the whole validation, in seconds or as a deadline.Deadline
+    (default DEFAULT_DEADLINE); every request's connect/read timeouts are
+    clipped to the budget left, including fallback models.
+    retry is the retry_policy.RetryPolicy for probes that fail transiently
+    (connection errors, 5XX); by default get_retry_policy().
+    profile="lean" sends the smallest probes (probe_runner.LEAN_PROMPT,
+    max_tokens=1, no system message) instead of the descriptive prompts.
+    Concurrent calls for the same key, tier and profile share one validation
+    (see probe_runner.validate_once).
+    Returns a tuple with validation results and test prompts.
+    """
+    spec = _spec(provider)
+    check_tier(tier)
+    check_profile(profile)
+    deadline = Deadline.of(deadline)
+    result = validate_once(spec.name, api_key, tier, deadline,
+                           lambda: _validate(spec, api_key, parallel, session, tier, deadline, retry, profile),
+                           profile)
+    return finish(result, structured)
+
+
+def _validate(spec, api_key, parallel, session, tier, deadline, retry, profile):
+    session = session or get_session()
+    headers = spec.build_headers(api_key)
+
+    if tier == TIER_AUTH:
+        return ValidationResult(spec.name, TIER_AUTH, probe_auth(session, spec.models_url, headers, spec.models_params,
+                                                                 deadline=deadline, provider=spec.name, retry=retry))
+
+    lean = profile == PROFILE_LEAN
+    text_result, image_result = run_probes(
+        lambda: _run_probe(spec, spec.text, session, headers, api_key, deadline, True, lean),
+        lambda: _run_probe(spec, spec.image, session, headers, api_key, deadline, False, lean),
+        parallel=parallel,
+        deadline=deadline,
+        provider=spec.name,
+        retry=retry,
+    )
+
+    if text_result.valid:
+        _refresh_catalog(spec, session, headers, api_key)
+
+    return ValidationResult(spec.name, TIER_FULL, text_result, image_result, _prompt(spec.text, lean),
+                            _prompt(spec.image, lean))
+
+
+async def validate_provider_key_async(provider, api_key, *, parallel=False, session=None, tier=TIER_FULL,
+                                      structured=False, deadline=None, retry=None, profile=PROFILE_STANDARD):
+    """
+    Async version of validate_provider_key that runs on a shared aiohttp session.
+    Returns the same tuple as validate_provider_key.
+    """
+    spec = _spec(provider)
+    check_tier(tier)
+    check_profile(profile)
+    deadline = Deadline.of(deadline)
+    result = await validate_once_async(spec.name, api_key, tier, deadline,
+                                       lambda: _validate_async(spec, api_key, parallel, session, tier, deadline,
+                                                               retry, profile),
+                                       profile)
+    return finish(result, structured)
+
+
+async def _validate_async(spec, api_key, parallel, session, tier, deadline, retry, profile):
+    session = session or get_async_session()
+    headers = spec.build_headers(api_key)
+
+    if tier == TIER_AUTH:
+        return ValidationResult(spec.name, TIER_AUTH, await probe_auth_async(
+            session, spec.models_url, headers, spec.models_params, deadline=deadline, provider=spec.name, retry=retry))
+
+    lean = profile == PROFILE_LEAN
+    text_result, image_result = await run_probes_async(
+        lambda: _run_probe_async(spec, spec.text, session, headers, api_key, deadline, True, lean),
+        lambda: _run_probe_async(spec, spec.image, session, headers, api_key, deadline, False, lean),
+        parallel=parallel,
+        deadline=deadline,
+        provider=spec.name,
+        retry=retry,
+    )
+
+    if text_result.valid:
+        _refresh_catalog(spec, get_session(), headers, api_key)
+
+    return ValidationResult(spec.name, TIER_FULL, text_result, image_result, _prompt(spec.text, lean),
+                            _prompt(spec.image, lean))
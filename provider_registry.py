@@ -0,0 +1,262 @@
+import os
+import re
+
+# Marks a "[*]" step in a compiled JSON path: every element of a list, texts joined
+_EACH = object()
+
+_PATH_STEP = re.compile(r"([^.\[\]]+)|\[(\d+|\*)\]")
+
+
+def compile_path(path):
+    """
+    Compiles a JSON path such as "choices[0].message.content" or
+    "candidates[0].content.parts[*].text" into a tuple of steps for extract_path.
+    """
+    steps = []
+    for name, index in _PATH_STEP.findall(path):
+        if name:
+            steps.append(name)
+        else:
+            steps.append(_EACH if index == "*" else int(index))
+    return tuple(steps)
+
+
+def extract_path(data, steps):
+    """
+    Follows compiled steps through parsed JSON. Returns the text found there,
+    stripped, or "" if the response does not have that shape.
+    """
+    for position, step in enumerate(steps):
+        if step is _EACH:
+            if not isinstance(data, list):
+                return ""
+            return "".join(extract_path(item, steps[position + 1:]) for item in data).strip()
+        try:
+            data = data[step]
+        except (KeyError, IndexError, TypeError):
+            return ""
+    return data.strip() if isinstance(data, str) else ""
+
+
+def _fill(template, model, prompt):
+    # Copies a payload template with the "{model}" and "{prompt}" placeholders replaced
+    if isinstance(template, dict):
+        return {key: _fill(value, model, prompt) for key, value in template.items()}
+    if isinstance(template, list):
+        return [_fill(value, model, prompt) for value in template]
+    if template == "{model}":
+        return model
+    if template == "{prompt}":
+        return prompt
+    return template
+
+
+class ProbeSpec:
+    """
+    One capability probe: a POST to path (relative to the provider's base URL, with
+    "{model}" filled in) of payload, whose "{model}" and "{prompt}" strings are
+    filled in, trying models in order until one answers. extract is the JSON path
+    of the answer text; success formats a working answer ("{text}" is the text).
+    Failures read "<failure>: <error>", or "<unavailable> (<error>)" when the
+    model is missing and the provider has its own way of saying so.
+    lean_payload is the template sent by the lean probe profile: the cheapest
+    request the endpoint accepts (max_tokens=1 where allowed, no system message).
+    """
+    __slots__ = ("path", "models", "prompt", "payload", "lean_payload", "extract", "success", "failure", "unavailable")
+
+    def __init__(self, path, models, prompt, payload, extract, success="{text}", failure="Text generation failed",
+                 unavailable=None, lean_payload=None):
+        self.path = path
+        self.models = tuple(models)
+        self.prompt = prompt
+        self.payload = payload
+        self.lean_payload = payload if lean_payload is None else lean_payload
+        self.extract = compile_path(extract)
+        self.success = success
+        self.failure = failure
+        self.unavailable = unavailable
+
+    def url(self, base_url, model):
+        return f"{base_url}/{self.path.replace('{model}', model)}"
+
+    def build_payload(self, model, prompt=None, lean=False):
+        return _fill(self.lean_payload if lean else self.payload, model, prompt or self.prompt)
+
+    def response_text(self, data):
+        return self.success.format(text=extract_path(data, self.extract))
+
+
+class ProviderSpec:
+    """
+    Everything the shared engine (provider_engine) needs to validate a provider's
+    keys: base URL, how the key is sent, the model listing used by the auth tier,
+    and the text and image probes. The base URL can be overridden with
+    <NAME>_BASE_URL or set_base_url(), e.g. to point at mock_provider_server.
+    key_prefixes lets batch_validator recognise the provider's keys, and
+    key_format (a key_format.KeyFormat) rules out malformed ones without a request.
+    """
+
+    def __init__(self, name, base_url, text, image, auth_header="Authorization", auth_prefix="Bearer ", headers=None,
+                 models_path="models", models_params=None, key_prefixes=(), key_format=None):
+        self.name = name
+        self.default_base_url = base_url
+        self.env_var = f"{name.upper()}_BASE_URL"
+        self.text = text
+        self.image = image
+        self.auth_header = auth_header
+        self.auth_prefix = auth_prefix
+        self.static_headers = {"Content-Type": "application/json", **(headers or {})}
+        self.models_path = models_path
+        self.models_params = models_params
+        self.key_prefixes = tuple(key_prefixes)
+        self.key_format = key_format
+        self.set_base_url()
+
+    def set_base_url(self, base_url=None):
+        """
+        Points the provider at base_url, or back at <NAME>_BASE_URL / the default when None.
+        """
+        self.base_url = (base_url or os.environ.get(self.env_var) or self.default_base_url).rstrip("/")
+
+    @property
+    def models_url(self):
+        return f"{self.base_url}/{self.models_path}"
+
+    @property
+    def has_fallbacks(self):
+        return len(self.text.models) > 1 or len(self.image.models) > 1
+
+    def build_headers(self, api_key):
+        headers = dict(self.static_headers)
+        headers[self.auth_header] = self.auth_prefix + api_key
+        return headers
+
+
+_providers = {}
+
+
+def register_provider(spec):
+    """
+    Adds (or replaces) a provider. Returns the spec.
+    """
+    _providers[spec.name] = spec
+    return spec
+
+
+def get_provider(name):
+    """
+    Returns the registered ProviderSpec for name. Raises KeyError if there is none.
+    """
+    return _providers[name]
+
+
+def registered_providers():
+    """
+    Returns {name: ProviderSpec} for every registered provider.
+    """
+    return dict(_providers)
+
+
+def _claude_payload(max_tokens, vision=False):
+    content = [{"type": "text", "text": "{prompt}"}] if vision else "{prompt}"
+    return {"model": "{model}", "max_tokens": max_tokens, "messages": [{"role": "user", "content": content}]}
+
+
+def _chat_payload(system_message=True, max_tokens=20):
+    messages = [{"role": "user", "content": "{prompt}"}]
+    if system_message:
+        messages.insert(0, {"role": "system", "content": "You are a helpful assistant."})
+    return {"model": "{model}", "messages": messages, "max_tokens": max_tokens}
+
+
+# OpenAI-style chat completion answer
+CHAT_TEXT = "choices[0].message.content"
+
+register_provider(ProviderSpec(
+    "claude",
+    "https://api.anthropic.com/v1",
+    auth_header="x-api-key",
+    auth_prefix="",
+    headers={"anthropic-version": "2023-06-01"},
+    key_prefixes=("sk-ant-",),
+    text=ProbeSpec(
+        "messages", ["claude-3-haiku-20240307"],
+        "Say 'Claude API key is working correctly!' in one short sentence.",
+        _claude_payload(100), "content[0].text",
+        lean_payload=_claude_payload(1),
+    ),
+    # Claude doesn't generate images, so this checks it accepts a request in the vision message format
+    image=ProbeSpec(
+        "messages", ["claude-3-haiku-20240307"],
+        "This is a test for vision capability. Please respond with 'Claude vision capability is working correctly!'",
+        _claude_payload(100, vision=True), "content[0].text",
+        failure="Vision capability check failed",
+        lean_payload=_claude_payload(1, vision=True),
+    ),
+))
+
+register_provider(ProviderSpec(
+    "mistral",
+    "https://api.mistral.ai/v1",
+    text=ProbeSpec(
+        "chat/completions", ["mistral-small-latest"],
+        "Say 'Mistral AI API key is working correctly!' in one short sentence.",
+        _chat_payload(system_message=False), CHAT_TEXT,
+        lean_payload=_chat_payload(system_message=False, max_tokens=1),
+    ),
+    # Mistral has no image generation; the most capable model stands in for the multimodal check
+    image=ProbeSpec(
+        "chat/completions", ["mistral-large-latest"],
+        "This is a multimodal capability test. Please respond with 'Mistral AI multimodal test'.",
+        _chat_payload(system_message=False), CHAT_TEXT,
+        success="Response: {text}\nMistral AI doesn't currently offer native image generation, "
+                "but the API key is valid for their most advanced models.",
+        failure="Multimodal capability check failed",
+        lean_payload=_chat_payload(system_message=False, max_tokens=1),
+    ),
+))
+
+register_provider(ProviderSpec(
+    "xai",
+    "https://api.xai.com/v1",
+    key_prefixes=("xai-",),
+    text=ProbeSpec(
+        "chat/completions", ["grok-latest"],
+        "Say 'xAI API key is working correctly!' in one short sentence.",
+        _chat_payload(), CHAT_TEXT,
+        lean_payload=_chat_payload(system_message=False, max_tokens=1),
+    ),
+    image=ProbeSpec(
+        "chat/completions", ["grok-vision-latest"],
+        "This is a test for multimodal capability. Please respond with 'xAI multimodal test'.",
+        _chat_payload(), CHAT_TEXT,
+        success="Response: {text}",
+        failure="Multimodal capability check failed",
+        unavailable="The multimodal model is not available with this API key",
+        lean_payload=_chat_payload(system_message=False, max_tokens=1),
+    ),
+))
+
+register_provider(ProviderSpec(
+    "together",
+    "https://api.together.xyz/v1",
+    key_prefixes=("tgp_",),
+    # Modern model first, then the fallback
+    text=ProbeSpec(
+        "completions", ["meta-llama/Llama-3-8b-chat", "togethercomputer/llama-2-7b-chat"],
+        "Respond with 'Together AI API key is working correctly!' in one short sentence.",
+        {"model": "{model}", "prompt": "{prompt}", "max_tokens": 20, "temperature": 0.7},
+        "choices[0].text",
+        lean_payload={"model": "{model}", "prompt": "{prompt}", "max_tokens": 1},
+    ),
+    image=ProbeSpec(
+        "chat/completions", ["mistralai/mixtral-8x7b-instruct-v0.1"],
+        "This is a test for multimodal capability. Please respond with 'Together AI multimodal capability test'.",
+        _chat_payload(), CHAT_TEXT,
+        success="Response: {text}\nNote: Together AI doesn't offer direct image generation yet, "
+                "but API authorization successful for potential multimodal models.",
+        failure="Multimodal capability check failed",
+        unavailable="Together AI doesn't currently offer image generation capabilities.",
+        lean_payload=_chat_payload(system_message=False, max_tokens=1),
+    ),
+))
@@ -0,0 +1,284 @@
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Requests per second allowed per provider when no rate is configured; None means unlimited
+DEFAULT_RATE = 20.0
+
+# Requests per second allowed per key, for callers that re-validate the same keys often
+DEFAULT_KEY_RATE = None
+
+# Times a validation that hit a 429 is retried before its rate-limited result is reported
+DEFAULT_RATE_LIMIT_RETRIES = 5
+
+# Backoff used when a 429 comes without a usable Retry-After: doubles per
+# consecutive 429 up to the cap, and resets after a success.
+DEFAULT_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+# A Retry-After longer than this is not waited out; the rate-limited result is returned
+MAX_RETRY_AFTER = 120.0
+
+# Per-key buckets kept before the least recently used are dropped
+MAX_KEY_BUCKETS = 10000
+
+# Ceiling of a provider's adaptive concurrency when the caller gives none
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing rate requests per second with bursts of up to
+    burst requests. Callers reserve tokens and wait out any debt, so concurrent
+    waiters are served in arrival order without polling.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost=1):
+        """
+        Takes cost tokens, going into debt if there are not enough.
+        Returns the seconds the caller must wait before sending.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= cost
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, cost=1):
+        """
+        Blocks until cost tokens are available. Returns the seconds waited.
+        """
+        delay = self.reserve(cost)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self, cost=1):
+        delay = self.reserve(cost)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+
+class AdaptiveConcurrency:
+    """
+    Additive-increase/multiplicative-decrease limit on in-flight validations:
+    halves on a 429 (at most once per cooldown, so one burst of 429s counts once)
+    and grows by about one per limit's worth of successes, up to maximum.
+    """
+
+    def __init__(self, maximum, minimum=1, cooldown=1.0):
+        self.maximum = max(minimum, maximum)
+        self.minimum = minimum
+        self.cooldown = cooldown
+        self._limit = float(self.maximum)
+        self._decreased_at = 0.0
+        self._hold = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return max(self.minimum, int(self._limit))
+
+    def set_maximum(self, maximum):
+        """
+        Changes the ceiling. A lower ceiling takes effect at once; a higher one is
+        grown into like any other increase.
+        """
+        with self._lock:
+            self.maximum = max(self.minimum, maximum)
+            self._limit = min(self._limit, float(self.maximum))
+
+    def on_success(self):
+        with self._lock:
+            self._limit = min(float(self.maximum), self._limit + 1.0 / max(1.0, self._limit))
+
+    def on_rate_limit(self, cooldown=None):
+        """
+        Halves the limit unless it was already lowered within the last cooldown
+        (or the Retry-After given with the previous 429, if longer).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._decreased_at < self._hold:
+                return
+            self._limit = max(float(self.minimum), self._limit / 2)
+            self._decreased_at = now
+            self._hold = max(self.cooldown, cooldown or 0.0)
+
+
+class ProviderLimiter:
+    """
+    Rate limit state for one provider: a token bucket, optional per-key buckets,
+    adaptive concurrency and a pause that every request waits out after a 429.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=None, key_rate=DEFAULT_KEY_RATE, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.key_rate = key_rate
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.rate_limited = 0
+        self._key_buckets = OrderedDict()
+        self._paused_until = 0.0
+        self._strikes = 0
+        self._lock = threading.Lock()
+
+    def _key_bucket(self, api_key):
+        # Index by digest so raw keys are not kept around as dict keys
+        digest = hashlib.sha256(api_key.encode("utf-8")).digest()
+        with self._lock:
+            bucket = self._key_buckets.get(digest)
+            if bucket is None:
+                bucket = self._key_buckets[digest] = TokenBucket(self.key_rate)
+                while len(self._key_buckets) > MAX_KEY_BUCKETS:
+                    self._key_buckets.popitem(last=False)
+            else:
+                self._key_buckets.move_to_end(digest)
+            return bucket
+
+    def _pause_remaining(self):
+        with self._lock:
+            return self._paused_until - time.monotonic()
+
+    def acquire(self, api_key=None, cost=1):
+        """
+        Blocks until the provider is not paused and cost requests fit the provider
+        (and per-key) rate. Returns the seconds waited.
+        """
+        waited = 0.0
+        pause = self._pause_remaining()
+        while pause > 0:
+            time.sleep(pause)
+            waited += pause
+            pause = self._pause_remaining()
+        if self.bucket is not None:
+            waited += self.bucket.acquire(cost)
+        if self.key_rate and api_key:
+            waited += self._key_bucket(api_key).acquire(cost)
+        return waited
+
+    async def acquire_async(self, api_key=None, cost=1):
+        waited = 0.0
+        pause = self._pause_remaining()
+        while pause > 0:
+            await asyncio.sleep(pause)
+            waited += pause
+            pause = self._pause_remaining()
+        if self.bucket is not None:
+            waited += await self.bucket.acquire_async(cost)
+        if self.key_rate and api_key:
+            waited += await self._key_bucket(api_key).acquire_async(cost)
+        return waited
+
+    def on_success(self):
+        with self._lock:
+            self._strikes = 0
+        self.concurrency.on_success()
+
+    def on_rate_limit(self, retry_after=None):
+        """
+        Pauses the provider for retry_after seconds (or an exponential backoff when
+        the provider gave none) and lowers its concurrency. Returns the pause length.
+        """
+        with self._lock:
+            self.rate_limited += 1
+            if retry_after is None:
+                retry_after = min(MAX_BACKOFF, DEFAULT_BACKOFF * 2 ** self._strikes)
+            self._strikes += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        self.concurrency.on_rate_limit(retry_after)
+        return retry_after
+
+
+class RateLimiter:
+    """
+    Per-provider rate limiters shared by a batch run.
+    rates maps provider -> requests per second (None for unlimited); providers not
+    listed use default_rate. key_rate additionally limits requests per key.
+    """
+
+    def __init__(self, rates=None, default_rate=DEFAULT_RATE, key_rate=DEFAULT_KEY_RATE,
+                 max_retries=DEFAULT_RATE_LIMIT_RETRIES):
+        self.rates = dict(rates or {})
+        self.default_rate = default_rate
+        self.key_rate = key_rate
+        self.max_retries = max_retries
+        self._providers = {}
+        self._lock = threading.Lock()
+
+    def for_provider(self, provider, max_concurrency=None):
+        """
+        Returns the ProviderLimiter for a provider, creating it on first use.
+        max_concurrency, if given, becomes the ceiling of its adaptive concurrency,
+        also for a limiter created earlier with a different one; otherwise a new
+        limiter uses DEFAULT_MAX_CONCURRENCY and an existing one keeps its ceiling.
+        """
+        with self._lock:
+            limiter = self._providers.get(provider)
+            if limiter is None:
+                limiter = self._providers[provider] = ProviderLimiter(
+                    self.rates.get(provider, self.default_rate), key_rate=self.key_rate,
+                    max_concurrency=DEFAULT_MAX_CONCURRENCY if max_concurrency is None else max_concurrency)
+            elif max_concurrency is not None:
+                limiter.concurrency.set_maximum(max_concurrency)
+            return limiter
+
+    def call(self, provider, api_key, validate_fn, cost=1, **kwargs):
+        """
+        Calls validate_fn(api_key, **kwargs) within the provider's limits. A result
+        that was rate limited pauses the provider and is retried up to max_retries
+        times, so a 429 is never reported as an invalid key while retries remain.
+        Results stay marked rate limited (ValidationResult.rate_limited) when
+        retries run out or the provider asks to wait longer than MAX_RETRY_AFTER.
+        validate_fn must return a ValidationResult.
+        """
+        limiter = self.for_provider(provider)
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire(api_key, cost)
+            result = validate_fn(api_key, **kwargs)
+            if not result.rate_limited:
+                limiter.on_success()
+                return result
+            if not self._retry(limiter, result, attempt):
+                break
+        return result
+
+    async def call_async(self, provider, api_key, validate_fn, cost=1, **kwargs):
+        """
+        Async version of call for the validate_*_api_key_async functions.
+        """
+        limiter = self.for_provider(provider)
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire_async(api_key, cost)
+            result = await validate_fn(api_key, **kwargs)
+            if not result.rate_limited:
+                limiter.on_success()
+                return result
+            if not self._retry(limiter, result, attempt):
+                break
+        return result
+
+    def _retry(self, limiter, result, attempt):
+        # Pause the provider either way; say whether the validation should be repeated
+        retry_after = result.retry_after
+        limiter.on_rate_limit(min(retry_after, MAX_RETRY_AFTER) if retry_after is not None else None)
+        return attempt < self.max_retries and (retry_after is None or retry_after <= MAX_RETRY_AFTER)
+
+    def stats(self):
+        """
+        Returns provider -> {"concurrency": current limit, "rate_limited": 429s seen}.
+        """
+        with self._lock:
+            providers = dict(self._providers)
+        return {provider: {"concurrency": limiter.concurrency.limit, "rate_limited": limiter.rate_limited}
+                for provider, limiter in providers.items()}
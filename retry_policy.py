@@ -0,0 +1,145 @@
+import time
+import random
+import asyncio
+import threading
+
+from validation_errors import ErrorClass
+
+# Retries after the first attempt of a probe
+DEFAULT_MAX_RETRIES = 2
+
+# Backoff before retry n is a random delay up to BASE_DELAY * 2**n seconds, capped at MAX_DELAY
+# ("full jitter", so probes that failed together don't retry together)
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 8.0
+
+# A 429 is only retried here when its Retry-After is at most this many seconds
+DEFAULT_MAX_RETRY_AFTER = 5.0
+
+# Retries a batch may make: this fraction of its first attempts, plus a fixed allowance
+DEFAULT_BUDGET_RATIO = 0.1
+DEFAULT_BUDGET_MINIMUM = 10
+
+
+class RetryBudget:
+    """
+    Thread-safe cap on the retries of a whole batch: every first attempt earns
+    ratio of a retry, on top of `minimum` retries to start with. When a provider
+    is down every probe fails, and without a budget each would be retried; with
+    one, retries add at most ratio extra load instead of multiplying it.
+    """
+
+    def __init__(self, ratio=DEFAULT_BUDGET_RATIO, minimum=DEFAULT_BUDGET_MINIMUM):
+        self.ratio = ratio
+        self._tokens = float(minimum)
+        self.retries = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def record_attempt(self):
+        with self._lock:
+            self._tokens += self.ratio
+
+    def try_spend(self):
+        """
+        Takes one retry from the budget. Returns False if none is left.
+        """
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.retries += 1
+                return True
+            self.denied += 1
+            return False
+
+
+class RetryPolicy:
+    """
+    Retries a probe whose ProbeResult failed transiently (connection errors and
+    5XX, see ProbeResult.transient) and, when retry_rate_limits is True, a 429 that
+    came with a Retry-After of at most max_retry_after seconds. Everything else
+    (bad keys, missing models, quota) is final. Retries wait a jittered exponential
+    backoff (or the Retry-After, if longer), never past the validation's deadline,
+    and draw on budget (a RetryBudget shared by a batch) when one is given.
+    """
+
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 max_retry_after=DEFAULT_MAX_RETRY_AFTER, retry_rate_limits=True, budget=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.retry_rate_limits = retry_rate_limits
+        self.budget = budget
+
+    def delay(self, result, retry):
+        """
+        Returns the seconds to wait before retry number `retry` (0 for the first)
+        of a failed result, or None if it should not be retried.
+        """
+        if retry >= self.max_retries or result.valid:
+            return None
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+        if result.error_class is ErrorClass.RATE_LIMIT:
+            if not self.retry_rate_limits or result.retry_after is None or result.retry_after > self.max_retry_after:
+                return None
+            return max(result.retry_after, backoff)
+        return backoff if result.transient else None
+
+    def _next_delay(self, result, retry, deadline):
+        delay = self.delay(result, retry)
+        if delay is None or (deadline is not None and deadline.remaining() <= delay):
+            return None
+        if self.budget is not None and not self.budget.try_spend():
+            return None
+        return delay
+
+    def run(self, probe, deadline=None):
+        """
+        Calls probe() (returning a ProbeResult) until it succeeds, fails for good or
+        runs out of retries. Exceptions, such as KeyRejected, propagate unretried.
+        """
+        if self.budget is not None:
+            self.budget.record_attempt()
+        result = probe()
+        for retry in range(self.max_retries):
+            delay = self._next_delay(result, retry, deadline)
+            if delay is None:
+                break
+            time.sleep(delay)
+            result = probe()
+        return result
+
+    async def run_async(self, probe, deadline=None):
+        """
+        Async version of run for a zero-argument coroutine function.
+        """
+        if self.budget is not None:
+            self.budget.record_attempt()
+        result = await probe()
+        for retry in range(self.max_retries):
+            delay = self._next_delay(result, retry, deadline)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+            result = await probe()
+        return result
+
+
+# Used by single-key validations that are not given a policy
+_default_policy = RetryPolicy()
+
+
+def get_retry_policy():
+    """
+    Returns the process-wide default RetryPolicy.
+    """
+    return _default_policy
+
+
+def set_retry_policy(policy):
+    """
+    Replaces the process-wide default RetryPolicy, e.g. with RetryPolicy(max_retries=0) to disable retries.
+    """
+    global _default_policy
+    _default_policy = policy
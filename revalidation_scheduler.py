@@ -0,0 +1,518 @@
+import sys
+import json
+import time
+import heapq
+import signal
+import random
+import argparse
+import itertools
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_validator import (normalize_provider, detect_provider, get_validator, key_fingerprint, batch_retry_policy,
+                             set_base_urls)
+from probe_runner import TIERS, TIER_AUTH, PROFILES, PROFILE_LEAN, check_tier, check_profile
+from rate_limiter import RateLimiter
+from deadline import DEFAULT_DEADLINE
+from validation_cache import cache_variant
+from validation_errors import ErrorClass
+
+# Seconds between checks of a healthy key, for providers without their own interval
+DEFAULT_INTERVAL = 900.0
+
+# Every interval is stretched or shrunk by up to this fraction at random, so keys
+# checked together drift apart instead of coming due in the same second again
+DEFAULT_JITTER = 0.2
+
+# No key is checked more often than this, however failing or close to expiry
+DEFAULT_MIN_INTERVAL = 30.0
+
+# A failing key is re-checked after this fraction of its interval, doubling with
+# each further failure in a row until it is back at the full interval
+FAILING_FACTOR = 0.1
+
+# Keys expiring within this many seconds are checked more often the closer they get
+DEFAULT_EXPIRY_WINDOW = 86400.0
+
+# A key past its expiry is re-checked after min_interval times this, doubling with
+# each further check until it is back at the full interval
+EXPIRED_FACTOR = 2
+
+# Requests per second per provider; background checks leave the quota to real traffic
+DEFAULT_RATE = 1.0
+
+# Checks in flight for one provider, and overall
+DEFAULT_PROVIDER_CONCURRENCY = 2
+DEFAULT_MAX_WORKERS = 8
+
+# Key statuses; a key has none until its first conclusive check
+STATUS_VALID = "valid"
+STATUS_INVALID = "invalid"
+
+# Failures besides transient ones that are no verdict on the key, so its status stays as it was
+INCONCLUSIVE_ERRORS = (ErrorClass.TIMEOUT, ErrorClass.OTHER)
+
+# Longest the scheduler sleeps without looking at the queue
+_MAX_IDLE = 60.0
+
+
+class WatchedKey:
+    """
+    One key of the inventory and what the scheduler knows about it. status is
+    "valid", "invalid" or None until a check says which; checks that were rate
+    limited, timed out or failed transiently leave it unchanged. failures counts
+    the checks in a row that did not come back valid, expired_checks those made
+    since expires_at passed.
+    """
+    __slots__ = ("provider", "api_key", "fingerprint", "label", "expires_at", "status", "failures", "error_class",
+                 "last_checked", "next_due", "in_flight", "expired_checks")
+
+    def __init__(self, provider, api_key, label=None, expires_at=None, status=None):
+        self.provider = provider
+        self.api_key = api_key
+        self.fingerprint = key_fingerprint(api_key)
+        self.label = label
+        self.expires_at = expires_at
+        self.status = status
+        self.failures = 0
+        self.error_class = None
+        self.last_checked = None
+        self.next_due = None
+        self.in_flight = False
+        self.expired_checks = 0
+
+    @property
+    def key_id(self):
+        return self.provider, self.fingerprint
+
+    def urgency(self, now):
+        # Order among keys due together: failing keys first, then the soonest to expire
+        return self.failures == 0, self.expires_at - now if self.expires_at is not None else float("inf")
+
+    def to_dict(self):
+        """
+        Returns the key's state without the key itself.
+        """
+        return {"provider": self.provider, "key_fingerprint": self.fingerprint, "label": self.label,
+                "status": self.status, "failures": self.failures, "error_class": self.error_class,
+                "expires_at": self.expires_at, "last_checked": self.last_checked, "next_due": self.next_due}
+
+
+class RevalidationScheduler:
+    """
+    Keeps a registered set of keys known-good by re-checking each one on its own
+    jittered interval (intervals per provider, else interval) instead of all at
+    once. Failing keys and keys within expiry_window of expires_at come due
+    sooner, and are checked first when several are due; keys past expires_at
+    back off from min_interval to their interval. Checks are paced by
+    rate_limiter (DEFAULT_RATE per provider by default) with at most
+    provider_concurrency in flight per provider, fewer after 429s. Hooks added
+    with add_hook get a "status_change" event only when a key's status flips.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, intervals=None, jitter=DEFAULT_JITTER,
+                 min_interval=DEFAULT_MIN_INTERVAL, expiry_window=DEFAULT_EXPIRY_WINDOW, tier=TIER_AUTH,
+                 profile=PROFILE_LEAN, deadline=DEFAULT_DEADLINE, rate_limiter=None,
+                 provider_concurrency=DEFAULT_PROVIDER_CONCURRENCY, max_workers=DEFAULT_MAX_WORKERS, cache=None):
+        self.interval = float(interval)
+        self.intervals = {normalize_provider(provider): float(seconds) for provider, seconds in (intervals or {}).items()}
+        self.jitter = jitter
+        self.min_interval = min_interval
+        self.expiry_window = expiry_window
+        self.tier = check_tier(tier)
+        self.profile = check_profile(profile)
+        self.deadline = deadline
+        # A 429 pauses the provider and reschedules the key rather than holding a worker to retry it
+        self.rate_limiter = rate_limiter or RateLimiter(default_rate=DEFAULT_RATE, max_retries=0)
+        self.provider_concurrency = provider_concurrency
+        self.max_workers = max_workers
+        self.cache = cache
+        self._keys = {}
+        self._queue = []  # heap of (next_due, sequence, key_id); entries rescheduled since are skipped
+        self._sequence = itertools.count()
+        # Due keys waiting for a free slot of their provider
+        self._blocked = []
+        self._in_flight = {}
+        self._hooks = []
+        self._condition = threading.Condition()
+        self._executor = None
+        self._thread = None
+        self._stopping = False
+
+    def add_hook(self, hook):
+        """
+        Calls hook(event) for every status change: a dict with "event"
+        ("status_change"), provider, key_fingerprint, label, previous, status,
+        error_class, response and checked_at.
+        """
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        if hook in self._hooks:
+            self._hooks.remove(hook)
+
+    def _emit(self, event):
+        for hook in list(self._hooks):
+            try:
+                hook(event)
+            except Exception:
+                # A failing listener must never stop the checks
+                pass
+
+    def register(self, provider, api_key, label=None, expires_at=None, status=None):
+        """
+        Adds a key to the inventory, or updates the label and expiry of one already
+        in it. provider may be None to detect it from the key; expires_at is a Unix
+        time. A key with no status yet is checked as soon as its provider has room;
+        one registered with a known status (e.g. restored from a previous run) first
+        comes due at a random point within its interval. Returns the WatchedKey.
+        Raises ValueError for an unknown provider.
+        """
+        if provider is None:
+            provider = detect_provider(api_key)
+            if provider is None:
+                raise ValueError("Cannot detect the provider of the key; pass it explicitly")
+        provider = normalize_provider(provider)
+        with self._condition:
+            entry = self._keys.get((provider, key_fingerprint(api_key)))
+            if entry is not None:
+                entry.label = label if label is not None else entry.label
+                if expires_at is not None and expires_at != entry.expires_at:
+                    entry.expires_at, entry.expired_checks = expires_at, 0
+                return entry
+            entry = WatchedKey(provider, api_key, label, expires_at, status)
+            self._keys[entry.key_id] = entry
+            now = time.time()
+            self._schedule(entry, now if status is None else now + random.uniform(0, self._interval(entry, now)))
+            self._condition.notify_all()
+        return entry
+
+    def unregister(self, provider, api_key):
+        """
+        Stops watching a key. Returns True if it was registered.
+        """
+        with self._condition:
+            return self._keys.pop((normalize_provider(provider), key_fingerprint(api_key)), None) is not None
+
+    def _interval(self, entry, now):
+        """
+        Seconds until the key's next check: its provider's interval, cut for a
+        failing key and for one close to expiry, jittered, and no less than
+        min_interval. A key past its expiry backs off from min_interval instead.
+        """
+        interval = self.intervals.get(entry.provider, self.interval)
+        if entry.failures:
+            interval = min(interval, interval * FAILING_FACTOR * 2 ** min(entry.failures - 1, 30))
+        if entry.expires_at is not None and entry.expires_at <= now:
+            # It will not get any closer to expiry, so polling it at min_interval tells nothing new
+            interval = min(interval, self.min_interval * EXPIRED_FACTOR ** min(entry.expired_checks, 30))
+        elif entry.expires_at is not None and entry.expires_at - now < self.expiry_window:
+            interval *= (entry.expires_at - now) / self.expiry_window
+        interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(self.min_interval, interval)
+
+    def _schedule(self, entry, due):
+        entry.next_due = due
+        heapq.heappush(self._queue, (due, next(self._sequence), entry.key_id))
+
+    def _capacity(self, provider):
+        # The adaptive concurrency of the provider's limiter drops below provider_concurrency after 429s
+        return min(self.provider_concurrency,
+                   self.rate_limiter.for_provider(provider, self.provider_concurrency).concurrency.limit)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="revalidate")
+        return self._executor
+
+    def run_pending(self, now=None):
+        """
+        Starts the checks of every key that is due, most urgent first, as far as
+        each provider's concurrency allows; the rest stay due. Returns the number started.
+        """
+        with self._condition:
+            now = time.time() if now is None else now
+            due, self._blocked = self._blocked, []
+            while self._queue and self._queue[0][0] <= now:
+                next_due, _, key_id = heapq.heappop(self._queue)
+                entry = self._keys.get(key_id)
+                # Skip keys unregistered or rescheduled since this entry was queued
+                if entry is not None and entry.next_due == next_due and not entry.in_flight:
+                    due.append(entry)
+            due.sort(key=lambda entry: entry.urgency(now))
+            # Checks started together share one retry budget, like a batch
+            retry = batch_retry_policy()
+            started = 0
+            for entry in due:
+                if entry.key_id not in self._keys:
+                    continue
+                if self._in_flight.get(entry.provider, 0) >= self._capacity(entry.provider):
+                    self._blocked.append(entry)
+                    continue
+                entry.in_flight = True
+                self._in_flight[entry.provider] = self._in_flight.get(entry.provider, 0) + 1
+                self._get_executor().submit(self._check, entry, retry)
+                started += 1
+            return started
+
+    def _check(self, entry, retry):
+        result = None
+        try:
+            validate_fn = get_validator(entry.provider)
+            # The auth tier sends one request per key, the full tier at least two
+            cost = 1 if self.tier == TIER_AUTH else 2
+            result = self.rate_limiter.call(entry.provider, entry.api_key, validate_fn, cost=cost, tier=self.tier,
+                                            profile=self.profile, deadline=self.deadline, retry=retry,
+                                            structured=True)
+        except Exception:
+            # Validators report probe errors in their results; anything else is treated as transient
+            pass
+        finally:
+            self._finish(entry, result)
+
+    def _finish(self, entry, result):
+        """
+        Updates the key's state from a check, reschedules it and emits a status change if it flipped.
+        """
+        now = time.time()
+        event = None
+        with self._condition:
+            entry.in_flight = False
+            self._in_flight[entry.provider] -= 1
+            entry.last_checked = now
+            if entry.expires_at is not None and entry.expires_at <= now:
+                entry.expired_checks += 1
+            status = None
+            if result is not None and result.valid:
+                status, entry.failures, entry.error_class = STATUS_VALID, 0, None
+            elif result is not None and result.rate_limited:
+                # Says nothing about the key; check it again once the provider's pause is over
+                entry.error_class = result.error_class.value
+            else:
+                entry.failures += 1
+                error_class = result.error_class if result is not None else ErrorClass.OTHER
+                entry.error_class = error_class.value if error_class is not None else None
+                if result is not None and not result.transient and error_class not in INCONCLUSIVE_ERRORS:
+                    status = STATUS_INVALID
+            if status is not None and status != entry.status:
+                if entry.status is not None:
+                    event = {"event": "status_change", "provider": entry.provider,
+                             "key_fingerprint": entry.fingerprint, "label": entry.label, "previous": entry.status,
+                             "status": status, "error_class": entry.error_class, "response": result.text.response,
+                             "checked_at": now}
+                entry.status = status
+            if entry.key_id in self._keys:
+                if result is not None and result.rate_limited:
+                    due = now + max(self.min_interval, result.retry_after or 0)
+                else:
+                    due = now + self._interval(entry, now)
+                self._schedule(entry, due)
+            self._condition.notify_all()
+        if self.cache is not None and result is not None:
+            # Keep a shared cache (e.g. a validation_server's) as fresh as the inventory
+            self.cache.set(entry.provider, entry.api_key, result,
+                           variant=cache_variant(self.tier, self.profile))
+        if event is not None:
+            self._emit(event)
+
+    def _idle_seconds(self):
+        # Until the next key comes due; blocked keys wait for a finishing check, which wakes the loop
+        if not self._queue:
+            return _MAX_IDLE
+        return min(_MAX_IDLE, max(0.0, self._queue[0][0] - time.time()))
+
+    def _run(self):
+        with self._condition:
+            while not self._stopping:
+                self.run_pending()
+                self._condition.wait(self._idle_seconds())
+
+    def start(self):
+        """
+        Starts checking keys on a background thread. Returns the scheduler.
+        """
+        with self._condition:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="revalidation-scheduler", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        """
+        Stops the scheduler; with wait, also waits for the checks in flight to finish.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def snapshot(self):
+        """
+        Returns the state of every watched key (WatchedKey.to_dict), soonest due first.
+        """
+        with self._condition:
+            entries = [entry.to_dict() for entry in self._keys.values()]
+        return sorted(entries, key=lambda entry: entry["next_due"])
+
+    def stats(self):
+        """
+        Returns {"keys": n, "in_flight": n, "statuses": {status: n}} with "unknown" for keys not yet decided.
+        """
+        with self._condition:
+            statuses = {}
+            for entry in self._keys.values():
+                status = entry.status or "unknown"
+                statuses[status] = statuses.get(status, 0) + 1
+            return {"keys": len(self._keys), "in_flight": sum(self._in_flight.values()), "statuses": statuses}
+
+
+def parse_expiry(value):
+    """
+    Parses an expiry given as Unix seconds or an ISO 8601 date or time (UTC unless
+    it says otherwise). Returns Unix seconds, or None for an empty value.
+    """
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def load_inventory(path):
+    """
+    Reads the keys to watch, one "provider,key[,expires]" or bare key per line
+    (blank lines and '#' comments are ignored). Returns a list of
+    (line_number, provider or None, key, expires or None), with expires as
+    written; see parse_expiry.
+    """
+    inventory = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = [field.strip() for field in line.split(",")]
+            if len(fields) == 1:
+                inventory.append((line_number, None, fields[0], None))
+            else:
+                inventory.append((line_number, fields[0], fields[1], fields[2] if len(fields) > 2 else None))
+    return inventory
+
+
+def _provider_values(values, convert):
+    result = {}
+    for value in values or []:
+        provider, _, setting = value.partition("=")
+        if not setting:
+            raise argparse.ArgumentTypeError(f"Expected provider=value, got {value!r}")
+        result[normalize_provider(provider)] = convert(setting)
+    return result
+
+
+def _rate(value):
+    # 0 means no rate limit
+    return float(value) or None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Keep re-checking a set of API keys in the background and report each key whose status flips.")
+    parser.add_argument("keys_file", help="File with one 'provider,key[,expires]' line per key")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Seconds between checks of a key")
+    parser.add_argument("--provider-interval", action="append", metavar="PROVIDER=SECONDS",
+                        help="Seconds between checks of one provider's keys (repeatable)")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER,
+                        help="Fraction each interval is randomly stretched or shrunk by")
+    parser.add_argument("--min-interval", type=float, default=DEFAULT_MIN_INTERVAL,
+                        help="Fewest seconds between checks of a failing or expiring key")
+    parser.add_argument("--expiry-window", type=float, default=DEFAULT_EXPIRY_WINDOW,
+                        help="Keys expiring within this many seconds are checked more often")
+    parser.add_argument("--tier", choices=TIERS, default=TIER_AUTH,
+                        help="'auth' checks only that each key authenticates; 'full' also probes generation")
+    parser.add_argument("--probe-profile", choices=PROFILES, default=PROFILE_LEAN,
+                        help="Generation probes of the full tier")
+    parser.add_argument("--rate", action="append", metavar="PROVIDER=R",
+                        help="Requests per second for one provider, 0 for unlimited (repeatable)")
+    parser.add_argument("--default-rate", type=_rate, default=DEFAULT_RATE,
+                        help="Requests per second for providers without --rate, 0 for unlimited")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_PROVIDER_CONCURRENCY,
+                        help="Checks in flight per provider")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE,
+                        help="Most seconds one key's check may take")
+    parser.add_argument("--state", metavar="PATH",
+                        help="Restore key statuses from this JSON file at start and save them on exit, so a "
+                             "restart neither re-checks every key at once nor re-reports known statuses")
+    parser.add_argument("--events-file", metavar="PATH", help="Also append status changes here as JSON lines")
+    parser.add_argument("--base-url", action="append", metavar="PROVIDER=URL",
+                        help="Send one provider's requests to another API base URL (repeatable)")
+    args = parser.parse_args()
+
+    set_base_urls(_provider_values(args.base_url, str))
+    scheduler = RevalidationScheduler(
+        interval=args.interval, intervals=_provider_values(args.provider_interval, float), jitter=args.jitter,
+        min_interval=args.min_interval, expiry_window=args.expiry_window, tier=args.tier,
+        profile=args.probe_profile, deadline=args.deadline, provider_concurrency=args.concurrency,
+        rate_limiter=RateLimiter(_provider_values(args.rate, _rate), default_rate=args.default_rate, max_retries=0))
+
+    statuses = {}
+    if args.state:
+        try:
+            with open(args.state, "r", encoding="utf-8") as f:
+                statuses = json.load(f)
+        except FileNotFoundError:
+            pass
+    for line_number, provider, api_key, expires in load_inventory(args.keys_file):
+        try:
+            try:
+                expires_at = parse_expiry(expires) if expires else None
+            except ValueError:
+                raise ValueError(f"cannot parse the expiry {expires!r}")
+            provider = normalize_provider(provider) if provider else detect_provider(api_key)
+            # Keys with a saved status come due spread over their interval instead of all at once
+            status = statuses.get(f"{provider}:{key_fingerprint(api_key)}") if provider else None
+            scheduler.register(provider, api_key, expires_at=expires_at, status=status)
+        except ValueError as e:
+            # One bad line must not keep the rest of the inventory from being watched
+            print(f"Line {line_number}: {e}; skipped", file=sys.stderr)
+
+    events_file = open(args.events_file, "a", encoding="utf-8") if args.events_file else None
+
+    def report(event):
+        line = json.dumps(event)
+        print(line, flush=True)
+        if events_file is not None:
+            events_file.write(line + "\n")
+            events_file.flush()
+
+    scheduler.add_hook(report)
+    print(f"Watching {scheduler.stats()['keys']} keys, checked every {args.interval:g}s "
+          f"(±{args.jitter:.0%}); status changes follow as JSON lines", file=sys.stderr, flush=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    scheduler.start()
+    try:
+        while True:
+            time.sleep(_MAX_IDLE)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop(wait=False)
+        if args.state:
+            with open(args.state, "w", encoding="utf-8") as f:
+                json.dump({f"{entry['provider']}:{entry['key_fingerprint']}": entry["status"]
+                           for entry in scheduler.snapshot() if entry["status"] is not None}, f)
+        if events_file is not None:
+            events_file.close()
+        print(json.dumps(scheduler.stats()), file=sys.stderr)
@@ -0,0 +1,378 @@
+import os
+import sys
+import json
+import time
+import errno
+import socket
+import hashlib
+import argparse
+import threading
+import multiprocessing
+
+from batch_validator import (add_batch_arguments, setup_from_args, batch_options_from_args, iter_validate_keys,
+                             load_key_pairs, normalize_provider, key_fingerprint, summarize)
+from checkpoint import should_checkpoint
+
+# Work units per run. Keys are assigned to a unit by a hash of (provider, key), so
+# every unit mixes all providers and the batch engine can overlap them instead
+# of waiting on one provider's rate limit at a time.
+DEFAULT_BUCKETS = 64
+
+# A claim whose heartbeat is older than this is considered abandoned and can be taken over
+DEFAULT_STALE_AFTER = 120.0
+HEARTBEAT_INTERVAL = 15.0
+
+# How long an idle worker waits before checking again for units to take over
+IDLE_POLL_INTERVAL = 2.0
+
+MANIFEST = "run.json"
+
+
+def bucket_of(provider, api_key, buckets):
+    """
+    Returns the pair's hash bucket, stable across processes and machines.
+    """
+    digest = hashlib.sha256(f"{provider}\0{api_key}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % buckets
+
+
+def partition(pairs, buckets):
+    """
+    Groups (provider, key) pairs into work units.
+    Returns {unit_name: [(index, provider, key), ...]} where index is the pair's position in the input.
+    """
+    units = {}
+    for index, (provider, api_key) in enumerate(pairs):
+        provider = normalize_provider(provider)
+        unit = f"unit-{bucket_of(provider, api_key, buckets):04d}"
+        units.setdefault(unit, []).append((index, provider, api_key))
+    return units
+
+
+class WorkQueue:
+    """
+    File-based queue of work units in a run directory, safe to share between
+    processes and machines over a common filesystem:
+
+        run.json            manifest (input path, buckets, tier, deadline)
+        claims/<unit>       held by the worker processing the unit (mtime is its heartbeat)
+        results/<unit>.jsonl  final results appended as they finish
+        done/<unit>         written once every key of the unit has a final result
+
+    Claims are taken with O_CREAT|O_EXCL and abandoned claims are taken over with
+    an atomic rename, so each unit has at most one live owner.
+    """
+
+    def __init__(self, run_dir, stale_after=DEFAULT_STALE_AFTER):
+        self.run_dir = run_dir
+        self.stale_after = stale_after
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        for name in ("claims", "results", "done"):
+            os.makedirs(os.path.join(run_dir, name), exist_ok=True)
+
+    def _path(self, kind, unit):
+        return os.path.join(self.run_dir, kind, unit + (".jsonl" if kind == "results" else ""))
+
+    def is_done(self, unit):
+        return os.path.exists(self._path("done", unit))
+
+    def claim(self, unit):
+        """
+        Tries to take the unit. Returns True if this worker now owns it.
+        """
+        path = self._path("claims", unit)
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            if not self._abandoned(path):
+                return False
+            try:
+                # Only one worker's rename can succeed
+                os.rename(path, f"{path}.stale.{self.worker_id.replace(':', '-')}")
+            except FileNotFoundError:
+                return False
+            return self.claim(unit)
+        with os.fdopen(fd, "w") as f:
+            f.write(self.worker_id)
+        return True
+
+    def _abandoned(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                owner = f.read().strip()
+            age = time.time() - os.path.getmtime(path)
+        except FileNotFoundError:
+            return True
+        host, _, pid = owner.rpartition(":")
+        if host == socket.gethostname() and pid.isdigit() and not _pid_alive(int(pid)):
+            # A crashed worker on this machine; no need to wait for the heartbeat to go stale
+            return True
+        return age > self.stale_after
+
+    def heartbeat(self, unit):
+        try:
+            os.utime(self._path("claims", unit))
+        except FileNotFoundError:
+            pass
+
+    def release(self, unit):
+        try:
+            os.remove(self._path("claims", unit))
+        except FileNotFoundError:
+            pass
+
+    def mark_done(self, unit):
+        with open(self._path("done", unit), "w", encoding="utf-8") as f:
+            f.write(self.worker_id)
+        self.release(unit)
+
+    def completed(self, unit):
+        """
+        Returns the (input provider, key_fingerprint) pairs already in the unit's results.
+        """
+        return {_input_identity(record) for record in self.read_results(unit)}
+
+    def read_results(self, unit):
+        path = self._path("results", unit)
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by a crash; the key is simply validated again
+                    continue
+        return records
+
+    def open_results(self, unit):
+        return open(self._path("results", unit), "a", encoding="utf-8")
+
+    def units_with_results(self):
+        return sorted(name[:-len(".jsonl")] for name in os.listdir(os.path.join(self.run_dir, "results"))
+                      if name.endswith(".jsonl"))
+
+
+def _input_identity(record):
+    # Keys routed to another provider are recorded under it; match them by the provider they were listed with
+    return record.get("routed_from") or record["provider"], record["key_fingerprint"]
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def init_run(run_dir, input_path, buckets=DEFAULT_BUCKETS, tier=None, deadline=None):
+    """
+    Creates the run directory and its manifest, or returns the existing manifest
+    when resuming. Raises ValueError if an existing run was started with other settings.
+    """
+    os.makedirs(run_dir, exist_ok=True)
+    path = os.path.join(run_dir, MANIFEST)
+    manifest = {"input": os.path.abspath(input_path) if input_path != "-" else "-", "buckets": buckets,
+                "tier": tier, "deadline": deadline}
+    if os.path.exists(path):
+        existing = load_manifest(run_dir)
+        if (existing["input"], existing["buckets"]) != (manifest["input"], manifest["buckets"]):
+            raise ValueError(f"{run_dir} belongs to a run over {existing['input']} with {existing['buckets']} buckets")
+        return existing
+    if manifest["input"] == "-":
+        raise ValueError("A sharded run needs an input file that every worker can read, not stdin")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return manifest
+
+
+def load_manifest(run_dir):
+    with open(os.path.join(run_dir, MANIFEST), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _heartbeat(queue, unit, stop):
+    while not stop.wait(HEARTBEAT_INTERVAL):
+        queue.heartbeat(unit)
+
+
+def process_unit(queue, unit, items, cache=None, **batch_options):
+    """
+    Validates the keys of one claimed unit that have no result yet, appending each
+    final result (see checkpoint.should_checkpoint) to the unit's results file as
+    it finishes. The unit is marked done once every key has a final result;
+    otherwise it is released so a resumed run checks the remaining keys again.
+    Returns the number of keys validated.
+    """
+    completed = queue.completed(unit)
+    todo = [(index, provider, api_key) for index, provider, api_key in items
+            if (provider, key_fingerprint(api_key)) not in completed]
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(queue, unit, stop), daemon=True)
+    beat.start()
+    unfinished = 0
+    try:
+        with queue.open_results(unit) as f:
+            for result in iter_validate_keys([(provider, api_key) for _, provider, api_key in todo], cache=cache,
+                                             **batch_options):
+                if not should_checkpoint(result):
+                    unfinished += 1
+                    continue
+                result["index"] = todo[result["index"]][0]
+                f.write(json.dumps(result, separators=(",", ":")) + "\n")
+                f.flush()
+    finally:
+        stop.set()
+    if unfinished:
+        queue.release(unit)
+    else:
+        queue.mark_done(unit)
+    return len(todo)
+
+
+def run_worker(run_dir, args):
+    """
+    Worker loop: claims units until none are left, validating each with the batch
+    engine. Units held by workers that stop heartbeating are taken over.
+    """
+    manifest = load_manifest(run_dir)
+    queue = WorkQueue(run_dir, stale_after=args.stale_after)
+    units = partition(load_key_pairs(args.input or manifest["input"]), manifest["buckets"])
+    cache = setup_from_args(args)
+    batch_options = batch_options_from_args(args)
+    validated = 0
+    # Units this worker left with rate-limited or transient keys wait for the next run
+    released = set()
+    while True:
+        pending = [unit for unit in sorted(units) if not queue.is_done(unit) and unit not in released]
+        if not pending:
+            return validated
+        claimed = next((unit for unit in pending if queue.claim(unit)), None)
+        if claimed is None:
+            # Everything left is held by live workers; wait in case one of them dies
+            time.sleep(IDLE_POLL_INTERVAL)
+            continue
+        try:
+            validated += process_unit(queue, claimed, units[claimed], cache=cache, **batch_options)
+        except BaseException:
+            queue.release(claimed)
+            raise
+        if not queue.is_done(claimed):
+            released.add(claimed)
+
+
+def _worker_process(run_dir, args):
+    validated = run_worker(run_dir, args)
+    print(f"[{os.getpid()}] validated {validated} keys", file=sys.stderr)
+
+
+def run_processes(run_dir, args, processes):
+    """
+    Runs `processes` worker processes on this machine and waits for them.
+    Returns True if all of them exited cleanly.
+    """
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_worker_process, args=(run_dir, args)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return all(worker.exitcode == 0 for worker in workers)
+
+
+def merge_results(run_dir):
+    """
+    Returns every result of the run, one per (provider, key fingerprint), in input order.
+    """
+    queue = WorkQueue(run_dir)
+    merged = {}
+    for unit in queue.units_with_results():
+        for record in queue.read_results(unit):
+            merged[_input_identity(record)] = record
+    return sorted(merged.values(), key=lambda r: r["index"])
+
+
+def run_status(run_dir):
+    """
+    Returns counts of done, claimed and total units for a run.
+    """
+    manifest = load_manifest(run_dir)
+    units = partition(load_key_pairs(manifest["input"]), manifest["buckets"])
+    queue = WorkQueue(run_dir)
+    done = sum(queue.is_done(unit) for unit in units)
+    claimed = sum(os.path.exists(queue._path("claims", unit)) for unit in units)
+    return {"units": len(units), "done": done, "claimed": claimed,
+            "keys": sum(len(items) for items in units.values())}
+
+
+def _scale_rates(args, processes):
+    # Every process has its own rate limiter; split the per-provider rates between them
+    if processes > 1:
+        if args.default_rate:
+            args.default_rate /= processes
+        args.rate = [f"{p}={float(r) / processes}" for p, _, r in (v.partition("=") for v in args.rate or [])]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate very large key inventories across processes and machines.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Start or resume a sharded run and work on it from this machine")
+    run.add_argument("input", help="File with one 'provider,key' pair (or bare key) per line")
+    run.add_argument("--run-dir", required=True, help="Directory holding the work queue and results")
+    run.add_argument("--buckets", type=int, default=DEFAULT_BUCKETS, help="Work units the keys are hashed into")
+
+    join = commands.add_parser("join", help="Work on an existing run, e.g. from another machine")
+    join.add_argument("run_dir", help="Run directory on a shared filesystem")
+    join.add_argument("--input", help="Path of the input file on this machine, if it differs from the manifest")
+
+    for command in (run, join):
+        command.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Worker processes to start")
+        command.add_argument("--stale-after", type=float, default=DEFAULT_STALE_AFTER,
+                             help="Seconds without a heartbeat before another worker takes a unit over")
+        add_batch_arguments(command)
+
+    merge = commands.add_parser("merge", help="Combine the results of a run into one file")
+    merge.add_argument("run_dir")
+    merge.add_argument("--output", help="Write merged results here as JSON lines (default: stdout)")
+
+    status = commands.add_parser("status", help="Show how far a run has got")
+    status.add_argument("run_dir")
+
+    args = parser.parse_args()
+
+    if args.command in ("run", "join"):
+        if args.checkpoint:
+            parser.error("sharded runs resume from their run directory; --checkpoint is not supported")
+        if args.metrics_file:
+            parser.error("--metrics-file is not supported for sharded runs, whose workers are separate processes")
+        if args.command == "run":
+            init_run(args.run_dir, args.input, args.buckets, args.tier, args.deadline)
+            args.input = None
+        # Tier and deadline are fixed for the whole run
+        manifest = load_manifest(args.run_dir)
+        args.tier = manifest["tier"] or args.tier
+        args.deadline = manifest["deadline"] or args.deadline
+        _scale_rates(args, args.processes)
+        start = time.perf_counter()
+        ok = run_processes(args.run_dir, args, args.processes)
+        print(f"Workers finished in {time.perf_counter() - start:.1f}s: {json.dumps(run_status(args.run_dir))}",
+              file=sys.stderr)
+        sys.exit(0 if ok else 1)
+
+    if args.command == "merge":
+        results = merge_results(args.run_dir)
+        out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            for result in results:
+                out.write(json.dumps(result, separators=(",", ":")) + "\n")
+        finally:
+            if args.output:
+                out.close()
+        print(json.dumps(summarize(results)), file=sys.stderr)
+
+    if args.command == "status":
+        print(json.dumps(run_status(args.run_dir)))
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one: the first caller runs
+    the function, and callers arriving while it is in flight wait for it and
+    receive the same result (or exception). Nothing is kept afterwards; the next
+    call with the key once it finished runs the function again.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, fn, timeout=None):
+        """
+        Returns fn(), or the result of the call with the same key already in flight.
+        A caller that waits on another's call gives up after timeout seconds with TimeoutError.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError("Timed out waiting for an identical call in flight")
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def do_async(self, key, fn, timeout=None):
+        """
+        Async version of do for a zero-argument coroutine function. Calls are shared
+        within one event loop. The shared call runs as its own task, so a caller that
+        is cancelled or times out does not cancel it for the others.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._tasks.get((loop, key))
+            if task is None:
+                task = self._tasks[(loop, key)] = loop.create_task(fn())
+                task.add_done_callback(lambda done: self._forget(loop, key, done))
+            else:
+                self.shared += 1
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+    def _forget(self, loop, key, task):
+        with self._lock:
+            self._tasks.pop((loop, key), None)
+        # Mark the exception retrieved even if every waiter gave up on it
+        if not task.cancelled():
+            task.exception()
+
+
+_default_single_flight = SingleFlight()
+
+
+def get_single_flight():
+    """
+    Returns the process-wide SingleFlight shared by the validators, or None if disabled.
+    """
+    return _default_single_flight
+
+
+def set_single_flight(single_flight):
+    """
+    Replaces the process-wide SingleFlight; None turns de-duplication off.
+    """
+    global _default_single_flight
+    _default_single_flight = single_flight
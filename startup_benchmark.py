@@ -0,0 +1,89 @@
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Seconds allowed to import each entry point in a fresh interpreter (median of the runs)
+STARTUP_BUDGETS = {
+    "validate_keys": 0.3,
+    "batch_validator": 0.3,
+    "validation_server": 0.3,
+    "revalidation_scheduler": 0.3,
+    "mistral_validator": 0.25,
+    "claude_validator": 0.25,
+    "xai_validator": 0.25,
+    "together_validator": 0.25,
+    "openai_validator": 0.25,
+    "gemini_validator": 0.25,
+}
+
+# Modules that take up to a second each to import and must only load when a
+# validation actually needs them
+HEAVY_MODULES = ("openai", "google.generativeai", "google.api_core", "anthropic", "aiohttp", "requests")
+
+DEFAULT_RUNS = 5
+
+# Run in a fresh interpreter: import the module, report the time taken and which heavy modules came with it
+_PROBE = """
+import sys, json, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in json.loads(sys.argv[2]) if m in sys.modules]}))
+"""
+
+
+def measure_import(module, runs=DEFAULT_RUNS):
+    """
+    Imports module in `runs` fresh interpreters.
+    Returns (median seconds, heavy modules the import loaded).
+    """
+    timings = []
+    loaded = set()
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", _PROBE, module, json.dumps(HEAVY_MODULES)],
+                                capture_output=True, text=True, check=True).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        timings.append(report["seconds"])
+        loaded.update(report["loaded"])
+    return statistics.median(timings), sorted(loaded)
+
+
+def run_benchmark(budgets=None, runs=DEFAULT_RUNS, scale=1.0):
+    """
+    Measures every module in budgets (default STARTUP_BUDGETS), allowing budget * scale seconds each.
+    Returns a list of {"module", "seconds", "budget", "loaded", "ok"} dicts.
+    """
+    report = []
+    for module, budget in (budgets or STARTUP_BUDGETS).items():
+        seconds, loaded = measure_import(module, runs)
+        budget *= scale
+        report.append({"module": module, "seconds": round(seconds, 4), "budget": budget, "loaded": loaded,
+                       "ok": seconds <= budget and not loaded})
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that the validator modules import quickly and without the heavy provider SDKs.")
+    parser.add_argument("modules", nargs="*", help="Modules to measure (default: every entry point)")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Fresh interpreters per module")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiply every budget, e.g. 2 on slow CI machines")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    budgets = {module: STARTUP_BUDGETS.get(module, max(STARTUP_BUDGETS.values())) for module in args.modules} or None
+    report = run_benchmark(budgets, runs=args.runs, scale=args.scale)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for entry in report:
+            status = "ok" if entry["ok"] else "FAIL"
+            loaded = f"  loaded {', '.join(entry['loaded'])}" if entry["loaded"] else ""
+            print(f"{status:4}  {entry['module']:20} {entry['seconds'] * 1000:7.1f} ms "
+                  f"(budget {entry['budget'] * 1000:.0f} ms){loaded}")
+
+    sys.exit(0 if all(entry["ok"] for entry in report) else 1)
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_provider_server import start_mock_server, API_VERSIONS  # noqa: E402
+from batch_validator import set_base_urls  # noqa: E402
+from model_catalog import get_catalog  # noqa: E402
+
+
+@pytest.fixture
+def mock_server():
+    """
+    A MockProviderServer every provider points at for the duration of the test.
+    """
+    server = start_mock_server()
+    set_base_urls(server.base_urls())
+    get_catalog().clear()
+    yield server
+    server.shutdown()
+    server.server_close()
+    set_base_urls({provider: None for provider in API_VERSIONS})
+    get_catalog().clear()
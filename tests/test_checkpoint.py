@@ -0,0 +1,69 @@
+import os
+
+from checkpoint import CheckpointJournal, SQLiteCheckpoint, open_checkpoint, INDEX_SUFFIX
+
+
+def _result(number, **extra):
+    return {"provider": "claude", "key_fingerprint": f"{number:016x}", "valid": True, **extra}
+
+
+def _journal_with_three_results(path):
+    journal = CheckpointJournal(path)
+    for number in range(3):
+        journal.record(_result(number))
+    journal.close()
+
+
+def test_truncated_writes_are_trimmed_on_reopen(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    _journal_with_three_results(path)
+    # A crash mid-flush: half a journal line and half an index entry
+    with open(path, "ab") as f:
+        f.write(b'{"provider":"claude","key_fing')
+    with open(path + INDEX_SUFFIX, "r+b") as f:
+        f.truncate(os.path.getsize(path + INDEX_SUFFIX) - 3)
+
+    journal = CheckpointJournal(path)
+
+    # The result whose index entry was torn is validated again; the torn line is gone
+    assert [journal.is_done("claude", f"{number:016x}") for number in range(3)] == [True, True, False]
+    assert [record["key_fingerprint"] for record in journal.records()] == [f"{n:016x}" for n in range(3)]
+    journal.record(_result(3))
+    journal.close()
+    with open(path, "rb") as f:
+        assert f.read().count(b"\n") == 4
+    assert os.path.getsize(path + INDEX_SUFFIX) == 3 * 8
+
+
+def test_lost_index_is_rebuilt_from_the_journal(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    _journal_with_three_results(path)
+    os.remove(path + INDEX_SUFFIX)
+
+    journal = CheckpointJournal(path)
+
+    assert len(journal) == 3 and journal.is_done("claude", f"{2:016x}")
+    assert os.path.getsize(path + INDEX_SUFFIX) == 3 * 8
+    journal.close()
+
+
+def test_rate_limited_and_transient_results_are_not_journaled(tmp_path):
+    for path in (str(tmp_path / "run.jsonl"), str(tmp_path / "run.db")):
+        journal = open_checkpoint(path)
+        journal.record(_result(1, rate_limited=True))
+        journal.record(_result(2, transient=True))
+        journal.record(_result(3))
+        assert [record["key_fingerprint"] for record in journal.records()] == [f"{3:016x}"]
+        journal.close()
+
+
+def test_sqlite_checkpoint_survives_reopening(tmp_path):
+    path = str(tmp_path / "run.db")
+    journal = open_checkpoint(path)
+    assert isinstance(journal, SQLiteCheckpoint)
+    journal.record(_result(1))
+    journal.close()
+
+    reopened = open_checkpoint(path)
+    assert reopened.is_done("claude", f"{1:016x}") and len(reopened) == 1
+    reopened.close()
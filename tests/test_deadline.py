@@ -0,0 +1,109 @@
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded
+from http_session import create_session, read_json
+from async_http import create_async_session
+from validation_errors import ErrorClass
+from mock_provider_server import mock_key
+import claude_validator
+
+# A JSON body the trickling server sends one byte at a time
+BODY = b'{"content": [{"type": "text", "text": "' + b"x" * 200 + b'"}]}'
+
+
+class TrickleHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._trickle()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._trickle()
+
+    def _trickle(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        try:
+            for i in range(len(BODY)):
+                self.wfile.write(BODY[i:i + 1])
+                self.wfile.flush()
+                time.sleep(self.server.interval)
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def trickle_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TrickleHandler)
+    server.daemon_threads = True
+    # Every byte arrives well inside the read timeout; only the deadline can stop the body
+    server.interval = 0.02
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_read_json_stops_a_trickling_body_at_the_deadline(trickle_server):
+    deadline = Deadline(0.5)
+    response = create_session().get(trickle_server, timeout=deadline.timeout(), stream=True)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        read_json(response, deadline=deadline)
+    assert time.monotonic() - start < 1.0
+
+
+def test_validation_keeps_to_its_deadline_against_a_trickling_provider(trickle_server):
+    claude_validator.set_base_url(f"{trickle_server}/claude/v1")
+    try:
+        start = time.monotonic()
+        result = claude_validator.validate_claude_api_key(mock_key("claude", "ok", 1), deadline=0.5, structured=True,
+                                                          session=create_session())
+        elapsed = time.monotonic() - start
+    finally:
+        claude_validator.set_base_url()
+    # Without the deadline the text and image bodies would take about 4s each
+    assert elapsed < 1.5
+    assert result.text.error_class is ErrorClass.TIMEOUT
+    assert result.image.error_class is ErrorClass.TIMEOUT
+
+
+def test_auth_tier_keeps_to_its_deadline_against_a_trickling_listing(trickle_server):
+    claude_validator.set_base_url(f"{trickle_server}/claude/v1")
+    try:
+        start = time.monotonic()
+        result = claude_validator.validate_claude_api_key(mock_key("claude", "ok", 1), tier="auth", deadline=0.5,
+                                                          structured=True, session=create_session())
+        elapsed = time.monotonic() - start
+    finally:
+        claude_validator.set_base_url()
+    assert elapsed < 1.5
+    assert result.text.error_class is ErrorClass.TIMEOUT
+
+
+def test_async_auth_tier_keeps_to_its_deadline_against_a_trickling_listing(trickle_server):
+    async def validate():
+        async with create_async_session() as session:
+            return await claude_validator.validate_claude_api_key_async(
+                mock_key("claude", "ok", 1), tier="auth", deadline=0.5, structured=True, session=session)
+
+    claude_validator.set_base_url(f"{trickle_server}/claude/v1")
+    try:
+        start = time.monotonic()
+        result = asyncio.run(validate())
+        elapsed = time.monotonic() - start
+    finally:
+        claude_validator.set_base_url()
+    assert elapsed < 1.5
+    assert result.text.error_class is ErrorClass.TIMEOUT
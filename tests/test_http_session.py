@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+
+from async_http import create_async_session, post_json, AsyncHTTPError
+from http_session import create_session, describe_http_error, DEFAULT_MAX_ERROR_BYTES
+
+# An error page far longer than anything worth reading
+ERROR_BODY = b'{"error": {"message": "Server is sad."}, "padding": "' + b"x" * (1024 * 1024) + b'"}'
+
+
+class ErrorPageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._send()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._send()
+
+    def _send(self):
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(ERROR_BODY)))
+        self.end_headers()
+        try:
+            self.wfile.write(ERROR_BODY)
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def error_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ErrorPageHandler)
+    server.daemon_threads = True
+    server.status = 500
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/v1/models"
+
+
+def test_error_bodies_are_read_only_up_to_the_cap(error_server):
+    response = create_session().post(_url(error_server), json={}, timeout=5, stream=True)
+    with pytest.raises(requests.HTTPError) as excinfo:
+        response.raise_for_status()
+
+    assert len(response.content) == DEFAULT_MAX_ERROR_BYTES
+    assert str(excinfo.value) == describe_http_error(excinfo.value)
+
+
+def test_async_error_bodies_are_read_only_up_to_the_cap(error_server):
+    async def post():
+        async with create_async_session() as session:
+            await post_json(session, _url(error_server), {}, {}, max_bytes=1024)
+
+    with pytest.raises(AsyncHTTPError) as excinfo:
+        asyncio.run(post())
+    assert len(excinfo.value.body) == DEFAULT_MAX_ERROR_BYTES
+
@@ -0,0 +1,52 @@
+import pytest
+
+from key_format import KeyFormats
+from mock_provider_server import mock_key
+
+CLAUDE_KEY = "sk-ant-api03-" + "a" * 60
+OPENAI_KEY = "sk-proj-" + "b" * 60
+
+
+@pytest.mark.parametrize("provider,api_key,code", [
+    ("claude", "", "empty"),
+    ("claude", CLAUDE_KEY[:20] + " " + CLAUDE_KEY[20:], "whitespace"),
+    ("gemini", "AIzb" + "c" * 35, "prefix"),
+    ("gemini", "AIza" + "c" * 30, "length"),
+    ("gemini", "AIza" + "c" * 34 + "!", "charset"),
+    ("mistral", "d" * 31 + "!", "charset"),
+    ("claude", "sk-proj-" + "e" * 60, "prefix"),
+])
+def test_problem_codes(provider, api_key, code):
+    assert KeyFormats().problem(provider, api_key).code == code
+
+
+@pytest.mark.parametrize("provider", ["openai", "claude", "gemini", "mistral", "xai", "together"])
+def test_well_formed_keys_pass(provider):
+    assert KeyFormats().problem(provider, mock_key(provider, "ok", 1)) is None
+
+
+def test_openai_format_excludes_claude_keys():
+    problem = KeyFormats().problem("openai", CLAUDE_KEY)
+    assert problem.code == "prefix" and "sk-ant-" in problem.message
+
+
+def test_detect_prefers_the_longer_prefix():
+    key_formats = KeyFormats()
+    assert key_formats.detect(CLAUDE_KEY) == "claude"
+    assert key_formats.detect(OPENAI_KEY) == "openai"
+    assert key_formats.detect("not-a-key") is None
+
+
+def test_route_moves_keys_with_a_distinctive_prefix_only():
+    key_formats = KeyFormats()
+    assert key_formats.route("openai", CLAUDE_KEY) == ("claude", None)
+    assert key_formats.route("claude", CLAUDE_KEY) == ("claude", None)
+    # An unprefixed Mistral-shaped key says nothing about its provider, so it stays put
+    provider, problem = key_formats.route("gemini", "f" * 32)
+    assert provider == "gemini" and problem.code == "prefix"
+    # Empty and whitespace problems are never routed
+    assert key_formats.route("openai", "")[1].code == "empty"
+
+
+def test_providers_without_a_format_pass():
+    assert KeyFormats(formats={}).problem("openai", "anything-goes") is None
@@ -0,0 +1,34 @@
+from gemini_validator import validate_gemini_api_key
+from mock_provider_server import mock_key
+from model_catalog import ModelCatalog
+
+
+def _hide_model(server, api_key, model):
+    # Wraps the mock's respond so one key gets a 404 for model, as if its project lacked access
+    respond = server.respond
+
+    def hiding(provider, method, route, key, body):
+        if key == api_key and f"models/{model}:" in route:
+            return 404, {"error": {"code": 404, "message": f"models/{model} is not found.", "status": "NOT_FOUND"}}, {}
+        return respond(provider, method, route, key, body)
+
+    server.respond = hiding
+
+
+def test_missing_model_is_remembered_only_for_the_key_that_saw_it(mock_server):
+    limited, full = mock_key("gemini", "ok", 1), mock_key("gemini", "ok", 2)
+    _hide_model(mock_server, limited, "gemini-1.5-flash")
+
+    first = validate_gemini_api_key(limited, structured=True, deadline=5)
+    second = validate_gemini_api_key(full, structured=True, deadline=5)
+
+    assert first.text.valid and "gemini-pro" in first.text.response
+    assert second.text.valid and "gemini-1.5-flash" in second.text.response
+
+
+def test_listing_only_orders_the_key_it_came_from():
+    catalog = ModelCatalog()
+    catalog.set_listing("openai", "sk-a", ["gpt-4o"])
+
+    assert catalog.order("openai", "sk-a", ["gpt-4.1", "gpt-4o"]) == ["gpt-4o"]
+    assert catalog.order("openai", "sk-b", ["gpt-4.1", "gpt-4o"]) == ["gpt-4.1", "gpt-4o"]
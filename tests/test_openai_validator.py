@@ -0,0 +1,58 @@
+import json
+import asyncio
+
+from async_http import create_async_session
+from mock_provider_server import mock_key
+from openai_validator import validate_openai_api_key, validate_openai_api_key_async
+from validation_errors import ErrorClass
+
+
+def test_rejected_project_key_costs_one_request(mock_server):
+    result = validate_openai_api_key(mock_key("openai", "invalid", 1), structured=True)
+
+    assert result.text.error_class is ErrorClass.AUTH
+    assert mock_server.stats()["requests"] == 1
+
+
+def test_rejected_project_key_costs_one_request_async(mock_server):
+    async def validate():
+        async with create_async_session() as session:
+            return await validate_openai_api_key_async(mock_key("openai", "invalid", 1), structured=True,
+                                                       session=session)
+
+    assert asyncio.run(validate()).text.error_class is ErrorClass.AUTH
+    assert mock_server.stats()["requests"] == 1
+
+
+def test_project_key_without_the_text_model_falls_back(mock_server):
+    mock_server.missing_models = {"gpt-4.1"}
+
+    result = validate_openai_api_key(mock_key("openai", "ok", 1), structured=True)
+
+    assert result.text.valid and "gpt-4o" in result.text.response
+
+
+def test_image_probe_falls_back_to_the_other_dall_e_model(mock_server):
+    mock_server.missing_models = {"dall-e-3"}
+    requests = []
+    respond = mock_server.respond
+
+    def recording(provider, method, route, api_key, body):
+        requests.append((route, body))
+        return respond(provider, method, route, api_key, body)
+
+    mock_server.respond = recording
+    result = validate_openai_api_key(mock_key("openai", "ok", 1), structured=True)
+
+    assert result.image.valid
+    assert [json.loads(body)["model"] for route, body in requests if route == "images/generations"] == \
+        ["dall-e-3", "dall-e-2"]
+
+
+def test_image_probe_reports_both_models_when_neither_works(mock_server):
+    mock_server.missing_models = {"dall-e-3", "dall-e-2"}
+
+    result = validate_openai_api_key(mock_key("openai", "ok", 1), structured=True)
+
+    assert result.image.error_class is ErrorClass.MODEL_NOT_FOUND
+    assert "dall-e-3 and dall-e-2" in result.image.response
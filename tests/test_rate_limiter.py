@@ -0,0 +1,11 @@
+from rate_limiter import RateLimiter, DEFAULT_MAX_CONCURRENCY
+
+
+def test_later_max_concurrency_replaces_the_first():
+    rate_limiter = RateLimiter(default_rate=None)
+    limiter = rate_limiter.for_provider("openai", 32)
+
+    assert rate_limiter.for_provider("openai").concurrency.maximum == 32
+    assert rate_limiter.for_provider("openai", 4) is limiter
+    assert limiter.concurrency.maximum == 4 and limiter.concurrency.limit == 4
+    assert rate_limiter.for_provider("claude").concurrency.maximum == DEFAULT_MAX_CONCURRENCY
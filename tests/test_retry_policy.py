@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from deadline import Deadline
+from retry_policy import RetryPolicy, RetryBudget
+from validation_errors import ErrorClass
+from validation_result import ProbeResult
+
+SERVER_ERROR = ProbeResult(False, "500", error_class=ErrorClass.SERVER_ERROR, status=500)
+BAD_KEY = ProbeResult(False, "401", error_class=ErrorClass.AUTH, status=401)
+
+
+def _rate_limited(retry_after):
+    return ProbeResult(False, "429", error_class=ErrorClass.RATE_LIMIT, status=429, retry_after=retry_after)
+
+
+@pytest.mark.parametrize("retry", range(6))
+def test_backoff_is_full_jitter_up_to_the_capped_exponential(retry):
+    policy = RetryPolicy(max_retries=10, base_delay=0.5, max_delay=4.0)
+    ceiling = min(4.0, 0.5 * 2 ** retry)
+    random.seed(retry)
+    delays = [policy.delay(SERVER_ERROR, retry) for _ in range(200)]
+
+    assert all(0 <= delay <= ceiling for delay in delays)
+    # Jitter spreads the delays over the whole range rather than bunching them at the ceiling
+    assert min(delays) < ceiling / 4 and max(delays) > ceiling * 3 / 4
+
+
+def test_only_transient_and_short_rate_limited_failures_are_retried():
+    policy = RetryPolicy(max_retries=2, max_retry_after=5.0)
+
+    assert policy.delay(BAD_KEY, 0) is None
+    assert policy.delay(ProbeResult(True, "ok"), 0) is None
+    assert policy.delay(SERVER_ERROR, 2) is None
+    assert policy.delay(_rate_limited(3.0), 0) >= 3.0
+    assert policy.delay(_rate_limited(30.0), 0) is None
+    assert policy.delay(_rate_limited(None), 0) is None
+    assert RetryPolicy(retry_rate_limits=False).delay(_rate_limited(1.0), 0) is None
+
+
+def test_budget_earns_a_fraction_of_a_retry_per_attempt():
+    budget = RetryBudget(ratio=0.25, minimum=1)
+
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    for _ in range(4):
+        budget.record_attempt()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    assert (budget.retries, budget.denied) == (2, 2)
+
+
+def test_run_stops_retrying_when_the_budget_runs_out():
+    budget = RetryBudget(ratio=0.0, minimum=1)
+    policy = RetryPolicy(max_retries=5, base_delay=0.0, budget=budget)
+    calls = []
+
+    def probe():
+        calls.append(1)
+        return SERVER_ERROR
+
+    assert policy.run(probe) is SERVER_ERROR
+    # The first attempt plus the single retry the budget allowed
+    assert len(calls) == 2 and budget.denied == 1
+
+
+def test_run_does_not_wait_past_the_deadline():
+    policy = RetryPolicy(max_retries=3, max_retry_after=5.0)
+    calls = []
+
+    def probe():
+        calls.append(1)
+        return _rate_limited(2.0)
+
+    # A Retry-After of 2s is acceptable, but not with 1s of the deadline left
+    assert policy.run(probe, Deadline(1.0)).error_class is ErrorClass.RATE_LIMIT
+    assert len(calls) == 1
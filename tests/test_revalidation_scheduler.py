@@ -0,0 +1,119 @@
+import time
+import random
+
+import pytest
+
+from mock_provider_server import mock_key
+from rate_limiter import RateLimiter
+from revalidation_scheduler import (RevalidationScheduler, WatchedKey, load_inventory, parse_expiry, STATUS_VALID,
+                                    STATUS_INVALID)
+
+
+def _scheduler(**options):
+    options.setdefault("rate_limiter", RateLimiter(default_rate=None, max_retries=0))
+    return RevalidationScheduler(**options)
+
+
+def _check_all(scheduler):
+    # Starts every registered key's check, however far off it is due, and waits for them all
+    started = scheduler.run_pending(now=time.time() + 10 ** 6)
+    scheduler.stop(wait=True)
+    return started
+
+
+def test_intervals_are_jittered_and_never_below_the_minimum():
+    scheduler = _scheduler(interval=100.0, jitter=0.2, min_interval=1.0)
+    entry = WatchedKey("claude", mock_key("claude", "ok", 1))
+    random.seed(0)
+    intervals = [scheduler._interval(entry, time.time()) for _ in range(200)]
+
+    assert all(80.0 <= interval <= 120.0 for interval in intervals)
+    assert min(intervals) < 85.0 and max(intervals) > 115.0
+    assert _scheduler(interval=10.0, min_interval=30.0)._interval(entry, time.time()) == 30.0
+
+
+def test_failing_and_expiring_keys_come_due_sooner():
+    scheduler = _scheduler(interval=1000.0, jitter=0.0, min_interval=1.0, expiry_window=1000.0)
+    now = time.time()
+    entry = WatchedKey("claude", mock_key("claude", "ok", 1))
+
+    entry.failures = 1
+    assert scheduler._interval(entry, now) == pytest.approx(100.0)
+    entry.failures = 3
+    assert scheduler._interval(entry, now) == pytest.approx(400.0)
+    # Doubling stops at the full interval
+    entry.failures = 10
+    assert scheduler._interval(entry, now) == pytest.approx(1000.0)
+
+    entry.failures = 0
+    entry.expires_at = now + 250.0
+    assert scheduler._interval(entry, now) == pytest.approx(250.0)
+
+
+def test_expired_keys_back_off_to_the_full_interval(mock_server):
+    scheduler = _scheduler(interval=1000.0, jitter=0.0, min_interval=10.0)
+    entry = scheduler.register("claude", mock_key("claude", "invalid", 1), expires_at=time.time() - 1)
+
+    waits = []
+    for _ in range(8):
+        _check_all(scheduler)
+        waits.append(round(entry.next_due - entry.last_checked))
+
+    assert waits == [20, 40, 80, 160, 320, 640, 1000, 1000]
+    # A new expiry starts the backoff over
+    scheduler.register("claude", entry.api_key, expires_at=time.time() - 0.5)
+    assert entry.expired_checks == 0
+
+
+def test_status_flips_are_reported_once(mock_server):
+    scheduler = _scheduler(provider_concurrency=3)
+    events = []
+    scheduler.add_hook(events.append)
+    revoked = scheduler.register("claude", mock_key("claude", "invalid", 1), label="revoked", status=STATUS_VALID)
+    restored = scheduler.register("claude", mock_key("claude", "ok", 2), label="restored",
+                                  status=STATUS_INVALID)
+    new = scheduler.register("claude", mock_key("claude", "ok", 3))
+
+    assert _check_all(scheduler) == 3
+    assert (revoked.status, restored.status, new.status) == (STATUS_INVALID, STATUS_VALID, STATUS_VALID)
+    assert (revoked.failures, restored.failures) == (1, 0)
+    # A key's first verdict is no change; only the two known statuses flipped
+    assert sorted((event["label"], event["previous"], event["status"]) for event in events) == [
+        ("restored", STATUS_INVALID, STATUS_VALID), ("revoked", STATUS_VALID, STATUS_INVALID)]
+
+    _check_all(scheduler)
+    assert len(events) == 2 and revoked.failures == 2
+
+
+def test_rate_limited_check_keeps_the_status_and_waits_out_retry_after(mock_server):
+    mock_server.retry_after = 120.0
+    scheduler = _scheduler(min_interval=1.0)
+    entry = scheduler.register("claude", mock_key("claude", "ratelimited", 1), status=STATUS_VALID)
+
+    _check_all(scheduler)
+
+    assert entry.status == STATUS_VALID and entry.failures == 0 and entry.error_class == "rate_limit"
+    assert entry.next_due >= entry.last_checked + 120.0
+
+
+def test_unknown_provider_is_refused():
+    with pytest.raises(ValueError):
+        _scheduler().register(None, "not-a-key")
+
+
+def test_parse_expiry():
+    assert parse_expiry("1700000000") == 1700000000.0
+    assert parse_expiry("2024-01-01") == parse_expiry("2024-01-01T00:00:00Z") == 1704067200.0
+    assert parse_expiry("2024-01-01T02:00:00+02:00") == 1704067200.0
+    assert parse_expiry("  ") is None
+    with pytest.raises(ValueError):
+        parse_expiry("next tuesday")
+
+
+def test_load_inventory_keeps_line_numbers_and_skips_comments(tmp_path):
+    path = tmp_path / "keys.txt"
+    path.write_text("# watched keys\n\nsk-ant-bare\nopenai, sk-proj-one\ngemini,AIza-two,2030-01-01\n",
+                    encoding="utf-8")
+
+    assert load_inventory(str(path)) == [(3, None, "sk-ant-bare", None), (4, "openai", "sk-proj-one", None),
+                                         (5, "gemini", "AIza-two", "2030-01-01")]
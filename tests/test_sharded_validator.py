@@ -0,0 +1,26 @@
+from mock_provider_server import mock_key
+from rate_limiter import RateLimiter
+from retry_policy import RetryPolicy
+from sharded_validator import WorkQueue, process_unit, merge_results
+
+
+def _batch_options():
+    # A 429 comes back at once instead of being waited out and retried
+    return {"retry_policy": RetryPolicy(max_retries=0), "rate_limiter": RateLimiter(default_rate=None, max_retries=0)}
+
+
+def test_resume_skips_routed_keys_and_retries_rate_limited_ones(mock_server, tmp_path):
+    queue = WorkQueue(str(tmp_path))
+    items = [
+        (0, "openai", mock_key("claude", "ok", 1)),  # routed to claude by its prefix
+        (1, "claude", mock_key("claude", "ratelimited", 2)),
+    ]
+
+    assert queue.claim("unit-0000")
+    assert process_unit(queue, "unit-0000", items, **_batch_options()) == 2
+    assert not queue.is_done("unit-0000")
+    assert [(r["index"], r["routed_from"]) for r in merge_results(str(tmp_path))] == [(0, "openai")]
+
+    # The routed key counts as done; only the rate-limited one is sent again
+    assert queue.claim("unit-0000")
+    assert process_unit(queue, "unit-0000", items, **_batch_options()) == 1
@@ -0,0 +1,101 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def fn():
+        runs.append(1)
+        release.wait(5)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", fn))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flight.shared < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["result"] * 5 and len(runs) == 1
+    # Nothing is kept once the call finished
+    assert flight.do("key", lambda: "again") == "again"
+
+
+def test_waiters_receive_the_leaders_exception():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call(fn):
+        try:
+            flight.do("key", fn)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call, args=(fail,))
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=call, args=(lambda: "unused",))
+    waiter.start()
+    while flight.shared < 1:
+        time.sleep(0.01)
+    release.set()
+    leader.join()
+    waiter.join()
+
+    assert len(errors) == 2 and errors[0] is errors[1]
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_task():
+    async def scenario():
+        flight = SingleFlight()
+        runs = []
+
+        async def fn():
+            runs.append(1)
+            await asyncio.sleep(0.1)
+            return "result"
+
+        impatient = asyncio.ensure_future(flight.do_async("key", fn))
+        patient = asyncio.ensure_future(flight.do_async("key", fn))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await impatient
+        return await patient, runs
+
+    result, runs = asyncio.run(scenario())
+    assert result == "result" and len(runs) == 1
+
+
+def test_waiter_timeout_leaves_the_shared_task_running():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.1)
+            return "result"
+
+        patient = asyncio.ensure_future(flight.do_async("key", fn))
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.do_async("key", fn, timeout=0.01)
+        return await patient
+
+    assert asyncio.run(scenario()) == "result"
@@ -0,0 +1,55 @@
+from mock_provider_server import mock_key
+from batch_validator import validate_keys
+from claude_validator import validate_claude_api_key
+from probe_runner import TIER_AUTH, TIER_FULL, PROFILE_LEAN, PROFILE_STANDARD, LEAN_PROMPT
+from retry_policy import RetryPolicy
+from validation_cache import ValidationCache, cached_validator
+from validation_result import ValidationResult
+
+
+def test_profiles_are_cached_separately(mock_server):
+    cache = ValidationCache()
+    pairs = [("claude", mock_key("claude", "ok", 1))]
+
+    lean = validate_keys(pairs, cache=cache, tier=TIER_FULL, profile=PROFILE_LEAN)[0]
+    standard = validate_keys(pairs, cache=cache, tier=TIER_FULL, profile=PROFILE_STANDARD)[0]
+    again = validate_keys(pairs, cache=cache, tier=TIER_FULL, profile=PROFILE_STANDARD)[0]
+
+    assert lean["text_prompt"] == LEAN_PROMPT and not lean["cached"]
+    assert standard["text_prompt"] != LEAN_PROMPT and not standard["cached"]
+    assert again["cached"] and again["text_prompt"] == standard["text_prompt"]
+
+
+def test_cached_validator_keeps_tiers_and_return_types_apart(mock_server):
+    calls = []
+
+    def validate(api_key, **kwargs):
+        calls.append(kwargs)
+        return validate_claude_api_key(api_key, **kwargs)
+
+    wrapper = cached_validator("claude", validate, cache=ValidationCache())
+    key = mock_key("claude", "ok", 1)
+
+    auth = wrapper(key, tier=TIER_AUTH)
+    full = wrapper(key, tier=TIER_FULL, structured=True)
+    again = wrapper(key, tier=TIER_FULL)
+
+    assert isinstance(auth, tuple) and isinstance(full, ValidationResult) and isinstance(again, tuple)
+    assert full.tier == TIER_FULL and again == full.as_tuple()
+    assert len(calls) == 2 and all(call["structured"] for call in calls)
+
+
+def test_cached_validator_does_not_cache_rate_limited_results(mock_server):
+    calls = []
+
+    def validate(api_key, **kwargs):
+        calls.append(kwargs)
+        return validate_claude_api_key(api_key, **kwargs)
+
+    wrapper = cached_validator("claude", validate, cache=ValidationCache())
+    key = mock_key("claude", "ratelimited", 1)
+
+    wrapper(key, tier=TIER_AUTH, retry=RetryPolicy(max_retries=0))
+    wrapper(key, tier=TIER_AUTH, retry=RetryPolicy(max_retries=0))
+
+    assert len(calls) == 2
@@ -0,0 +1,99 @@
+import json
+import socket
+import threading
+
+import pytest
+
+from mock_provider_server import mock_key
+from rate_limiter import RateLimiter
+from validation_server import ValidationService, start_validation_server
+
+
+def _track_concurrency(server, latency):
+    # Wraps the mock's respond to record the most requests it answered at once
+    peak = {"current": 0, "max": 0}
+    lock = threading.Lock()
+    respond = server.respond
+
+    def tracked(*args):
+        with lock:
+            peak["current"] += 1
+            peak["max"] = max(peak["max"], peak["current"])
+        try:
+            server.latency = latency
+            return respond(*args)
+        finally:
+            with lock:
+                peak["current"] -= 1
+
+    server.respond = tracked
+    return peak
+
+
+def test_provider_limit_holds_across_concurrent_requests(mock_server):
+    peak = _track_concurrency(mock_server, 0.1)
+    service = ValidationService(provider_limits={"claude": 2}, rate_limiter=RateLimiter(default_rate=None))
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(
+        service.validate({"provider": "claude", "api_key": mock_key("claude", "ok", i)}))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 8 and all(result["valid"] for result in results)
+    assert peak["max"] == 2
+
+
+def _raw_post(server, content_length, body=b""):
+    # Sends a POST with a hand-written Content-Length header; returns the response status
+    with socket.create_connection(server.server_address, timeout=5) as sock:
+        sock.sendall(b"POST /v1/validate HTTP/1.1\r\nHost: localhost\r\nContent-Length: "
+                     + content_length.encode("ascii") + b"\r\n\r\n" + body)
+        return int(sock.recv(4096).split(b" ", 2)[1])
+
+
+@pytest.fixture
+def validation_server(mock_server):
+    service = ValidationService()
+    server = start_validation_server(service, max_body_bytes=1024)
+    yield server
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+@pytest.mark.parametrize("content_length, status", [("abc", 400), ("-5", 400), ("4096", 413)])
+def test_bad_content_length_is_refused(validation_server, content_length, status):
+    assert _raw_post(validation_server, content_length) == status
+
+
+def test_valid_content_length_is_served(validation_server):
+    body = json.dumps({"provider": "claude", "api_key": mock_key("claude", "ok", 1)}).encode("utf-8")
+    assert _raw_post(validation_server, str(len(body)), body) == 200
+
+
+@pytest.mark.parametrize("value, parallel", [(True, True), ("false", False), ("0", False), ("TRUE", True), (0, False)])
+def test_parallel_option_is_parsed_as_a_boolean(value, parallel):
+    assert ValidationService()._options({"parallel": value})["parallel_probes"] is parallel
+
+
+@pytest.mark.parametrize("value", ["no", "", 2, [], {}])
+def test_parallel_option_rejects_other_values(value):
+    with pytest.raises(ValueError):
+        ValidationService()._options({"parallel": value})
+
+
+def test_requests_share_the_service_pool(mock_server):
+    service = ValidationService(rate_limiter=RateLimiter(default_rate=None))
+    submitted = []
+    submit = service.executor.submit
+    service.executor.submit = lambda *args: submitted.append(args) or submit(*args)
+
+    service.validate({"provider": "claude", "api_key": mock_key("claude", "ok", 1)})
+    response = service.validate_batch({"keys": [mock_key("claude", "ok", n) for n in range(2, 5)]})
+    service.close()
+
+    assert response["summary"]["claude"]["total"] == 3 and len(submitted) == 4
+    with pytest.raises(RuntimeError):
+        service.executor.submit(print)
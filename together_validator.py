@@ -1,109 +1,46 @@
-import os
 import sys
-import requests
-import json
 
-def validate_together_api_key(api_key):
+from probe_runner import TIER_FULL, PROFILE_STANDARD
+from provider_registry import get_provider
+from provider_engine import validate_provider_key, validate_provider_key_async
+
+PROVIDER = "together"
+
+# Endpoints, models and probes live in the provider's spec in provider_registry
+SPEC = get_provider(PROVIDER)
+TEXT_MODELS = SPEC.text.models
+MULTIMODAL_MODEL = SPEC.image.models[0]
+TEST_PROMPT = SPEC.text.prompt
+MULTIMODAL_TEST_PROMPT = SPEC.image.prompt
+
+
+def set_base_url(base_url=None):
+    """
+    Points the validator at another API base URL, such as a mock_provider_server,
+    or back at TOGETHER_BASE_URL / the spec's default when base_url is None.
+    """
+    SPEC.set_base_url(base_url)
+
+
+def validate_together_api_key(api_key, *, parallel=False, session=None, tier=TIER_FULL, structured=False,
+                              deadline=None, retry=None, profile=PROFILE_STANDARD):
     """
     Validates a Together AI API key by testing text generation capabilities.
+    Keyword options are those of provider_engine.validate_provider_key.
     Returns a tuple with validation results and test prompts.
     """
-    text_valid = False
-    image_valid = False
-    text_response = None
-    image_response = None
-    test_prompt = "Respond with 'Together AI API key is working correctly!' in one short sentence."
-    multimodal_test_prompt = "This is a test for multimodal capability. Please respond with 'Together AI multimodal capability test'."
-    
-    # API endpoint for Together AI
-    api_url = "https://api.together.xyz/v1/completions"
-    
-    # Headers for the request
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    # Test text generation with a simple model
-    try:
-        # Try modern model first
-        try:
-            payload = {
-                "model": "meta-llama/Llama-3-8b-chat",
-                "prompt": test_prompt,
-                "max_tokens": 20,
-                "temperature": 0.7
-            }
-            
-            response = requests.post(api_url, headers=headers, json=payload)
-            response.raise_for_status()
-            
-            response_data = response.json()
-            text_response = response_data.get("choices", [{}])[0].get("text", "").strip()
-            text_valid = True
-        except Exception as e1:
-            # Fallback to another model if the first one fails
-            try:
-                payload = {
-                    "model": "togethercomputer/llama-2-7b-chat",
-                    "prompt": test_prompt,
-                    "max_tokens": 20,
-                    "temperature": 0.7
-                }
-                
-                response = requests.post(api_url, headers=headers, json=payload)
-                response.raise_for_status()
-                
-                response_data = response.json()
-                text_response = response_data.get("choices", [{}])[0].get("text", "").strip()
-                text_valid = True
-            except Exception as e2:
-                raise Exception(f"Failed with both models: {str(e2)}")
-    except Exception as e:
-        error_detail = ""
-        if hasattr(e, 'response') and e.response:
-            try:
-                error_detail = f" - {e.response.json().get('error', {}).get('message', '')}"
-            except:
-                pass
-        text_response = f"Text generation failed: {str(e)}{error_detail}"
-    
-    # Test image generation capabilities (if available) via their newer chat API
-    try:
-        chat_api_url = "https://api.together.xyz/v1/chat/completions"
-        
-        payload = {
-            "model": "mistralai/mixtral-8x7b-instruct-v0.1",  # A model that might have multimodal capabilities
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": multimodal_test_prompt}
-            ],
-            "max_tokens": 20
-        }
-        
-        response = requests.post(chat_api_url, headers=headers, json=payload)
-        
-        if response.status_code == 200:
-            response_data = response.json()
-            multimodal_response = response_data.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-            image_response = f"Response: {multimodal_response}\nNote: Together AI doesn't offer direct image generation yet, but API authorization successful for potential multimodal models."
-            image_valid = True
-        else:
-            raise Exception(f"Status code: {response.status_code}, response: {response.text}")
-    except Exception as e:
-        error_detail = ""
-        if hasattr(e, 'response') and e.response:
-            try:
-                error_detail = f" - {e.response.json().get('error', {}).get('message', '')}"
-            except:
-                pass
-                
-        if "not found" in str(e).lower() or "not available" in str(e).lower():
-            image_response = f"Together AI doesn't currently offer image generation capabilities.{error_detail}"
-        else:
-            image_response = f"Multimodal capability check failed: {str(e)}{error_detail}"
-    
-    return (text_valid, text_response, image_valid, image_response, test_prompt, multimodal_test_prompt)
+    return validate_provider_key(SPEC, api_key, parallel=parallel, session=session, tier=tier,
+                                 structured=structured, deadline=deadline, retry=retry, profile=profile)
+
+
+async def validate_together_api_key_async(api_key, *, parallel=False, session=None, tier=TIER_FULL, structured=False,
+                                          deadline=None, retry=None, profile=PROFILE_STANDARD):
+    """
+    Async version of validate_together_api_key that runs on a shared aiohttp session.
+    Returns the same tuple as validate_together_api_key.
+    """
+    return await validate_provider_key_async(SPEC, api_key, parallel=parallel, session=session, tier=tier,
+                                             structured=structured, deadline=deadline, retry=retry, profile=profile)
 
 
 if __name__ == "__main__":
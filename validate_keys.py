@@ -0,0 +1,143 @@
+import re
+import sys
+import json
+import argparse
+
+from batch_validator import (add_batch_arguments, setup_from_args, batch_options_from_args, iter_validate_keys,
+                             summarize, detect_provider, normalize_provider, key_fingerprint)
+from metrics import write_metrics
+
+# Fields are split on a comma, tab or run of whitespace unless --delimiter is given
+_FIELD_SEPARATOR = re.compile(r"\s*,\s*|\t|\s+")
+
+
+def split_fields(line, delimiter=None):
+    """
+    Splits an input line into stripped fields.
+    """
+    if delimiter:
+        return [field.strip() for field in line.split(delimiter)]
+    return _FIELD_SEPARATOR.split(line)
+
+
+def resolve_line(fields, provider=None, provider_column=None, key_column=None):
+    """
+    Picks the (provider, key) pair out of one line's fields.
+    Columns are 1-based. Without explicit columns a line is either "provider,key"
+    or a bare key. When no provider is given or found, it is detected from the
+    key prefix. Raises ValueError if the line cannot be resolved.
+    """
+    if key_column is not None:
+        if len(fields) < key_column:
+            raise ValueError(f"no column {key_column}")
+        api_key = fields[key_column - 1]
+        if provider is None and provider_column is not None:
+            if len(fields) < provider_column:
+                raise ValueError(f"no column {provider_column}")
+            provider = fields[provider_column - 1]
+    elif len(fields) == 1 or provider is not None:
+        api_key = fields[-1]
+    else:
+        provider, api_key = fields[0], fields[1]
+
+    if not api_key:
+        raise ValueError("empty key")
+    if provider:
+        return normalize_provider(provider), api_key
+    detected = detect_provider(api_key)
+    if detected is None:
+        raise ValueError("cannot detect the provider from the key prefix; pass --provider or --provider-column")
+    return detected, api_key
+
+
+def read_lines(lines, provider=None, provider_column=None, key_column=None, delimiter=None):
+    """
+    Parses input lines. Returns (pairs, line_numbers, rejected) where rejected is a
+    list of (line_number, key_or_None, reason) for lines that could not be resolved.
+    Blank lines and lines starting with '#' are ignored.
+    """
+    pairs, line_numbers, rejected = [], [], []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fields = split_fields(line, delimiter)
+        try:
+            pairs.append(resolve_line(fields, provider, provider_column, key_column))
+            line_numbers.append(line_number)
+        except ValueError as e:
+            api_key = fields[key_column - 1] if key_column and len(fields) >= key_column else fields[-1]
+            rejected.append((line_number, api_key or None, str(e)))
+    return pairs, line_numbers, rejected
+
+
+def _rejected_record(line_number, api_key, reason):
+    return {
+        "line": line_number,
+        "provider": None,
+        "key_fingerprint": key_fingerprint(api_key) if api_key else None,
+        "valid": False,
+        "error": f"Unrecognised input: {reason}",
+    }
+
+
+def _write_record(stream, record):
+    stream.write(json.dumps(record, separators=(",", ":")) + "\n")
+    # Flush per line so downstream tools see each result as soon as it is ready
+    stream.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Validate API keys for any supported provider and stream one JSON result per line (NDJSON).")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="File with one key (or 'provider,key') per line; '-' or omitted reads stdin")
+    parser.add_argument("--provider", help="Treat every key as belonging to this provider")
+    parser.add_argument("--provider-column", type=int, metavar="N", help="1-based column holding the provider name")
+    parser.add_argument("--key-column", type=int, metavar="N", help="1-based column holding the key")
+    parser.add_argument("--delimiter", help="Column delimiter (default: comma, tab or whitespace)")
+    add_batch_arguments(parser)
+    parser.add_argument("--summary", action="store_true", help="Print per-provider counts to stderr when done")
+    args = parser.parse_args(argv)
+
+    if args.provider_column is not None and args.key_column is None:
+        parser.error("--provider-column requires --key-column")
+    provider = normalize_provider(args.provider) if args.provider else None
+
+    if args.input == "-":
+        pairs, line_numbers, rejected = read_lines(sys.stdin, provider, args.provider_column, args.key_column,
+                                                   args.delimiter)
+    else:
+        with open(args.input, "r", encoding="utf-8") as f:
+            pairs, line_numbers, rejected = read_lines(f, provider, args.provider_column, args.key_column,
+                                                       args.delimiter)
+
+    for line_number, api_key, reason in rejected:
+        _write_record(sys.stdout, _rejected_record(line_number, api_key, reason))
+
+    cache = setup_from_args(args)
+    options = batch_options_from_args(args)
+    results = []
+    try:
+        for result in iter_validate_keys(pairs, cache=cache, **options):
+            result["line"] = line_numbers[result.pop("index")]
+            _write_record(sys.stdout, result)
+            results.append(result)
+    finally:
+        if options["checkpoint"] is not None:
+            options["checkpoint"].close()
+        if args.metrics_file:
+            write_metrics(args.metrics_file)
+
+    # Keys already in the checkpoint journal get no output line; their results are in the journal
+    skipped = len(pairs) - len(results)
+    if args.summary:
+        print(json.dumps({"summary": summarize(results), "unrecognised": len(rejected),
+                          "checkpointed": skipped}), file=sys.stderr)
+    elif skipped:
+        print(f"Skipped {skipped} keys already in {args.checkpoint}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import subprocess
+
+from batch_validator import VALIDATORS, get_validator, set_base_urls, validate_keys
+from probe_runner import TIERS, TIER_AUTH
+from rate_limiter import RateLimiter
+from deadline import DEFAULT_DEADLINE
+import mock_provider_server
+
+MODES = ("single", "batch", "concurrent")
+
+# Share of benchmark keys per mock_provider_server behavior
+DEFAULT_MIX = {"ok": 0.8, "invalid": 0.15, "error": 0.05}
+
+DEFAULT_KEYS = 300
+DEFAULT_CONCURRENCY = 32
+
+# Seconds the mock server waits per request: roughly a provider's time to first byte
+DEFAULT_LATENCY = 0.05
+DEFAULT_JITTER = 0.02
+
+# Run in a fresh interpreter so each mode's memory is measured on its own
+_RUNNER = """
+import sys, json, validation_benchmark
+print(json.dumps(validation_benchmark.run_mode(**json.loads(sys.argv[1]))))
+"""
+
+
+def make_pairs(count, mix=None, seed=0):
+    """
+    Returns count (provider, key) pairs spread evenly over the providers, with
+    mock_provider_server behaviors in the proportions of mix (default DEFAULT_MIX), shuffled.
+    """
+    mix = mix or DEFAULT_MIX
+    total = sum(mix.values())
+    behaviors = []
+    for behavior, share in mix.items():
+        behaviors += [behavior] * round(count * share / total)
+    behaviors = (behaviors + ["ok"] * count)[:count]
+    providers = list(VALIDATORS)
+    pairs = [(providers[i % len(providers)], mock_provider_server.mock_key(providers[i % len(providers)], behavior, i))
+             for i, behavior in enumerate(behaviors)]
+    random.Random(seed).shuffle(pairs)
+    return pairs
+
+
+def percentile(values, q):
+    """
+    Returns the q-th percentile (0-100) of values by nearest rank, or None if empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_single(pairs, tier, deadline):
+    latencies = []
+    valid = 0
+    for provider, api_key in pairs:
+        start = time.perf_counter()
+        result = get_validator(provider)(api_key, tier=tier, structured=True, deadline=deadline)
+        latencies.append(time.perf_counter() - start)
+        valid += result.valid
+    return latencies, valid
+
+
+def _run_batch(pairs, tier, concurrency, deadline):
+    from http_session import create_session, set_session
+
+    set_session(create_session(pool_maxsize=concurrency * 2))
+    limits = {provider: concurrency for provider in VALIDATORS}
+    # Unpaced, so the benchmark measures the validators rather than the configured rates
+    results = validate_keys(pairs, max_workers=concurrency, provider_limits=limits, tier=tier,
+                            rate_limiter=RateLimiter(default_rate=None), deadline=deadline)
+    return [result["elapsed"] for result in results], sum(bool(result["valid"]) for result in results)
+
+
+async def _run_concurrent(pairs, tier, concurrency, deadline):
+    import importlib
+    from async_http import create_async_session
+
+    session = create_async_session(limit=concurrency * 2, limit_per_host=concurrency * 2)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def validate(provider, api_key):
+        module_name, function_name = VALIDATORS[provider]
+        validate_async = getattr(importlib.import_module(module_name), f"{function_name}_async")
+        async with semaphore:
+            start = time.perf_counter()
+            result = await validate_async(api_key, session=session, tier=tier, structured=True, deadline=deadline)
+            latencies.append(time.perf_counter() - start)
+            return result.valid
+
+    try:
+        valid = sum(await asyncio.gather(*(validate(provider, api_key) for provider, api_key in pairs)))
+    finally:
+        await session.close()
+    return latencies, valid
+
+
+def run_mode(mode, base_urls, keys=DEFAULT_KEYS, mix=None, tier=TIER_AUTH, concurrency=DEFAULT_CONCURRENCY,
+             deadline=DEFAULT_DEADLINE):
+    """
+    Validates `keys` mock keys against the mock server at base_urls in one mode:
+    "single" one key at a time, "batch" through batch_validator's thread pool, or
+    "concurrent" on asyncio with the async validators. Returns a dict with keys/s,
+    p50/p99 per-key latency in seconds and the process's peak RSS in MB.
+    """
+    set_base_urls(base_urls)
+    pairs = make_pairs(keys, mix)
+    start = time.perf_counter()
+    if mode == "single":
+        latencies, valid = _run_single(pairs, tier, deadline)
+    elif mode == "batch":
+        latencies, valid = _run_batch(pairs, tier, concurrency, deadline)
+    elif mode == "concurrent":
+        latencies, valid = asyncio.run(_run_concurrent(pairs, tier, concurrency, deadline))
+    else:
+        raise ValueError(f"Unknown mode: {mode!r}")
+    seconds = time.perf_counter() - start
+    return {"mode": mode, "keys": len(pairs), "valid": valid, "seconds": round(seconds, 4),
+            "keys_per_second": round(len(pairs) / seconds, 2), "p50": round(percentile(latencies, 50), 4),
+            "p99": round(percentile(latencies, 99), 4), "peak_rss_mb": round(_peak_rss_mb(), 1)}
+
+
+def start_server_process(latency=DEFAULT_LATENCY, jitter=DEFAULT_JITTER):
+    """
+    Starts mock_provider_server in its own process on a free port, so serving
+    requests does not compete with the benchmark for the GIL.
+    Returns (process, root URL).
+    """
+    process = subprocess.Popen([sys.executable, mock_provider_server.__file__, "--port", "0",
+                                "--latency", str(latency), "--jitter", str(jitter)],
+                               stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line:
+        process.kill()
+        raise RuntimeError("mock_provider_server exited before it started listening")
+    return process, line.split()[-1]
+
+
+def run_benchmark(modes=MODES, server_url=None, **options):
+    """
+    Runs each mode in a fresh interpreter against a mock server (started for the
+    run unless server_url is given). Options are run_mode's plus latency/jitter
+    for the started server. Returns a list of run_mode reports.
+    """
+    latency = options.pop("latency", DEFAULT_LATENCY)
+    jitter = options.pop("jitter", DEFAULT_JITTER)
+    process = None
+    if server_url is None:
+        process, server_url = start_server_process(latency, jitter)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.dirname(os.path.abspath(__file__)),
+                                                        os.environ.get("PYTHONPATH", "")]))
+    try:
+        report = []
+        for mode in modes:
+            spec = json.dumps({"mode": mode, "base_urls": mock_provider_server.base_urls(server_url), **options})
+            output = subprocess.run([sys.executable, "-c", _RUNNER, spec], capture_output=True, text=True,
+                                    check=True, env=env).stdout
+            report.append(json.loads(output.strip().splitlines()[-1]))
+        return report
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure validation throughput, latency and memory against a local mock provider server.")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--keys", type=int, default=DEFAULT_KEYS, help="Keys validated per mode")
+    parser.add_argument("--tier", choices=TIERS, default=TIER_AUTH)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Validations in flight in the batch and concurrent modes")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="Mock server seconds per request")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER, help="Mock server random extra seconds")
+    parser.add_argument("--mix", action="append", metavar="BEHAVIOR=SHARE",
+                        help="Share of keys with a mock behavior, e.g. invalid=0.2 (repeatable; default "
+                             + ", ".join(f"{behavior}={share}" for behavior, share in DEFAULT_MIX.items()) + ")")
+    parser.add_argument("--server", metavar="URL", help="Use an already running mock_provider_server")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    mix = None
+    if args.mix:
+        mix = {}
+        for value in args.mix:
+            behavior, _, share = value.partition("=")
+            if behavior not in mock_provider_server.BEHAVIORS or not share:
+                parser.error(f"Expected BEHAVIOR=SHARE with one of {', '.join(mock_provider_server.BEHAVIORS)}")
+            mix[behavior] = float(share)
+
+    report = run_benchmark(args.modes, server_url=args.server, keys=args.keys, mix=mix, tier=args.tier,
+                           concurrency=args.concurrency, deadline=args.deadline, latency=args.latency,
+                           jitter=args.jitter)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'mode':12} {'keys':>6} {'valid':>6} {'keys/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'peak RSS':>10}")
+        for entry in report:
+            print(f"{entry['mode']:12} {entry['keys']:6} {entry['valid']:6} {entry['keys_per_second']:9.1f} "
+                  f"{entry['p50'] * 1000:9.1f} {entry['p99'] * 1000:9.1f} {entry['peak_rss_mb']:8.1f} MB")
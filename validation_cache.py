@@ -0,0 +1,311 @@
+import os
+import hmac
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import functools
+from collections import OrderedDict
+
+from validation_result import ValidationResult
+from probe_runner import TIER_FULL, PROFILE_STANDARD
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_SUCCESS_TTL = 3600  # seconds a key that worked is trusted without re-checking
+DEFAULT_FAILURE_TTL = 300   # failures expire sooner so a fixed key is picked up quickly
+
+# Optional fixed salt, e.g. to share one on-disk cache between hosts
+SALT_ENV_VAR = "VALIDATOR_CACHE_SALT"
+
+
+def fingerprint_key(provider, api_key, salt, variant=""):
+    """
+    Returns a salted HMAC-SHA256 of the provider and key (plus any variant such as
+    the validation tier), so the cache never stores or indexes raw keys.
+    """
+    message = "\0".join((provider, variant, api_key)).encode("utf-8")
+    return hmac.new(salt, message, hashlib.sha256).hexdigest()
+
+
+def cache_variant(tier, profile):
+    """
+    Returns the cache variant of results from one validation tier and probe profile,
+    so a lean probe's result never answers a request for the standard profile.
+    """
+    return f"{tier}:{profile}"
+
+
+class MemoryCacheBackend:
+    """
+    In-process LRU store of fingerprint -> (expires_at, value).
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, fingerprint, now):
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[fingerprint]
+                return None
+            self._entries.move_to_end(fingerprint)
+            return entry[1]
+
+    def set(self, fingerprint, value, expires_at):
+        with self._lock:
+            self._entries[fingerprint] = (expires_at, value)
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, fingerprint):
+        with self._lock:
+            self._entries.pop(fingerprint, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    On-disk store so cached results survive restarts. Also persists the salt,
+    since fingerprints are only reproducible with the salt they were made with.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES * 10):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "fingerprint TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value BLOB NOT NULL)")
+
+    def get_salt(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = 'salt'").fetchone()
+        return bytes(row[0]) if row else None
+
+    def set_salt(self, salt):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('salt', ?)", (salt,))
+
+    def get(self, fingerprint, now):
+        """
+        Returns (value, expires_at), or None if missing or expired.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM entries WHERE fingerprint = ?", (fingerprint,))
+                return None
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE fingerprint = ?", (now, fingerprint))
+        return json.loads(row[0]), row[1]
+
+    def set(self, fingerprint, value, expires_at):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (fingerprint, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (fingerprint, json.dumps(value), expires_at, now),
+            )
+            # Evict least recently used rows once over the size bound
+            count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE fingerprint IN "
+                    "(SELECT fingerprint FROM entries ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def delete(self, fingerprint):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE fingerprint = ?", (fingerprint,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+def _encode(result):
+    # Structured results are stored as their dict form; tuples as a JSON list
+    if isinstance(result, ValidationResult):
+        return {"structured": result.to_dict()}
+    return list(result)
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        return ValidationResult.from_dict(value["structured"])
+    return tuple(value)
+
+
+class ValidationCache:
+    """
+    Caches validator results keyed by a salted fingerprint of (provider, key).
+    Lookups hit an in-memory LRU first and fall back to the optional disk backend.
+    Successful results (either capability valid) live for success_ttl seconds,
+    failures for failure_ttl.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, success_ttl=DEFAULT_SUCCESS_TTL,
+                 failure_ttl=DEFAULT_FAILURE_TTL, disk_backend=None, salt=None):
+        self.success_ttl = success_ttl
+        self.failure_ttl = failure_ttl
+        self.memory = MemoryCacheBackend(max_entries)
+        self.disk = disk_backend
+        self.hits = 0
+        self.misses = 0
+        self.salt = self._resolve_salt(salt)
+
+    def _resolve_salt(self, salt):
+        if salt is None and os.environ.get(SALT_ENV_VAR):
+            salt = os.environ[SALT_ENV_VAR]
+        if isinstance(salt, str):
+            salt = salt.encode("utf-8")
+        if self.disk is not None:
+            stored = self.disk.get_salt()
+            if salt is None and stored is not None:
+                return stored
+            if salt is not None and stored is not None and stored != salt:
+                # Entries made with another salt can never match again
+                self.disk.clear()
+            salt = salt or os.urandom(32)
+            self.disk.set_salt(salt)
+            return salt
+        return salt or os.urandom(32)
+
+    def fingerprint(self, provider, api_key, variant=""):
+        return fingerprint_key(provider, api_key, self.salt, variant)
+
+    def get(self, provider, api_key, variant=""):
+        """
+        Returns the cached result (tuple or ValidationResult), or None if missing or expired.
+        """
+        fingerprint = self.fingerprint(provider, api_key, variant)
+        now = time.time()
+        value = self.memory.get(fingerprint, now)
+        if value is None and self.disk is not None:
+            entry = self.disk.get(fingerprint, now)
+            if entry is not None:
+                # Promote to memory with the remaining TTL from disk
+                value = _decode(entry[0])
+                self.memory.set(fingerprint, value, entry[1])
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, provider, api_key, result, variant=""):
+        """
+        Stores a validator result (tuple or ValidationResult) with a TTL chosen by its outcome.
+        """
+        if isinstance(result, ValidationResult):
+            if result.rate_limited or result.transient:
+                # A 429 or an outage says nothing about the key; don't let it stand in for a real answer
+                return
+            succeeded = result.valid
+        else:
+            result = tuple(result)
+            succeeded = bool(result[0] or result[2])
+        ttl = self.success_ttl if succeeded else self.failure_ttl
+        if ttl <= 0:
+            return
+        fingerprint = self.fingerprint(provider, api_key, variant)
+        expires_at = time.time() + ttl
+        self.memory.set(fingerprint, result, expires_at)
+        if self.disk is not None:
+            self.disk.set(fingerprint, _encode(result), expires_at)
+
+    def invalidate(self, provider, api_key, variant=""):
+        fingerprint = self.fingerprint(provider, api_key, variant)
+        self.memory.delete(fingerprint)
+        if self.disk is not None:
+            self.disk.delete(fingerprint)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def validate(self, provider, api_key, validate_fn, variant="", **kwargs):
+        """
+        Returns the cached result for the key, or calls validate_fn(api_key, **kwargs)
+        and caches what it returns.
+        Returns a tuple (result, was_cached).
+        """
+        result = self.get(provider, api_key, variant)
+        if result is not None:
+            return result, True
+        result = validate_fn(api_key, **kwargs)
+        self.set(provider, api_key, result, variant)
+        return result, False
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Returns the process-wide in-memory cache, creating it on first use.
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = ValidationCache()
+    return _default_cache
+
+
+def set_cache(cache):
+    """
+    Replaces the process-wide cache (e.g. with one backed by SQLiteCacheBackend).
+    """
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = cache
+
+
+def cached_validator(provider, validate_fn, cache=None):
+    """
+    Wraps a validate_*_api_key function so repeated calls for the same key, tier
+    and profile are answered from the cache. The wrapper has the same signature and
+    return value. The validator is always asked for a ValidationResult, so
+    rate-limited and transient outcomes are recognised and never cached.
+    """
+    @functools.wraps(validate_fn)
+    def wrapper(api_key, structured=False, **kwargs):
+        variant = cache_variant(kwargs.get("tier", TIER_FULL), kwargs.get("profile", PROFILE_STANDARD))
+        result, _ = (cache or get_cache()).validate(provider, api_key, validate_fn, variant=variant,
+                                                    structured=True, **kwargs)
+        return result if structured else result.as_tuple()
+    return wrapper
@@ -0,0 +1,179 @@
+import time
+from enum import Enum
+from email.utils import parsedate_to_datetime
+
+# HTTP statuses that mean the provider rejected the key itself, not the request
+AUTH_FAILURE_STATUSES = (401, 403)
+
+# Gemini answers an invalid key with 400 INVALID_ARGUMENT; these markers tell it
+# apart from other bad requests
+AUTH_FAILURE_MARKERS = ("api_key_invalid", "api key not valid", "invalid_api_key", "invalid x-api-key")
+
+# Status codes some providers use beyond the standard 5XX range for overload
+OVERLOADED_STATUSES = (529,)
+
+QUOTA_MARKERS = ("insufficient_quota", "quota", "billing", "credit")
+MODEL_NOT_FOUND_MARKERS = ("model not found", "model_not_found", "does not exist", "not available", "deprecated", "is not found")
+TIMEOUT_MARKERS = ("timed out", "timeout", "deadline exceeded")
+CONNECTION_MARKERS = ("connection aborted", "connection reset", "connection refused", "remotedisconnected",
+                      "name or service not known", "cannot connect", "max retries exceeded")
+
+
+class ErrorClass(Enum):
+    """
+    Why a probe failed, so callers can aggregate and decide on retries without
+    matching error strings.
+    """
+    AUTH = "auth"
+    QUOTA = "quota"
+    RATE_LIMIT = "rate_limit"
+    MODEL_NOT_FOUND = "model_not_found"
+    TIMEOUT = "timeout"
+    SERVER_ERROR = "server_error"
+    CONNECTION = "connection"
+    # Ruled out by key_format before any request was sent
+    MALFORMED = "malformed"
+    OTHER = "other"
+
+
+# Failures that say nothing about the key: the same request may well succeed a moment later
+TRANSIENT_ERRORS = (ErrorClass.CONNECTION, ErrorClass.SERVER_ERROR)
+
+
+class KeyRejected(Exception):
+    """
+    Raised by a text probe when the provider definitively rejected the key, so the
+    remaining probes and fallback models for that key are skipped.
+    .response is the probe's failure message and .status the HTTP status, if known.
+    """
+
+    def __init__(self, response, status=None):
+        super().__init__(response)
+        self.response = response
+        self.status = status
+
+    def skip_reason(self):
+        """
+        Returns the message reported for probes that were skipped because of this rejection.
+        """
+        status = f" (HTTP {self.status})" if self.status else ""
+        return f"Skipped: the key was rejected during the text probe{status}."
+
+
+def _chain(e):
+    # The exception and the causes it wraps, outermost first
+    seen = set()
+    while e is not None and id(e) not in seen:
+        seen.add(id(e))
+        yield e
+        e = e.__cause__ or e.__context__
+
+
+def status_of(e):
+    """
+    Returns the HTTP status carried by an exception from requests, aiohttp helpers,
+    the OpenAI SDK or google.api_core, following wrapped causes. None if there is none.
+    """
+    for e in _chain(e):
+        response = getattr(e, "response", None)
+        for status in (getattr(response, "status_code", None), getattr(e, "status_code", None),
+                       getattr(e, "status", None), getattr(e, "code", None)):
+            if isinstance(status, int) and 100 <= status < 600:
+                return status
+    return None
+
+
+def retry_after_of(e):
+    """
+    Returns the seconds to wait from a Retry-After header on the exception's
+    response (delta-seconds or HTTP date), following wrapped causes. None if absent.
+    """
+    for e in _chain(e):
+        headers = getattr(e, "headers", None) or getattr(getattr(e, "response", None), "headers", None)
+        if headers is not None:
+            try:
+                value = headers.get("Retry-After") or headers.get("retry-after")
+            except Exception:
+                value = None
+            if value:
+                return parse_retry_after(value)
+    return None
+
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header value into non-negative seconds, or None if malformed.
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def is_auth_failure(e):
+    """
+    Returns True if the exception shows the key itself is invalid (401/403, or a
+    provider-specific invalid-key error), as opposed to a transient or model error.
+    """
+    if status_of(e) in AUTH_FAILURE_STATUSES:
+        return True
+    return any(marker in _error_text(e) for marker in AUTH_FAILURE_MARKERS)
+
+
+def _error_text(e):
+    text = str(e).lower()
+    body = getattr(e, "body", None)
+    if isinstance(body, str):
+        text += " " + body.lower()
+    response = getattr(e, "response", None)
+    response_text = getattr(response, "text", None)
+    if isinstance(response_text, str):
+        text += " " + response_text.lower()
+    return text
+
+
+def classify_status(status, text=""):
+    """
+    Maps an HTTP error status (plus the error text, for ambiguous statuses) to an ErrorClass.
+    """
+    text = text.lower()
+    if status in AUTH_FAILURE_STATUSES:
+        return ErrorClass.AUTH
+    if status == 402:
+        return ErrorClass.QUOTA
+    if status == 429:
+        # Providers use 429 both for "slow down" and for "out of credit"
+        return ErrorClass.QUOTA if any(marker in text for marker in QUOTA_MARKERS) else ErrorClass.RATE_LIMIT
+    if status == 404:
+        return ErrorClass.MODEL_NOT_FOUND
+    if status in (408, 504):
+        return ErrorClass.TIMEOUT
+    if status is not None and (status >= 500 or status in OVERLOADED_STATUSES):
+        return ErrorClass.SERVER_ERROR
+    if any(marker in text for marker in AUTH_FAILURE_MARKERS):
+        return ErrorClass.AUTH
+    if any(marker in text for marker in MODEL_NOT_FOUND_MARKERS):
+        return ErrorClass.MODEL_NOT_FOUND
+    return ErrorClass.OTHER
+
+
+def classify_error(e):
+    """
+    Returns the ErrorClass for an exception raised by a probe.
+    """
+    if isinstance(e, KeyRejected):
+        return ErrorClass.AUTH
+    status = status_of(e)
+    text = _error_text(e)
+    if status is None:
+        # Wrapped causes count too, e.g. a fallback chain re-raising a timeout
+        names = {cls.__name__.lower() for cause in _chain(e) for cls in type(cause).__mro__}
+        if any("timeout" in name for name in names) or any(marker in text for marker in TIMEOUT_MARKERS):
+            return ErrorClass.TIMEOUT
+        if any("connection" in name for name in names) or any(marker in text for marker in CONNECTION_MARKERS):
+            return ErrorClass.CONNECTION
+    return classify_status(status, text)
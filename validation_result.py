@@ -0,0 +1,164 @@
+from validation_errors import ErrorClass, TRANSIENT_ERRORS, KeyRejected, classify_error, classify_status, status_of, retry_after_of
+
+# Reported in place of the image capability when it was not probed (auth-only tier)
+NOT_PROBED_NOTE = "Skipped: the auth-only tier does not probe generation capabilities."
+
+
+class ProbeResult:
+    """
+    Outcome of one capability probe. error_class, status, latency and retry_after
+    are None when not applicable; latency and retry_after are in seconds.
+    """
+    __slots__ = ("valid", "response", "prompt", "error_class", "status", "latency", "retry_after")
+
+    def __init__(self, valid, response, prompt=None, error_class=None, status=None, latency=None, retry_after=None):
+        self.valid = valid
+        self.response = response
+        self.prompt = prompt
+        self.error_class = error_class
+        self.status = status
+        self.latency = latency
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_error(cls, response, e):
+        """
+        Builds a failed result, classifying the exception that caused it.
+        """
+        if isinstance(e, KeyRejected):
+            return cls(False, response, error_class=ErrorClass.AUTH, status=e.status)
+        return cls(False, response, error_class=classify_error(e), status=status_of(e), retry_after=retry_after_of(e))
+
+    @classmethod
+    def from_status(cls, response, status, text="", retry_after=None):
+        """
+        Builds a failed result from an HTTP status that was checked without raising.
+        """
+        return cls(False, response, error_class=classify_status(status, text), status=status, retry_after=retry_after)
+
+    @property
+    def transient(self):
+        """
+        True if the probe failed in a way worth retrying: a connection error or a 5XX.
+        """
+        if self.valid:
+            return False
+        return self.error_class in TRANSIENT_ERRORS or (self.status is not None and self.status >= 500)
+
+    def to_dict(self, prefix=""):
+        return {
+            f"{prefix}valid": self.valid,
+            f"{prefix}response": self.response,
+            f"{prefix}prompt": self.prompt,
+            f"{prefix}error": self.error_class.value if self.error_class else None,
+            f"{prefix}status": self.status,
+            f"{prefix}latency": self.latency,
+            f"{prefix}retry_after": self.retry_after,
+        }
+
+    @classmethod
+    def from_dict(cls, data, prefix=""):
+        error = data.get(f"{prefix}error")
+        return cls(
+            data.get(f"{prefix}valid", False),
+            data.get(f"{prefix}response"),
+            data.get(f"{prefix}prompt"),
+            ErrorClass(error) if error else None,
+            data.get(f"{prefix}status"),
+            data.get(f"{prefix}latency"),
+            data.get(f"{prefix}retry_after"),
+        )
+
+    def __repr__(self):
+        error = self.error_class.value if self.error_class else None
+        return f"ProbeResult(valid={self.valid!r}, error={error!r}, status={self.status!r}, latency={self.latency!r})"
+
+
+class ValidationResult:
+    """
+    Outcome of validating one key: the text probe and, for the full tier, the
+    image/multimodal probe (None when it was not probed).
+    as_tuple() gives the 6-tuple returned by the validate_*_api_key functions.
+    """
+    __slots__ = ("provider", "tier", "text", "image")
+
+    def __init__(self, provider, tier, text, image=None, text_prompt=None, image_prompt=None):
+        self.provider = provider
+        self.tier = tier
+        self.text = text
+        self.image = image
+        if text_prompt is not None:
+            text.prompt = text_prompt
+        if image is not None and image_prompt is not None:
+            image.prompt = image_prompt
+
+    @property
+    def valid(self):
+        """
+        True if the key worked for at least one probed capability.
+        """
+        return bool(self.text.valid or (self.image is not None and self.image.valid))
+
+    @property
+    def error_class(self):
+        """
+        The text probe's error class, or the image probe's if only that failed.
+        """
+        if self.text.error_class is not None:
+            return self.text.error_class
+        return self.image.error_class if self.image is not None else None
+
+    @property
+    def rate_limited(self):
+        """
+        True if a probe was turned away by the provider's rate limiter, so the
+        outcome says nothing about the key and should be retried.
+        """
+        return any(probe is not None and probe.error_class is ErrorClass.RATE_LIMIT
+                   for probe in (self.text, self.image))
+
+    @property
+    def transient(self):
+        """
+        True if a probe still failed with a transient error (connection or 5XX) after
+        its retries, so like a rate-limited outcome it says nothing about the key.
+        """
+        return any(probe is not None and probe.transient for probe in (self.text, self.image))
+
+    @property
+    def retry_after(self):
+        """
+        The longest Retry-After any probe was given, or None.
+        """
+        delays = [probe.retry_after for probe in (self.text, self.image)
+                  if probe is not None and probe.retry_after is not None]
+        return max(delays) if delays else None
+
+    def as_tuple(self):
+        if self.image is None:
+            return (self.text.valid, self.text.response, False, NOT_PROBED_NOTE, self.text.prompt, None)
+        return (self.text.valid, self.text.response, self.image.valid, self.image.response,
+                self.text.prompt, self.image.prompt)
+
+    def to_dict(self):
+        """
+        Returns a flat, JSON-serializable dict (text_* and image_* fields).
+        """
+        data = {"provider": self.provider, "tier": self.tier, "valid": self.valid}
+        data.update(self.text.to_dict("text_"))
+        if self.image is not None:
+            data.update(self.image.to_dict("image_"))
+        else:
+            data.update(ProbeResult(False, NOT_PROBED_NOTE).to_dict("image_"))
+            data["image_probed"] = False
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        image = None
+        if data.get("image_probed", True):
+            image = ProbeResult.from_dict(data, "image_")
+        return cls(data.get("provider"), data.get("tier"), ProbeResult.from_dict(data, "text_"), image)
+
+    def __repr__(self):
+        return f"ValidationResult(provider={self.provider!r}, tier={self.tier!r}, text={self.text!r}, image={self.image!r})"
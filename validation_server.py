@@ -0,0 +1,412 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import importlib
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from batch_validator import (VALIDATORS, add_batch_arguments, setup_from_args, batch_options_from_args, validate_keys,
+                             summarize, normalize_provider, detect_provider, get_validator, batch_retry_policy,
+                             ProviderSlots, DEFAULT_MAX_WORKERS)
+from probe_runner import check_tier, check_profile, TIER_AUTH, PROFILE_LEAN
+from rate_limiter import RateLimiter
+from validation_cache import ValidationCache
+from http_session import get_session
+from provider_registry import registered_providers
+from metrics import get_metrics, write_metrics
+
+DEFAULT_PORT = 8788
+
+# Requests larger than this are refused with 413 before their body is read
+DEFAULT_MAX_BODY_BYTES = 8 * 1024 * 1024
+
+# Most keys one /v1/batch request may submit
+DEFAULT_MAX_BATCH_KEYS = 10000
+
+# Seconds a warm-up request to a provider may take
+PRECONNECT_TIMEOUT = 5.0
+
+# Probe name that labels warm-up requests in the metrics
+PROBE_PRECONNECT = "preconnect"
+
+# Per-request options a client may set, and the validate_keys argument each one overrides
+REQUEST_OPTIONS = {
+    "tier": "tier",
+    "profile": "profile",
+    "deadline": "deadline",
+    "parallel": "parallel_probes",
+}
+
+# Spellings a boolean option may be given in besides true and false
+_FLAG_STRINGS = {"true": True, "1": True, "false": False, "0": False}
+
+
+def _flag(name, value):
+    # bool("false") is True, so strings are looked up rather than converted
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in _FLAG_STRINGS:
+        return _FLAG_STRINGS[value.strip().lower()]
+    raise ValueError(f"{name} must be true or false, got {value!r}")
+
+
+def _base_url(provider):
+    # Spec-driven providers keep it on their spec, the hand-written validators in API_BASE_URL
+    spec = registered_providers().get(provider)
+    if spec is not None:
+        return spec.base_url
+    return importlib.import_module(VALIDATORS[provider][0]).API_BASE_URL
+
+
+class ValidationService:
+    """
+    The state a resident validator keeps between requests: the validator modules
+    (imported once), the shared keep-alive session, the ValidationCache, the
+    model catalog and the RateLimiter, so only the first check of a key pays for
+    imports and connection setup and a cached key is answered without a request.
+    options are the batch_validator.validate_keys arguments requests start from
+    (see batch_options_from_args); provider_limits cap each provider's
+    validations in flight across all requests together, and each request gets
+    its own retry budget. All requests run on one pool of max_workers threads,
+    which close() stops.
+    """
+
+    def __init__(self, cache=None, max_batch_keys=DEFAULT_MAX_BATCH_KEYS, retries=None, retry_budget=None, **options):
+        self.cache = cache if cache is not None else ValidationCache()
+        self.max_batch_keys = max_batch_keys
+        options.pop("checkpoint", None)
+        options.pop("retry_policy", None)
+        options.setdefault("tier", TIER_AUTH)
+        options.setdefault("profile", PROFILE_LEAN)
+        # One limiter and one set of provider slots for every request, so concurrent
+        # requests share each provider's rate and concurrency instead of adding up
+        options.setdefault("rate_limiter", RateLimiter())
+        options.setdefault("provider_slots", ProviderSlots(options.get("provider_limits")))
+        self.options = options
+        # Started once rather than per request; a batch still takes at most max_workers of it
+        self.executor = ThreadPoolExecutor(max_workers=options.get("max_workers", DEFAULT_MAX_WORKERS),
+                                           thread_name_prefix="validate")
+        self.retry_args = {key: value for key, value in (("max_retries", retries), ("budget_ratio", retry_budget))
+                           if value is not None}
+        self.started = time.time()
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def warm(self, preconnect=True):
+        """
+        Imports every provider's validator now rather than on its first key and,
+        with preconnect, opens a keep-alive connection to each provider's API in
+        the background so the first validation skips the TCP and TLS handshakes.
+        """
+        providers = list(VALIDATORS) + [name for name in registered_providers() if name not in VALIDATORS]
+        for provider in providers:
+            get_validator(provider)
+        if preconnect:
+            for provider in providers:
+                threading.Thread(target=self._preconnect, args=(provider,), name=f"preconnect-{provider}",
+                                 daemon=True).start()
+
+    def _preconnect(self, provider):
+        try:
+            with get_metrics().probe(provider, PROBE_PRECONNECT):
+                # Any answer, even a 404, leaves the connection in the pool
+                get_session().head(_base_url(provider), timeout=PRECONNECT_TIMEOUT)
+        except Exception:
+            pass
+
+    def _count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def _options(self, request):
+        """
+        Returns the validate_keys arguments for a request: the service defaults
+        overridden by the request's own tier, profile, deadline and parallel.
+        Raises ValueError for an invalid value.
+        """
+        options = dict(self.options)
+        for name, argument in REQUEST_OPTIONS.items():
+            if request.get(name) is not None:
+                options[argument] = request[name]
+        check_tier(options["tier"])
+        check_profile(options["profile"])
+        deadline = options.get("deadline")
+        if deadline is not None and (isinstance(deadline, bool) or not isinstance(deadline, (int, float))
+                                     or deadline <= 0):
+            raise ValueError(f"deadline must be a positive number of seconds, got {deadline!r}")
+        options["parallel_probes"] = _flag("parallel", options.get("parallel_probes", False))
+        options["retry_policy"] = batch_retry_policy(**self.retry_args)
+        options["executor"] = self.executor
+        return options
+
+    def _pair(self, entry, position=None):
+        """
+        Returns the (provider, key) pair of a "key" string or {"provider", "api_key"} object;
+        the provider is detected from the key when not given. Raises ValueError.
+        """
+        where = "" if position is None else f"keys[{position}]: "
+        provider = None
+        if isinstance(entry, dict):
+            provider, api_key = entry.get("provider"), entry.get("api_key")
+        else:
+            api_key = entry
+        if not isinstance(api_key, str):
+            raise ValueError(f"{where}expected an api_key string")
+        if provider is None:
+            provider = detect_provider(api_key.strip())
+            if provider is None:
+                raise ValueError(f"{where}cannot detect the provider; pass \"provider\"")
+        elif not isinstance(provider, str):
+            raise ValueError(f"{where}provider must be a string")
+        return normalize_provider(provider), api_key.strip()
+
+    def validate(self, request):
+        """
+        Validates one key: {"api_key": ..., "provider": ...} plus any of tier,
+        profile, deadline and parallel. Returns the batch result dict of the key.
+        """
+        self._count("validate")
+        options = self._options(request)
+        pair = self._pair(request)
+        result = validate_keys([pair], cache=self.cache, **dict(options, max_workers=1))[0]
+        del result["index"]
+        return result
+
+    def validate_batch(self, request):
+        """
+        Validates {"keys": [...]}, each entry a key string or a {"provider",
+        "api_key"} object, with the same options as validate for all of them.
+        Returns {"results": [...in input order], "summary": summarize(results)}.
+        """
+        self._count("batch")
+        keys = request.get("keys")
+        if not isinstance(keys, list):
+            raise ValueError("expected \"keys\": a list of keys or {\"provider\", \"api_key\"} objects")
+        if len(keys) > self.max_batch_keys:
+            raise ValueError(f"{len(keys)} keys is more than the {self.max_batch_keys} allowed per batch")
+        options = self._options(request)
+        pairs = [self._pair(entry, position) for position, entry in enumerate(keys)]
+        results = validate_keys(pairs, cache=self.cache, **options)
+        return {"results": results, "summary": summarize(results)}
+
+    def close(self, wait=True):
+        """
+        Stops the worker pool; with wait, after the validations in flight finish.
+        """
+        self.executor.shutdown(wait=wait)
+
+    def stats(self):
+        """
+        Returns uptime, requests served per endpoint, cache size and hit counts, and rate limiter state.
+        """
+        with self._lock:
+            requests = dict(self.requests)
+        rate_limiter = self.options.get("rate_limiter")
+        return {
+            "uptime": round(time.time() - self.started, 3),
+            "requests": requests,
+            "cache": {"entries": len(self.cache.memory), "hits": self.cache.hits, "misses": self.cache.misses},
+            "rate_limiter": rate_limiter.stats() if rate_limiter is not None else None,
+        }
+
+
+class ValidationHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of a ValidationService:
+      POST /v1/validate  one key
+      POST /v1/batch     many keys
+      GET  /v1/health    liveness
+      GET  /v1/stats     ValidationService.stats()
+      GET  /metrics      latency histograms in the Prometheus text format
+    Errors are {"error": {"message": ...}} with 400, 404, 405 or 413.
+    Keys only ever appear in request bodies, which are never logged.
+    """
+    protocol_version = "HTTP/1.1"
+    server_version = "ValidationServer/1.0"
+    # Headers and body go out in separate writes; without TCP_NODELAY the body
+    # waits for a delayed ACK and every request gains ~40 ms
+    disable_nagle_algorithm = True
+
+    _POST_ROUTES = {"/v1/validate": "validate", "/v1/batch": "validate_batch"}
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        path = self.path.partition("?")[0]
+        if path == "/v1/health":
+            return self._send(200, {"status": "ok"})
+        if path == "/v1/stats":
+            return self._send(200, self.server.service.stats())
+        if path == "/metrics":
+            return self._send_text(200, get_metrics().render_prometheus())
+        if path in self._POST_ROUTES:
+            return self._send_error(405, f"Use POST for {path}")
+        self._send_error(404, f"No route for GET {path}")
+
+    def do_POST(self):
+        path = self.path.partition("?")[0]
+        method = self._POST_ROUTES.get(path)
+        header = self.headers.get("Content-Length")
+        try:
+            length = int(header or 0)
+            if length < 0:
+                raise ValueError(header)
+        except ValueError:
+            # Without a usable length the body cannot be skipped, so the connection cannot be reused
+            self.close_connection = True
+            return self._send_error(400, f"Invalid Content-Length {header!r}")
+        if length > self.server.max_body_bytes:
+            # The body is left unread, so the connection cannot be reused
+            self.close_connection = True
+            return self._send_error(413, f"Request body over {self.server.max_body_bytes} bytes")
+        body = self.rfile.read(length) if length else b""
+        if method is None:
+            return self._send_error(404, f"No route for POST {path}")
+        try:
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("expected a JSON object")
+            payload = getattr(self.server.service, method)(request)
+        except ValueError as e:
+            return self._send_error(400, str(e))
+        self._send(200, payload)
+
+    def _send_error(self, status, message):
+        self._send(status, {"error": {"message": message}})
+
+    def _send(self, status, payload):
+        self._send_text(status, json.dumps(payload), "application/json")
+
+    def _send_text(self, status, text, content_type="text/plain; version=0.0.4"):
+        data = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class UnixValidationHandler(ValidationHandler):
+    # TCP_NODELAY does not exist on Unix sockets, and their peers have no address
+    disable_nagle_algorithm = False
+
+    def address_string(self):
+        return "unix"
+
+
+class ValidationServer(ThreadingHTTPServer):
+    """
+    Serves a ValidationService over HTTP/JSON, one thread per connection.
+    """
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, service, max_body_bytes=DEFAULT_MAX_BODY_BYTES, verbose=False):
+        super().__init__(address, ValidationHandler)
+        self.service = service
+        self.max_body_bytes = max_body_bytes
+        self.verbose = verbose
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class UnixValidationServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves a ValidationService on a Unix socket that only its owner can connect to.
+    """
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, path, service, max_body_bytes=DEFAULT_MAX_BODY_BYTES, verbose=False):
+        if os.path.exists(path):
+            # A socket left behind by a server that did not shut down cleanly
+            os.unlink(path)
+        # The socket is created with the umask's permissions; keep other users out from the start
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, UnixValidationHandler)
+        finally:
+            os.umask(umask)
+        self.service = service
+        self.max_body_bytes = max_body_bytes
+        self.verbose = verbose
+
+    @property
+    def url(self):
+        return f"unix:{self.server_address}"
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def start_validation_server(service, host="127.0.0.1", port=0, socket_path=None, **options):
+    """
+    Starts a ValidationServer (or, with socket_path, a UnixValidationServer) for
+    service on a background thread; port 0 picks a free port. Options are the
+    server's. Returns the server; call shutdown() and server_close() to stop it.
+    """
+    if socket_path:
+        server = UnixValidationServer(socket_path, service, **options)
+    else:
+        server = ValidationServer((host, port), service, **options)
+    threading.Thread(target=server.serve_forever, name="validation-server", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve key validations over a local HTTP/JSON API, keeping sessions, caches and model "
+                    "catalogs warm between requests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on, 0 for any free port")
+    parser.add_argument("--socket", metavar="PATH", help="Listen on this Unix socket instead of a TCP port")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH_KEYS, help="Most keys per batch request")
+    parser.add_argument("--no-preconnect", action="store_true",
+                        help="Don't open connections to the providers at startup")
+    parser.add_argument("--verbose", action="store_true", help="Log every request (never its body)")
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+    if args.checkpoint:
+        parser.error("--checkpoint does not apply to the server; results are cached instead")
+
+    cache = setup_from_args(args)
+    if cache is None:
+        cache = ValidationCache(success_ttl=args.success_ttl, failure_ttl=args.failure_ttl)
+    service = ValidationService(cache=cache, max_batch_keys=args.max_batch, retries=args.retries,
+                                retry_budget=args.retry_budget, **batch_options_from_args(args))
+    service.warm(preconnect=not args.no_preconnect)
+
+    if args.socket:
+        server = UnixValidationServer(args.socket, service, verbose=args.verbose)
+    else:
+        server = ValidationServer((args.host, args.port), service, verbose=args.verbose)
+    print(f"Validation server listening on {server.url}", flush=True)
+    print(f"Default tier {args.tier}, probe profile {args.probe_profile}; "
+          f"POST /v1/validate or /v1/batch, GET /v1/health, /v1/stats or /metrics", flush=True)
+    # Stopping the service (SIGTERM) shuts down as cleanly as Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close(wait=False)
+        if args.metrics_file:
+            write_metrics(args.metrics_file)
@@ -1,91 +1,46 @@
-import os
 import sys
-import requests
-import json
 
-def validate_xai_api_key(api_key):
+from probe_runner import TIER_FULL, PROFILE_STANDARD
+from provider_registry import get_provider
+from provider_engine import validate_provider_key, validate_provider_key_async
+
+PROVIDER = "xai"
+
+# Endpoints, models and probes live in the provider's spec in provider_registry
+SPEC = get_provider(PROVIDER)
+TEXT_MODEL = SPEC.text.models[0]
+MULTIMODAL_MODEL = SPEC.image.models[0]
+TEST_PROMPT = SPEC.text.prompt
+MULTIMODAL_TEST_PROMPT = SPEC.image.prompt
+
+
+def set_base_url(base_url=None):
+    """
+    Points the validator at another API base URL, such as a mock_provider_server,
+    or back at XAI_BASE_URL / the spec's default when base_url is None.
+    """
+    SPEC.set_base_url(base_url)
+
+
+def validate_xai_api_key(api_key, *, parallel=False, session=None, tier=TIER_FULL, structured=False,
+                         deadline=None, retry=None, profile=PROFILE_STANDARD):
     """
     Validates an xAI (Grok) API key by testing text and potential image/multimodal capabilities.
-    Returns a tuple (is_valid_text, text_response, is_valid_image, image_response)
+    Keyword options are those of provider_engine.validate_provider_key.
+    Returns a tuple (is_valid_text, text_response, is_valid_image, image_response, test_prompt, multimodal_test_prompt)
     """
-    text_valid = False
-    image_valid = False
-    text_response = None
-    image_response = None
-    test_prompt = "Say 'xAI API key is working correctly!' in one short sentence."
-    multimodal_test_prompt = "This is a test for multimodal capability. Please respond with 'xAI multimodal test'."
-    
-    # API endpoint for xAI/Grok
-    api_url = "https://api.xai.com/v1/chat/completions"
-    
-    # Headers for the request
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    # Test text generation with xAI/Grok
-    try:
-        payload = {
-            "model": "grok-latest",
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": test_prompt}
-            ],
-            "max_tokens": 20
-        }
-        
-        response = requests.post(api_url, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        response_data = response.json()
-        text_response = response_data.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-        text_valid = True
-    except Exception as e:
-        error_detail = ""
-        if hasattr(e, 'response') and e.response:
-            try:
-                error_detail = f" - {e.response.json().get('error', {}).get('message', '')}"
-            except:
-                pass
-        text_response = f"Text generation failed: {str(e)}{error_detail}"
-    
-    # Test image-related capabilities (if available)
-    try:
-        # Using potential multimodal capabilities
-        payload = {
-            "model": "grok-vision-latest",
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": multimodal_test_prompt}
-            ],
-            "max_tokens": 20
-        }
-        
-        response = requests.post(api_url, headers=headers, json=payload)
-        
-        # Check if the model exists and the request was successful
-        if response.status_code == 200:
-            response_data = response.json()
-            multimodal_response = response_data.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-            image_response = f"Response: {multimodal_response}"
-            image_valid = True
-        else:
-            image_response = f"xAI doesn't currently offer multimodal capabilities on this endpoint. Status: {response.status_code}"
-    except Exception as e:
-        error_detail = ""
-        if hasattr(e, 'response') and e.response:
-            try:
-                error_detail = f" - {e.response.json().get('error', {}).get('message', '')}"
-            except:
-                pass
-                
-        if "model not found" in str(e).lower() or "not available" in str(e).lower():
-            image_response = f"The multimodal model is not available with this API key - {error_detail}"
-        else:
-            image_response = f"Multimodal capability check failed: {str(e)}{error_detail}"
-    
-    return (text_valid, text_response, image_valid, image_response, test_prompt, multimodal_test_prompt)
+    return validate_provider_key(SPEC, api_key, parallel=parallel, session=session, tier=tier,
+                                 structured=structured, deadline=deadline, retry=retry, profile=profile)
+
+
+async def validate_xai_api_key_async(api_key, *, parallel=False, session=None, tier=TIER_FULL, structured=False,
+                                     deadline=None, retry=None, profile=PROFILE_STANDARD):
+    """
+    Async version of validate_xai_api_key that runs on a shared aiohttp session.
+    Returns the same tuple as validate_xai_api_key.
+    """
+    return await validate_provider_key_async(SPEC, api_key, parallel=parallel, session=session, tier=tier,
+                                             structured=structured, deadline=deadline, retry=retry, profile=profile)
 
 
 if __name__ == "__main__":